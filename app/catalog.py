@@ -0,0 +1,187 @@
+import logging
+import time
+import numpy as np
+import pandas as pd
+
+from app.indexes import AuthorIndex, BitmapIndex, PhraseIndex, RankIndex, SortedIndex, deep_sizeof
+from app.stats import CatalogStats
+
+logger = logging.getLogger(__name__)
+
+# emotion scores the tone post-filter can rank by
+TONE_COLUMNS = ("joy", "surprise", "anger", "fear", "sadness")
+
+# In-memory layout of the catalog (see compact_books):
+# every emotion score, float32 keeps each distinct score of the catalog apart
+EMOTION_COLUMNS = ("anger", "disgust", "fear", "joy", "sadness", "surprise", "neutral")
+# a few hundred distinct values each, stored as dictionary codes
+CATEGORICAL_COLUMNS = ("categories", "simple_categories")
+# narrowed to the smallest integer type that holds their values
+INTEGER_COLUMNS = ("num_pages", "published_year", "ratings_count")
+# columns that are a function of other columns, dropped at load and rebuilt
+# only for the rows of a response
+DERIVED_COLUMNS = {
+    "tagged_description": lambda books: books["isbn13"] + " " + books["description"],
+}
+
+def compact_books(books: pd.DataFrame) -> pd.DataFrame:
+    """
+    Memory-compact copy of a books frame
+
+    Categorical columns become dictionary codes, emotion scores float32, the
+    integer columns the narrowest type that fits, and the remaining text stays
+    in Arrow string buffers (no Python string per cell). Derived columns are
+    dropped when they can be rebuilt exactly for every row.
+    """
+    columns = {}
+    for column in books.columns:
+        values = books[column]
+        if column in CATEGORICAL_COLUMNS:
+            values = values.astype("category")
+        elif column in EMOTION_COLUMNS:
+            values = values.astype("float32")
+        elif column in INTEGER_COLUMNS:
+            values = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_string_dtype(values.dtype):
+            values = values.astype(pd.StringDtype("pyarrow"))
+        columns[column] = values
+    compact = pd.DataFrame(columns, index=books.index)
+
+    for column, rebuild in DERIVED_COLUMNS.items():
+        if column not in compact.columns:
+            continue
+        try:
+            rebuilt = rebuild(compact)
+        except KeyError:
+            continue
+        if rebuilt.equals(compact[column]):
+            compact = compact.drop(columns=column)
+        else:
+            logger.warning(f"Keeping {column}, it differs from its rebuilt value on some rows")
+
+    return compact
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame, indexes: dict | None = None) -> pd.DataFrame:
+    """
+    Bytes and dtype per column of a books frame before and after compact_books(),
+    plus one row per index structure built over it (Catalog.index_bytes())
+    """
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "bytes_before": before.memory_usage(deep=True, index=False),
+        "dtype_after": after.dtypes.astype(str),
+        "bytes_after": after.memory_usage(deep=True, index=False),
+    }).reindex(before.columns)
+    report["dtype_after"] = report["dtype_after"].fillna("(rebuilt)")
+    report["bytes_after"] = report["bytes_after"].fillna(0).astype("int64")
+    for name, nbytes in (indexes or {}).items():
+        report.loc[f"index: {name}"] = ["", 0, "(index)", nbytes]
+    report.loc["total"] = ["", report["bytes_before"].sum(), "", report["bytes_after"].sum()]
+    return report
+
+class Catalog:
+    """
+    Read-only book catalog, loaded once per process and shared by every request
+
+    The row id of a book is its position in the catalog (0..n-1). It is also the
+    index label of the row, so frames handed out by the catalog can always be
+    mapped back to catalog rows.
+    """
+
+    def __init__(self, books: pd.DataFrame, version: str | None = None):
+        # column order of the source, materialize() hands rows out in it
+        self.columns = list(books.columns)
+        self._books = compact_books(books.reset_index(drop=True))
+        self.version = version
+
+        # normalized author names -> rows, for the author filter
+        self.authors = AuthorIndex(self._books["authors"])
+
+        # per-value bitmaps for the genre filter, including the "Children's" variants
+        self.genres = BitmapIndex(self._books["simple_categories"])
+
+        # description words -> rows, for the names post-filter
+        self.descriptions = PhraseIndex(self._books["description"])
+
+        # per-emotion descending ranks, for the tone post-filter
+        self.tones = RankIndex(self._books, TONE_COLUMNS)
+
+        # sorted range indexes for the pages and published year filters
+        self.num_pages = SortedIndex(self._books["num_pages"])
+        self.published_year = SortedIndex(self._books["published_year"])
+
+        # column statistics for ordering the pre-filters, built from the indexes
+        self.stats = CatalogStats(self)
+
+        # ISBN of every row and ISBN -> row id, to map vector search results to rows
+        self.isbns = self._books["isbn13"].astype(str).to_numpy(dtype=str)
+        self.rows_by_isbn = {isbn: row for row, isbn in enumerate(self.isbns.tolist())}
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def index_bytes(self) -> dict:
+        """Bytes held by each index structure, on top of the frame itself"""
+        return {
+            "authors": self.authors.nbytes(),
+            "genres": self.genres.nbytes(),
+            "descriptions": self.descriptions.nbytes(),
+            "tones": self.tones.nbytes(),
+            "num_pages": self.num_pages.nbytes(),
+            "published_year": self.published_year.nbytes(),
+            "isbns": self.isbns.nbytes + deep_sizeof(self.rows_by_isbn),
+        }
+
+    def all_rows(self) -> np.ndarray:
+        """A fresh bitmap with every row set, for the caller to AND filters into"""
+        return np.ones(len(self._books), dtype=bool)
+
+    def column(self, name: str) -> pd.Series:
+        return self._books[name]
+
+    @property
+    def books(self) -> pd.DataFrame:
+        # a shallow copy shares the column buffers (zero-copy), and pandas
+        # copy-on-write makes sure a caller writing to it never touches the catalog
+        return self._books.copy(deep=False)
+
+    def take(self, rows, columns: list | None = None) -> pd.DataFrame:
+        """Materialize the given catalog rows (row ids in order, or a bitmap)"""
+        books = self._books if columns is None else self._books[columns]
+        return books.iloc[rows]
+
+    def materialize(self, books: pd.DataFrame) -> pd.DataFrame:
+        """
+        Full rows for a handful of catalog books, ready to be serialized
+
+        Takes the rows of `books` (by row id, in its order) with every source
+        column, derived columns rebuilt and plain Python values, missing ones as
+        None. Columns `books` added on top of the catalog (like the search
+        distance) are kept. Meant for the final k books of a response only.
+        """
+        extra = books[[column for column in books.columns if column not in self.columns]]
+        books = self.take(np.asarray(books.index, dtype=np.intp))
+        for column, rebuild in DERIVED_COLUMNS.items():
+            if column in self.columns and column not in books.columns:
+                books = books.assign(**{column: rebuild(books)})
+
+        books = pd.concat([books[self.columns], extra], axis=1)
+        # float32 scores go out at their own precision (0.9327972, not 0.9327971935272217)
+        float32_columns = [column for column in books.columns if books[column].dtype == "float32"]
+        books = books.astype({column: "str" for column in float32_columns}).astype({column: "float64" for column in float32_columns})
+        return books.astype(object).where(books.notna(), None)
+
+def load_catalog(books_path: str, version: str | None = None) -> Catalog:
+    """Read books.parquet once and wrap it in a Catalog"""
+    start = time.perf_counter()
+    books = pd.read_parquet(books_path)
+    catalog = Catalog(books, version)
+    logger.info(f"Loaded catalog with {len(catalog)} books in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    report = memory_report(books, catalog.books, catalog.index_bytes())
+    logger.info(
+        f"Catalog memory {report.loc['total', 'bytes_before'] / 2**20:.1f} MiB -> "
+        f"{report.loc['total', 'bytes_after'] / 2**20:.1f} MiB\n{report.to_string()}"
+    )
+    logger.debug(f"Catalog stats: {catalog.stats.summary()}")
+    return catalog
@@ -1,22 +1,88 @@
 import os
 from fastapi.middleware.cors import CORSMiddleware
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
 
+from app.embedding_cache import CachedEmbeddings, DiskEmbeddingStore
+from app.embedding_providers import make_embeddings
+from app.partitions import DEFAULT_COLLECTION
+
 load_dotenv()
 
 # Load environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./data/chroma_db")
 BOOKS_PATH = os.getenv("BOOKS_PATH", "./data/books.parquet")
+# float32 export of the ChromaDB vectors (data_processing/export_embeddings.py),
+# search falls back to ChromaDB alone when it's missing
+EMBEDDINGS_PATH = os.getenv("EMBEDDINGS_PATH", "./data/embeddings.npy")
+# how brute-force search scores that matrix (see load_embedding_matrix):
+#   EMBEDDINGS_QUANTIZE      "int8" or "float16" scores a compact in-memory copy
+#                            first and re-ranks the best candidates in float32
+#   EMBEDDINGS_REDUCED_PATH  reduced matrix from data_processing/project_embeddings.py,
+#                            scores in fewer dimensions first
+#   EMBEDDINGS_RERANK        "0" keeps the reduced-space ranking as the answer
+EMBEDDINGS_OPTIONS = {
+    "quantize": os.getenv("EMBEDDINGS_QUANTIZE") or None,
+    "reduced_path": os.getenv("EMBEDDINGS_REDUCED_PATH") or None,
+    "rerank": os.getenv("EMBEDDINGS_RERANK", "1") != "0",
+}
 
-# Load ChromaDB
-db_books = Chroma(
-    persist_directory=CHROMA_DB_PATH,
-    embedding_function=OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+# catalog hot reload: poll interval in seconds (0 turns the watcher off)
+# and the token the /admin endpoints expect (unset turns them off)
+CATALOG_WATCH_INTERVAL = float(os.getenv("CATALOG_WATCH_INTERVAL", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# how many distinct pre-filter results to keep in memory
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", "1024"))
+
+# rankings of recent queries reused for near-duplicate queries (size 0 turns
+# it off): the cosine similarity a query needs to a cached one, and the share
+# of hits searched anyway to measure how much the cached ranking differs
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+SEMANTIC_CACHE_VERIFY_RATE = float(os.getenv("SEMANTIC_CACHE_VERIFY_RATE", "0.05"))
+
+# query embeddings cache: entries kept in memory per worker, and the SQLite
+# file every worker shares (empty keeps the cache in memory only)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite3")
+
+# embedding provider (see app/embedding_providers.py): "openai", "local"
+# (a sentence-transformers model in EMBEDDING_MODEL_PATH) or "hashing"
+# (offline, EMBEDDING_DIM wide), and the texts per provider call when
+# embedding documents
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+EMBEDDING_MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+
+provider_embeddings = make_embeddings(
+    EMBEDDING_PROVIDER,
+    openai_api_key=OPENAI_API_KEY,
+    model_path=EMBEDDING_MODEL_PATH,
+    dim=EMBEDDING_DIM,
+    batch_size=EMBEDDING_BATCH_SIZE,
+)
+embeddings = CachedEmbeddings(
+    provider_embeddings,
+    EMBEDDING_CACHE_SIZE,
+    DiskEmbeddingStore(EMBEDDING_CACHE_PATH) if EMBEDDING_CACHE_PATH else None,
 )
 
+# Load ChromaDB
+def load_db_books(persist_directory: str = CHROMA_DB_PATH, collection_name: str = DEFAULT_COLLECTION):
+    # imported here so that only a ChromaDB-backed deployment needs the package,
+    # search itself talks to any app.vector_store.VectorStore
+    from langchain_chroma import Chroma
+
+    # resolve symlinks so that flipping a link to a new index directory
+    # opens a new client instead of reusing the cached one for the old path
+    return Chroma(
+        collection_name=collection_name,
+        persist_directory=os.path.realpath(persist_directory),
+        embedding_function=embeddings
+    )
+
 def add_cors_middleware(app):
     """Add CORS middleware to allow cross-origin requests"""
     app.add_middleware(
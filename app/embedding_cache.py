@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    """Cache form of a query: NFKC, case-folded, whitespace collapsed"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha1(f"{model}\0{normalize_text(text)}".encode()).hexdigest()
+
+class DiskEmbeddingStore:
+    """
+    Embeddings persisted in a SQLite file, shared by every worker on the host
+
+    WAL mode lets the workers read while one of them writes. Vectors are
+    stored as float32 blobs under cache_key().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # one connection per store, guarded by a lock (requests run in a thread pool)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype=np.float32)
+
+    def put(self, key: str, model: str, vector: np.ndarray):
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, created) VALUES (?, ?, ?, ?)",
+                (key, model, blob, time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, vector_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+        return {"path": self.path, "size": count, "vector_bytes": vector_bytes, "file_bytes": os.path.getsize(self.path)}
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings with a two-tier cache in front of them
+
+    Lookups go to a bounded in-process LRU first, then to the SQLite store
+    (when there is one), and only then to the wrapped embeddings. Keys are
+    the normalized text plus the model name, so changing the model never
+    serves vectors of the old one.
+    """
+
+    def __init__(self, embeddings: Embeddings, maxsize: int = 4096, disk: DiskEmbeddingStore | None = None,
+                 model: str | None = None):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.maxsize = maxsize
+        self.disk = disk
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+        vector = self.disk.get(key) if self.disk is not None else None
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, vector)
+        return vector
+
+    def _store(self, key: str, vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.flags.writeable = False
+        self._remember(key, vector)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, self.model, vector)
+            except sqlite3.Error as e:
+                # the in-process tier still has it
+                logger.warning(f"Could not persist an embedding: {e}")
+        return vector
+
+    def embed_query(self, text: str) -> list:
+        key = cache_key(self.model, text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self._store(key, self.embeddings.embed_query(text))
+        return vector.tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [cache_key(self.model, text) for text in texts]
+        vectors = [self._lookup(key) for key in keys]
+
+        # one call for every text not cached yet
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = self._store(keys[i], vector)
+        return [vector.tolist() for vector in vectors]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            stats = {
+                "model": self.model,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "memory_bytes": sum(vector.nbytes for vector in self._entries.values()),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# The embedding function behind the vector index, picked by EMBEDDING_PROVIDER:
+#   openai   OpenAI's API (needs OPENAI_API_KEY and network)
+#   local    a sentence-transformers model loaded from EMBEDDING_MODEL_PATH
+#   hashing  deterministic hashed n-grams, offline, for load tests and CI
+# Vectors of different providers live in different spaces, the index has to
+# be built with the provider that queries it.
+
+EMBEDDING_PROVIDERS = ("openai", "local", "hashing")
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag of hashed word and character n-grams
+
+    Every word and every character trigram of the normalized text adds +-1 to
+    one of `dim` buckets (both picked by a hash), and the result is L2
+    normalized. No model and no network, and texts sharing words or
+    fragments of words land close to each other.
+    """
+
+    def __init__(self, dim: int = 1536, char_ngram: int = 3):
+        self.dim = dim
+        self.char_ngram = char_ngram
+        self.model = f"hashing-{dim}-{char_ngram}"
+
+    def _features(self, text: str) -> list:
+        words = re.findall(r"\w+", text.lower())
+        features = [f"w:{word}" for word in words]
+        for word in words:
+            padded = f" {word} "
+            features += [f"c:{padded[i:i + self.char_ngram]}" for i in range(len(padded) - self.char_ngram + 1)]
+        return features
+
+    def _embed(self, text: str) -> list:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if (digest >> 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._embed(text)
+
+class LocalEmbeddings(Embeddings):
+    """A sentence-transformers model from disk, run on the CPU"""
+
+    def __init__(self, model_path: str, batch_size: int = 32):
+        # only needed by this provider
+        from sentence_transformers import SentenceTransformer
+
+        self.encoder = SentenceTransformer(model_path, device="cpu")
+        self.batch_size = batch_size
+        self.model = os.path.basename(os.path.normpath(model_path))
+
+    def embed_documents(self, texts: list) -> list:
+        return self.encoder.encode(texts, batch_size=self.batch_size, normalize_embeddings=True).tolist()
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+class TimedEmbeddings(Embeddings):
+    """
+    Embeddings that time every call to the provider
+
+    embed_documents goes out in batches of `batch_size` texts, one timed
+    call each. The latest `window` call latencies are kept for percentiles.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = 256, window: int = 1000):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.batch_size = batch_size
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+
+    def _timed(self, fn, texts: int):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._latencies.append(elapsed)
+            self.calls += 1
+            self.texts += texts
+        logger.debug(f"Embedded {texts} texts with {self.model} in {elapsed:.1f} ms")
+        return result
+
+    def embed_query(self, text: str) -> list:
+        return self._timed(lambda: self.embeddings.embed_query(text), 1)
+
+    def embed_documents(self, texts: list) -> list:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            vectors += self._timed(lambda: self.embeddings.embed_documents(batch), len(batch))
+        return vectors
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies)
+            stats = {"model": self.model, "calls": self.calls, "texts": self.texts}
+        if len(latencies):
+            stats.update({
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "mean_ms": float(latencies.mean()),
+            })
+        return stats
+
+def make_embeddings(provider: str, openai_api_key: str | None = None, model_path: str | None = None,
+                    dim: int = 1536, batch_size: int = 256) -> TimedEmbeddings:
+    """The timed embedding function of `provider` (one of EMBEDDING_PROVIDERS)"""
+    if provider == "openai":
+        # imported here so the offline providers start without the package
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+    elif provider == "local":
+        if not model_path:
+            raise ValueError("The local embedding provider needs EMBEDDING_MODEL_PATH")
+        embeddings = LocalEmbeddings(model_path)
+    elif provider == "hashing":
+        embeddings = HashingEmbeddings(dim)
+    else:
+        raise ValueError(f"Unknown embedding provider {provider!r}, expected one of {EMBEDDING_PROVIDERS}")
+
+    logger.info(f"Embedding with {provider} ({getattr(embeddings, 'model', type(embeddings).__name__)})")
+    return TimedEmbeddings(embeddings, batch_size)
@@ -0,0 +1,98 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from app.indexes import normalize_name
+
+# validation entries whose filter_value echoes the request as it was written,
+# a cache hit puts the current request's value back in
+_FILTER_VALUE_KEYS = {
+    "applied_author": "author",
+    "applied_min_pages": "pages_min",
+    "applied_max_pages": "pages_max",
+    "applied_published_year": "published_year",
+}
+
+def canonical_filters(filters: dict) -> tuple:
+    """
+    Hashable canonical form of the pre-filter part of a FilterSchema dict
+
+    Filters that select the same books map to the same key: author names are
+    normalized, de-duplicated and sorted, the genre is resolved to the
+    simple_categories value it filters on, and filters that are not applied
+    (None, or a genre other than Fiction/Nonfiction) are left out.
+    """
+    authors = filters.get("author")
+    if authors is not None:
+        authors = tuple(sorted({normalize_name(author) for author in authors}))
+
+    genre = filters.get("genre")
+    if genre in ("Fiction", "Nonfiction"):
+        genre = "Children's " + genre if filters.get("children") else genre
+    else:
+        genre = None
+
+    published_year = filters.get("published_year")
+    if published_year is not None:
+        published_year = tuple(published_year.get(key) for key in ("exact", "min", "max"))
+
+    return (authors, genre, filters.get("pages_min"), filters.get("pages_max"), published_year)
+
+class FilterCache:
+    """
+    Bounded LRU cache of pre-filter results
+
+    Keyed on (catalog version, canonical filters), so a catalog swap never
+    serves rows of the old catalog. Stores the surviving row ids and the
+    validation entries the filters produced.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version: str, filters: dict) -> Optional[tuple]:
+        """(row ids, validation entries) for these filters, or None on a miss"""
+        key = (version, canonical_filters(filters))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        rows, validation = entry
+        validation = copy.deepcopy(validation)
+        for name, filter_key in _FILTER_VALUE_KEYS.items():
+            if name in validation:
+                validation[name]["filter_value"] = filters[filter_key]
+        return rows, validation
+
+    def put(self, version: str, filters: dict, rows: np.ndarray, validation: dict):
+        rows = np.array(rows, dtype=np.intp)
+        rows.flags.writeable = False
+        key = (version, canonical_filters(filters))
+
+        with self._lock:
+            self._entries[key] = (rows, copy.deepcopy(validation))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
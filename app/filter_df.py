@@ -1,6 +1,11 @@
+import numpy as np
 import pandas as pd
 import logging
 
+from app.catalog import Catalog, TONE_COLUMNS
+from app.filter_cache import FilterCache
+from app.indexes import AuthorIndex, RankIndex, phrase_mask
+
 from app.filter_validation import (
     validate_author_filter, validate_genre_filter,
     validate_min_pages_filter, validate_max_pages_filter,
@@ -13,90 +18,275 @@ logger = logging.getLogger(__name__)
 
 filter_categories = ("tone", "pages_max", "pages_min", "genre", "children", "names")
 genre_options = ("Fiction", "Nonfiction", "Children's Fiction", "Children's Nonfiction")
-tone_options = ("joy", "surprise", "anger", "fear", "sadness")
+tone_options = TONE_COLUMNS
 
 # perform the pre filters like Authors, Genre, and Pages
-def apply_pre_filters(books: pd.DataFrame, filters: dict, filterValidation: dict) -> pd.DataFrame:
-    # get the authors filters first
-    if "author" in filters and filters["author"] is not None:
-        logger.info("APPLYING authors filter")
-        authors = filters["author"]
+# every filter becomes a bitmap over the catalog rows, the bitmaps are ANDed
+# together and the surviving rows are materialized once at the end
+def apply_pre_filters(books: pd.DataFrame | Catalog, filters: dict, filterValidation: dict, cache: FilterCache | None = None) -> pd.DataFrame:
+    if isinstance(books, Catalog):
+        return books.take(pre_filter_rows(books, filters, filterValidation, cache))
+
+    # a plain frame (scripts, tests) is filtered straight off its own columns,
+    # building catalog indexes for one call would cost more than the filters
+    mask = run_pre_filters(
+        frame_pre_filters(books, filters), np.ones(len(books), dtype=bool),
+        lambda rows, columns: books[columns].iloc[rows], filterValidation,
+    )
+    return books.iloc[np.flatnonzero(mask)]
+
+# row ids that pass the pre filters, served from the cache when these filters
+# were already run against this catalog version
+def pre_filter_rows(catalog: Catalog, filters: dict, filterValidation: dict, cache: FilterCache | None = None) -> np.ndarray:
+    # throwaway catalogs have no version and are never cached
+    use_cache = cache is not None and catalog.version is not None
+
+    if use_cache:
+        cached = cache.get(catalog.version, filters)
+        if cached is not None:
+            rows, validation = cached
+            logger.info(f"Pre-filter cache hit, {len(rows)} books")
+            filterValidation.update(validation)
+            return rows
+
+    validation = {}
+    rows = np.flatnonzero(pre_filter_mask(catalog, filters, validation))
+    filterValidation.update(validation)
+
+    if use_cache:
+        cache.put(catalog.version, filters, rows, validation)
+    return rows
+
+FILTER_ORDER = ("author", "genre", "pages_min", "pages_max", "published_year")
 
-        # Filter books where any of the specified authors appears in the authors field
-        author_mask = books["authors"].str.contains('|'.join(authors), case=False, na=False, regex=True)
-        books = books[author_mask]
-        
-        # now we validate author filtering
-        validate_author_filter(books, authors, filterValidation)
-        
+class FilterStep:
+    """One pre-filter of a plan: its estimated result size, bitmap and validator"""
 
-    # get the Fiction/Nonfiction genre first
+    def __init__(self, name: str, column: str, estimate: int, bitmap, validate):
+        # position in the fixed author, genre, pages, year order
+        self.order = FILTER_ORDER.index(name)
+        self.name = name
+        self.column = column
+        self.estimate = estimate
+        self.bitmap = bitmap
+        self.validate = validate
+
+# the simple_categories value the genre filter keeps, None without one
+def resolve_genre(filters: dict) -> str | None:
     if "genre" in filters and filters["genre"] in ["Fiction", "Nonfiction"]:
-        logger.info("APPLYING genre filter")
         genre = filters["genre"]
         if "children" in filters and filters["children"]:
             genre = "Children's " + genre
-        books = books[books["simple_categories"] == genre]
+        return genre
+    return None
 
-        # now we validate genre filtering
-        validate_genre_filter(books, genre, filterValidation)
+# build the pre-filter steps for `filters`, most selective first
+# (the estimates come from the catalog stats, ties keep the author, genre,
+# pages, year order the filters used to run in)
+def plan_pre_filters(catalog: Catalog, filters: dict) -> list:
+    stats = catalog.stats
+    steps = []
 
-    # min and max filter is last
-    if "pages_min" in filters and filters["pages_min"] is not None:
-        logger.info("APPLYING pages_min filter")
-        books = books[books["num_pages"] >= filters["pages_min"]]
-        logger.info(f"Has {len(books)} books after pages_min: {filters['pages_min']} filter.")
+    if "author" in filters and filters["author"] is not None:
+        authors = filters["author"]
+        # an empty list keeps every book, like the empty regex used to
+        steps.append(FilterStep(
+            "author", "authors",
+            stats.estimate_authors(catalog, authors) if authors else len(catalog),
+            (lambda: catalog.authors.mask(authors)) if authors else catalog.all_rows,
+            lambda books, fv: validate_author_filter(books, authors, fv),
+        ))
 
-        validate_min_pages_filter(books, filters["pages_min"], filterValidation)
+    genre = resolve_genre(filters)
+    if genre is not None:
+        steps.append(FilterStep(
+            "genre", "simple_categories",
+            stats.estimate_genre(genre),
+            lambda: catalog.genres.get(genre),
+            lambda books, fv: validate_genre_filter(books, genre, fv),
+        ))
+
+    if "pages_min" in filters and filters["pages_min"] is not None:
+        pages_min = filters["pages_min"]
+        steps.append(FilterStep(
+            "pages_min", "num_pages",
+            stats.num_pages.estimate(low=pages_min),
+            lambda: catalog.num_pages.mask(low=pages_min),
+            lambda books, fv: validate_min_pages_filter(books, pages_min, fv),
+        ))
 
     if "pages_max" in filters and filters["pages_max"] is not None:
-        logger.info("APPLYING pages_max filter")
-        books = books[books["num_pages"] <= filters["pages_max"]]
-        logger.info(f"Has {len(books)} books after pages_max: {filters['pages_max']} filter.")
+        pages_max = filters["pages_max"]
+        steps.append(FilterStep(
+            "pages_max", "num_pages",
+            stats.num_pages.estimate(high=pages_max),
+            lambda: catalog.num_pages.mask(high=pages_max),
+            lambda books, fv: validate_max_pages_filter(books, pages_max, fv),
+        ))
+
+    if "published_year" in filters and filters["published_year"] is not None:
+        published_year = filters["published_year"]
+        # exact, min and max all narrow the same range, so it's one lookup
+        low, high = year_range(published_year)
+        steps.append(FilterStep(
+            "published_year", "published_year",
+            stats.published_year.estimate(low, high),
+            lambda: catalog.published_year.mask(low, high),
+            lambda books, fv: validate_published_year_filter(books, published_year, fv),
+        ))
 
-        validate_max_pages_filter(books, filters["pages_max"], filterValidation)
+    # sort is stable, so equal estimates keep the order above
+    return sorted(steps, key=lambda step: step.estimate)
+
+# the same steps as plan_pre_filters for a plain frame, in the fixed order,
+# with bitmaps computed off the frame's columns (no estimates, nothing to plan)
+def frame_pre_filters(books: pd.DataFrame, filters: dict) -> list:
+    all_rows = lambda: np.ones(len(books), dtype=bool)
+    steps = []
+
+    if "author" in filters and filters["author"] is not None:
+        authors = filters["author"]
+        steps.append(FilterStep(
+            "author", "authors", None,
+            (lambda: AuthorIndex(books["authors"]).mask(authors)) if authors else all_rows,
+            lambda books, fv: validate_author_filter(books, authors, fv),
+        ))
+
+    genre = resolve_genre(filters)
+    if genre is not None:
+        steps.append(FilterStep(
+            "genre", "simple_categories", None,
+            lambda: books["simple_categories"].eq(genre).fillna(False).to_numpy(dtype=bool),
+            lambda books, fv: validate_genre_filter(books, genre, fv),
+        ))
+
+    if "pages_min" in filters and filters["pages_min"] is not None:
+        pages_min = filters["pages_min"]
+        steps.append(FilterStep(
+            "pages_min", "num_pages", None,
+            lambda: range_mask(books["num_pages"], low=pages_min),
+            lambda books, fv: validate_min_pages_filter(books, pages_min, fv),
+        ))
+
+    if "pages_max" in filters and filters["pages_max"] is not None:
+        pages_max = filters["pages_max"]
+        steps.append(FilterStep(
+            "pages_max", "num_pages", None,
+            lambda: range_mask(books["num_pages"], high=pages_max),
+            lambda books, fv: validate_max_pages_filter(books, pages_max, fv),
+        ))
 
     if "published_year" in filters and filters["published_year"] is not None:
-        logger.info("APPLYING published_year filter")
         published_year = filters["published_year"]
+        low, high = year_range(published_year)
+        steps.append(FilterStep(
+            "published_year", "published_year", None,
+            lambda: range_mask(books["published_year"], low, high),
+            lambda books, fv: validate_published_year_filter(books, published_year, fv),
+        ))
 
-        # Check for exact year first (takes priority)
-        if published_year.get("exact") is not None:
-            books = books[books["published_year"] == published_year["exact"]]
-        
-        # Apply min/max filters if exact is not specified
-        if published_year.get("min") is not None:
-            books = books[books["published_year"] >= published_year["min"]]
-        if published_year.get("max") is not None:
-            books = books[books["published_year"] <= published_year["max"]]
+    return steps
 
-        validate_published_year_filter(books, published_year, filterValidation)
+# bitmap of low <= value <= high (either bound may be None), missing values
+# never match, same as the catalog's SortedIndex
+def range_mask(values: pd.Series, low=None, high=None) -> np.ndarray:
+    data = values.to_numpy(dtype="float64", na_value=np.nan)
+    mask = ~np.isnan(data)
+    if low is not None:
+        mask &= data >= low
+    if high is not None:
+        mask &= data <= high
+    return mask
 
-    return books
+# every filter becomes a bitmap over the catalog rows, ANDed together in plan
+# order (most selective first)
+def pre_filter_mask(catalog: Catalog, filters: dict, filterValidation: dict) -> np.ndarray:
+    plan = plan_pre_filters(catalog, filters)
+    if plan:
+        logger.debug("Pre-filter plan: " + " -> ".join(f"{step.name} (~{step.estimate})" for step in plan))
+    return run_pre_filters(plan, catalog.all_rows(), catalog.take, filterValidation)
+
+# AND the bitmaps of `plan` into `mask` in plan order, then validate each
+# filter on the rows left after it in the fixed author, genre, pages, year
+# order, so the validation log doesn't depend on the plan
+def run_pre_filters(plan: list, mask: np.ndarray, take, filterValidation: dict) -> np.ndarray:
+    bitmaps = {}
+    for step in plan:
+        # nothing left to narrow, skip the remaining lookups
+        if not mask.any():
+            logger.debug(f"Skipping {step.name} filter, no books left")
+            continue
+        logger.info(f"APPLYING {step.name} filter")
+        bitmaps[step.name] = step.bitmap()
+        mask &= bitmaps[step.name]
+        estimated = f", estimated {step.estimate}" if step.estimate is not None else ""
+        logger.info(f"Has {mask.sum()} books after {step.name} filter{estimated}.")
+
+    left = np.ones(len(mask), dtype=bool)
+    for step in sorted(plan, key=lambda step: step.order):
+        if left.any():
+            left &= bitmaps[step.name] if step.name in bitmaps else step.bitmap()
+        step.validate(take(left, [step.column]), filterValidation)
+
+    return mask
+
+# the [low, high] year range for a published_year filter (None = open end)
+def year_range(published_year: dict) -> tuple:
+    lows  = [published_year.get(key) for key in ("exact", "min") if published_year.get(key) is not None]
+    highs = [published_year.get(key) for key in ("exact", "max") if published_year.get(key) is not None]
+    return (max(lows) if lows else None), (min(highs) if highs else None)
 
 # perform the post filters tone and key_words
 # prioritizing the names first, then just returning the top k sorted by tone
-def apply_post_filters(books: pd.DataFrame, filters: dict, filterValidation: dict, k = 10) -> pd.DataFrame:
+# pass the catalog when `books` came out of it, so its indexes can be used
+def apply_post_filters(books: pd.DataFrame, filters: dict, filterValidation: dict, k = 10, catalog: Catalog | None = None) -> pd.DataFrame:
 
     # Filter books where any of the specified names appears in the description
+    # (an empty list keeps every book, like the empty regex used to)
     if "names" in filters and filters["names"] is not None:
         logger.info("APPLYING names filter")
         names = filters["names"]
-        name_mask = books["description"].str.contains('|'.join(names), case=False, na=False, regex=True)
-        books = books[name_mask]
+        if names:
+            books = books[names_mask(books, names, catalog)]
 
         validate_keywords_filter(books, filters["names"], filterValidation)
 
     # Sort by tone and return the top k
     # added an extra check to be sure before sorting
     if "tone" in filters and filters["tone"] is not None and filters["tone"] in tone_options:
-        books = books.sort_values(by=filters["tone"], ascending=False)
-        
         validate_tone_filter(books, filters["tone"], filterValidation)
 
+        # pick the top k by rank instead of sorting every candidate
+        books = books.iloc[top_k_by_tone(books, filters["tone"], k, catalog)]
+
     logger.info("Finished applying post filters")
     return books.head(k)
 
+# bitmap over the catalog rows of the books the cheap post-filters keep (the
+# names filter, a plain row predicate), so the search can skip the others
+# while it ranks. None when no such filter is set.
+def post_filter_eligible(catalog: Catalog, filters: dict) -> np.ndarray | None:
+    names = filters.get("names")
+    if not names:
+        return None
+    return catalog.descriptions.mask(names)
+
+# positions of the k books with the highest tone score, best first
+def top_k_by_tone(books: pd.DataFrame, tone: str, k: int, catalog: Catalog | None = None) -> np.ndarray:
+    # rows of the shared catalog use its precomputed ranks, any other frame
+    # gets throwaway ranks over its own scores
+    if catalog is not None and tone in catalog.tones:
+        return catalog.tones.top_k(tone, books.index.to_numpy(), k)
+    return RankIndex(books, [tone]).top_k(tone, np.arange(len(books)), k)
+
+# which rows mention any of the names (matched from a word boundary)
+def names_mask(books: pd.DataFrame, names: list, catalog: Catalog | None = None) -> np.ndarray:
+    # rows of the shared catalog are looked up in its prebuilt index by row id,
+    # any other frame is scanned once, an index would cost more to build
+    if catalog is not None:
+        return catalog.descriptions.mask(names)[books.index.to_numpy()]
+    return phrase_mask(books["description"], names)
+
 if __name__ == "__main__":
     # quick smoke tests
     from config import BOOKS_PATH
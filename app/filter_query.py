@@ -11,7 +11,9 @@ load_dotenv()
 # Load environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-client = OpenAI()
+# without a key the app still serves recommendations (offline embedding
+# providers), only query parsing needs OpenAI
+client = OpenAI() if OPENAI_API_KEY else None
 MODEL = "gpt-4o-mini-2024-07-18"
 
 filter_categories = ["tone", "pages_max", "pages_min", "genre", "children", "names"]
@@ -23,7 +25,9 @@ def _so(query: str, system: str, schema: dict, extra: dict | None = None) -> dic
     user_payload = {"query": query}
     if extra:  # pass filters or flags to the model
         user_payload["context"] = extra
-        
+    if client is None:
+        raise RuntimeError("Parsing queries needs OPENAI_API_KEY")
+
     resp = client.chat.completions.create(
         model=MODEL,
         messages=[
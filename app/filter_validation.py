@@ -1,6 +1,8 @@
 import pandas as pd
 import logging
 
+from app.indexes import normalize_name
+
 # make sure that all authors are the requested author
 def validate_author_filter(books: pd.DataFrame, authors: list, filterValidation: dict):
     filterValidation["applied_author"] = {}
@@ -10,10 +12,14 @@ def validate_author_filter(books: pd.DataFrame, authors: list, filterValidation:
     authorValidation["num_books_after"] = len(books)
     authorValidation["filter_value"] = authors
     
-    joined_authors = '|'.join(authors)
-    for index, book in books.iterrows():
-        if not pd.Series([book["authors"]]).str.contains(joined_authors, case=False, na=False, regex=True).any():
-            authorValidation["error"]  = f"Failed Author Filter, has {book['authors']}"
+    # the validators walk the one column they check, building a Series per row
+    # with iterrows() costs more than the filters themselves
+    # same matching as the author index: normalized, case-insensitive, no regex
+    queries = [normalize_name(author) for author in authors]
+    for authors_field in books["authors"]:
+        book_authors = normalize_name(authors_field)
+        if queries and not any(query in book_authors for query in queries):
+            authorValidation["error"]  = f"Failed Author Filter, has {authors_field}"
             authorValidation["status"] = "failed"
             return
     
@@ -29,9 +35,9 @@ def validate_genre_filter(books: pd.DataFrame, genre: str, filterValidation: dic
     genreValidation["num_books_after"] = len(books)
     genreValidation["filter_value"] = genre
 
-    for index, book in books.iterrows():
-        if book["simple_categories"] != genre:
-            genreValidation["error"]  = f"Failed Genre Filter, has {book['simple_categories']}"
+    for category in books["simple_categories"]:
+        if category != genre:
+            genreValidation["error"]  = f"Failed Genre Filter, has {category}"
             genreValidation["status"] = "failed"
             return
     
@@ -47,9 +53,9 @@ def validate_min_pages_filter(books: pd.DataFrame, min_pages: int, filterValidat
     minPagesValidation["num_books_after"] = len(books)
     minPagesValidation["filter_value"] = min_pages
 
-    for index, book in books.iterrows():
-        if book["num_pages"] < min_pages:
-            minPagesValidation["error"]  = f"Failed Min Pages Filter, has {book['num_pages']}"
+    for num_pages in books["num_pages"]:
+        if num_pages < min_pages:
+            minPagesValidation["error"]  = f"Failed Min Pages Filter, has {num_pages}"
             minPagesValidation["status"] = "failed"
             return
     
@@ -65,9 +71,9 @@ def validate_max_pages_filter(books: pd.DataFrame, max_pages: int, filterValidat
     maxPagesValidation["num_books_after"] = len(books)
     maxPagesValidation["filter_value"] = max_pages
 
-    for index, book in books.iterrows():
-        if book["num_pages"] > max_pages:
-            maxPagesValidation["error"]  = f"Failed Max Pages Filter, has {book['num_pages']}"
+    for num_pages in books["num_pages"]:
+        if num_pages > max_pages:
+            maxPagesValidation["error"]  = f"Failed Max Pages Filter, has {num_pages}"
             maxPagesValidation["status"] = "failed"
             return
     
@@ -87,9 +93,8 @@ def validate_published_year_filter(books: pd.DataFrame, published_year: dict, fi
     yearValidation["num_books_after"] = len(books)
     yearValidation["filter_value"] = published_year
 
-    for index, book in books.iterrows():
-        book_year = book.get("published_year", None)
-
+    book_years = books["published_year"] if "published_year" in books.columns else []
+    for book_year in book_years:
         if not book_year: continue
         
         # Handle exact year match first (takes priority)
@@ -128,9 +133,12 @@ def validate_keywords_filter(books: pd.DataFrame, keywords: list, filterValidati
     keywordsValidation["num_books_after"] = len(books)
     keywordsValidation["filter_value"] = keywords
 
-    for index, book in books.iterrows():
-        if not pd.Series([book["description"]]).str.contains('|'.join(keywords), case=False, na=False, regex=True).any():
-            keywordsValidation["error"]  = f"Failed Keywords Filter, has {book['description']}"
+    # same matching as the names filter: from a word boundary, normalized, no regex
+    queries = [f" {normalize_name(keyword)}" for keyword in keywords if normalize_name(keyword)]
+    for book_description in books["description"]:
+        description = f" {normalize_name(book_description)} "
+        if queries and not any(query in description for query in queries):
+            keywordsValidation["error"]  = f"Failed Keywords Filter, has {book_description}"
             keywordsValidation["status"] = "failed"
             return
     
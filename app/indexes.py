@@ -0,0 +1,310 @@
+import bisect
+import re
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+from functools import reduce
+import numpy as np
+import pandas as pd
+
+# Indexes built once per catalog at load time. They all work on catalog row ids
+# (positions 0..n-1) and hand out read-only numpy arrays, callers combine them
+# into new arrays and never modify them in place.
+
+def readonly(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+def deep_sizeof(obj, seen: set | None = None) -> int:
+    """Bytes held by `obj` and the containers, strings and arrays it references, each counted once"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    # an array's getsizeof includes its buffer when it owns one
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+class BitmapIndex:
+    """One row bitmap per distinct value of a low-cardinality column"""
+
+    def __init__(self, values: pd.Series):
+        self.size = len(values)
+        codes, uniques = pd.factorize(values)
+        self._bitmaps = {value: readonly(codes == code) for code, value in enumerate(uniques)}
+        self._empty = readonly(np.zeros(self.size, dtype=bool))
+
+    def get(self, value) -> np.ndarray:
+        """Bitmap of the rows holding `value` (all False if no row does)"""
+        return self._bitmaps.get(value, self._empty)
+
+    def counts(self) -> dict:
+        return {value: int(bitmap.sum()) for value, bitmap in self._bitmaps.items()}
+
+    def nbytes(self) -> int:
+        return deep_sizeof([self._bitmaps, self._empty])
+
+class SortedIndex:
+    """
+    Catalog rows sorted by a numeric column, for range lookups
+
+    Rows with a missing value (the nullable Int64 columns keep them as NA) are
+    left out of the index, so they never match a range, the same as a
+    comparison against NA never matches.
+    """
+
+    def __init__(self, values: pd.Series):
+        self.size = len(values)
+        data = values.to_numpy(dtype="float64", na_value=np.nan)
+        rows = np.flatnonzero(~np.isnan(data))
+
+        order = np.argsort(data[rows], kind="stable")
+        self.rows = readonly(rows[order])
+        self.values = readonly(data[rows][order])
+
+    def _bounds(self, low, high) -> tuple:
+        start = 0 if low is None else np.searchsorted(self.values, low, side="left")
+        stop = len(self.values) if high is None else np.searchsorted(self.values, high, side="right")
+        return start, max(start, stop)
+
+    def range(self, low=None, high=None) -> np.ndarray:
+        """Row ids with low <= value <= high (either bound may be None), in value order"""
+        start, stop = self._bounds(low, high)
+        return self.rows[start:stop]
+
+    def count(self, low=None, high=None) -> int:
+        start, stop = self._bounds(low, high)
+        return int(stop - start)
+
+    def mask(self, low=None, high=None) -> np.ndarray:
+        """Bitmap of the rows in the range"""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.range(low, high)] = True
+        return mask
+
+    def nbytes(self) -> int:
+        return deep_sizeof([self.rows, self.values])
+
+def normalize_name(name) -> str:
+    """Casefold and reduce punctuation to single spaces, 'J.K. Rowling' -> 'j k rowling'"""
+    if name is None or pd.isna(name):
+        return ""
+    return " ".join(re.findall(r"\w+", str(name).casefold()))
+
+class AuthorIndex:
+    """
+    Inverted index from author names to catalog rows
+
+    The `;`-separated authors field is split into full names, each normalized
+    with normalize_name(). A lookup matches every name that contains the query
+    as whole words ("king" finds "Stephen King", "j k rowling" finds
+    "J. K. Rowling"), and falls back to a plain substring match over the
+    distinct names when no name contains the query as whole words.
+    """
+
+    def __init__(self, authors: pd.Series):
+        self.size = len(authors)
+
+        postings = defaultdict(list)
+        for row, field in enumerate(authors):
+            if field is None or pd.isna(field):
+                continue
+            for name in str(field).split(";"):
+                name = normalize_name(name)
+                if name:
+                    postings[name].append(row)
+
+        self._names = {name: readonly(np.unique(rows)) for name, rows in postings.items()}
+
+        self._tokens = defaultdict(set)
+        for name in self._names:
+            for token in name.split():
+                self._tokens[token].add(name)
+
+    def names(self, author: str) -> set:
+        """The normalized catalog names an author query matches"""
+        query = normalize_name(author)
+        if not query:
+            return set()
+
+        tokens = query.split()
+        candidates = set.intersection(*(self._tokens.get(token, set()) for token in tokens))
+        names = {name for name in candidates if f" {query} " in f" {name} "}
+        if names:
+            return names
+
+        # no whole-word hit, e.g. a partial name
+        return {name for name in self._names if query in name}
+
+    def lookup(self, author: str) -> np.ndarray:
+        """Row ids of the books by `author`"""
+        postings = [self._names[name] for name in self.names(author)]
+        if not postings:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate(postings))
+
+    def mask(self, authors: list) -> np.ndarray:
+        """Bitmap of the books by any of `authors`"""
+        mask = np.zeros(self.size, dtype=bool)
+        for author in authors:
+            mask[self.lookup(author)] = True
+        return mask
+
+    def counts(self) -> dict:
+        return {name: len(rows) for name, rows in self._names.items()}
+
+    def nbytes(self) -> int:
+        return deep_sizeof([self._names, self._tokens])
+
+class PhraseIndex:
+    """
+    Word -> rows inverted index over a text column, for the names filter
+
+    Texts are normalized like author names. A phrase matches a row when it
+    starts at a word boundary: earlier words must match whole, the last word
+    may run on ("Japan" matches "Japanese", "New York" matches "New Yorker",
+    but "UK" does not match "Duke" and "Maine" does not match "remained").
+    Words are dictionary hits (the last one a prefix range over the sorted
+    vocabulary), multi-word phrases intersect the postings and then check the
+    adjacency on the few rows left. Results for a set of phrases are kept in a
+    small LRU cache, since the same names come back across requests.
+    """
+
+    def __init__(self, texts: pd.Series, cache_size: int = 256):
+        self.size = len(texts)
+        # no normalized copy of the texts is kept, multi-word phrases are
+        # checked against the source column on the few rows left
+        self._source = texts
+
+        postings = defaultdict(list)
+        for row, text in enumerate(texts):
+            for word in set(normalize_name(text).split()):
+                postings[word].append(row)
+
+        # all postings in one int32 array, in vocabulary order: the rows of the
+        # i-th word are _rows[_offsets[i]:_offsets[i + 1]] (one array instead
+        # of an array object per word)
+        self._vocabulary = sorted(postings)
+        lengths = np.array([len(postings[word]) for word in self._vocabulary], dtype=np.int64)
+        self._offsets = readonly(np.concatenate([[0], np.cumsum(lengths)]))
+        self._rows = readonly(np.fromiter(
+            (row for word in self._vocabulary for row in postings[word]), dtype=np.int32, count=int(self._offsets[-1])
+        ))
+
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+
+    def _word_range_rows(self, start: int, stop: int) -> np.ndarray:
+        return self._rows[self._offsets[start]:self._offsets[stop]].astype(np.intp)
+
+    def _word_rows(self, word: str) -> np.ndarray | None:
+        i = bisect.bisect_left(self._vocabulary, word)
+        if i == len(self._vocabulary) or self._vocabulary[i] != word:
+            return None
+        return self._word_range_rows(i, i + 1)
+
+    def _prefix_rows(self, prefix: str) -> np.ndarray:
+        # all words starting with `prefix` sit next to each other in the
+        # sorted vocabulary, so their postings are one slice
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        stop = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff", lo=start)
+        return np.unique(self._word_range_rows(start, stop))
+
+    def lookup(self, phrase: str) -> np.ndarray:
+        """Row ids whose text contains `phrase` starting at a word boundary"""
+        query = normalize_name(phrase)
+        words = query.split()
+        if not words:
+            return np.empty(0, dtype=np.intp)
+
+        postings = [self._word_rows(word) for word in words[:-1]]
+        if any(rows is None for rows in postings):
+            return np.empty(0, dtype=np.intp)
+        postings.append(self._prefix_rows(words[-1]))
+
+        # rarest word first keeps the intersections small
+        rows = reduce(np.intersect1d, sorted(postings, key=len))
+        if len(words) == 1:
+            return rows
+
+        return rows[phrase_mask(self._source.iloc[rows], [query])]
+
+    def mask(self, phrases: list) -> np.ndarray:
+        """Bitmap of the rows containing any of `phrases` (cached, read-only)"""
+        key = frozenset(normalize_name(phrase) for phrase in phrases)
+
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        mask = np.zeros(self.size, dtype=bool)
+        for phrase in key:
+            mask[self.lookup(phrase)] = True
+        readonly(mask)
+
+        with self._cache_lock:
+            self._cache[key] = mask
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return mask
+
+    def nbytes(self) -> int:
+        # the source column belongs to the catalog frame and is counted there
+        with self._cache_lock:
+            return deep_sizeof([self._vocabulary, self._offsets, self._rows, dict(self._cache)])
+
+def phrase_mask(texts: pd.Series, phrases: list) -> np.ndarray:
+    """
+    Bitmap of the texts containing any of `phrases`, matched like PhraseIndex
+    but by scanning every text once, for frames not worth indexing
+    """
+    queries = [f" {query}" for query in map(normalize_name, phrases) if query]
+    padded = (f" {normalize_name(text)} " for text in texts)
+    return np.fromiter((any(query in text for query in queries) for text in padded), dtype=bool, count=len(texts))
+
+class RankIndex:
+    """
+    Descending dense rank of every row for a few score columns
+
+    Equal scores share a rank, the highest score is rank 0 and missing scores
+    rank last. top_k() then only has to look ranks up for the candidate rows
+    instead of sorting their scores.
+    """
+
+    def __init__(self, books: pd.DataFrame, columns):
+        self._ranks = {}
+        for column in columns:
+            if column not in books.columns:
+                continue
+            values = books[column].to_numpy(dtype="float64", na_value=np.nan)
+            _, ranks = np.unique(-values, return_inverse=True)
+            self._ranks[column] = readonly(ranks.astype(np.int64))
+
+    def __contains__(self, column) -> bool:
+        return column in self._ranks
+
+    def nbytes(self) -> int:
+        return deep_sizeof(self._ranks)
+
+    def top_k(self, column: str, rows: np.ndarray, k: int) -> np.ndarray:
+        """
+        Positions (into `rows`) of the k best rows by `column`, best first
+
+        Ties keep the order of `rows`, which is what a stable descending sort
+        of the candidates would give.
+        """
+        rows = np.asarray(rows)
+        keys = self._ranks[column][rows] * len(rows) + np.arange(len(rows))
+
+        if k < len(rows):
+            top = np.argpartition(keys, k)[:k]
+        else:
+            top = np.arange(len(rows))
+        return top[np.argsort(keys[top])]
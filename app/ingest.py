@@ -0,0 +1,322 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+def document_id(text: str) -> str:
+    """Index id of a description line, the same on every run"""
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def iter_documents(path: str):
+    """
+    Stream (id, text, metadata) out of a tagged descriptions file
+
+    One document per non-empty line, "<isbn13> <description>". Repeated
+    lines are skipped, and the leading digits go to metadata["isbn"].
+    """
+    source = os.path.basename(path)
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stripped = line.strip()
+            if not stripped:
+                continue
+            doc_id = document_id(stripped)
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+
+            metadata = {"source": source}
+            match = re.match(r"^(\d+)", stripped)
+            if match:
+                metadata["isbn"] = match.group(1)
+            yield doc_id, stripped, metadata
+
+def batched(items, size: int):
+    """(batch number, list of up to `size` items) over any iterable"""
+    items = iter(items)
+    batch_no = 0
+    while batch := list(islice(items, size)):
+        yield batch_no, batch
+        batch_no += 1
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether the provider asked us to slow down (HTTP 429)"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+def with_backoff(fn, retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0, sleep=time.sleep):
+    """
+    Call fn(), retrying rate-limited calls with jittered exponential backoff
+
+    Any other error, and the last rate-limited one, is raised.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries or not is_rate_limited(e):
+                raise
+            # jitter so that the workers don't retry in lockstep
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"Rate limited, retrying in {delay:.1f}s ({attempt + 1}/{retries})")
+            sleep(delay)
+
+class Checkpoint:
+    """
+    Batches already written to the index, saved after every batch
+
+    The signature pins what the batch numbers refer to (source file, batch
+    size, model); a checkpoint with another signature is ignored.
+    """
+
+    def __init__(self, path: str, signature: dict):
+        self.path = path
+        self.signature = signature
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("signature") == signature:
+                self.done = set(saved["done"])
+            else:
+                logger.info(f"Ignoring checkpoint {path}, it was written for other inputs")
+
+    def __contains__(self, batch_no: int) -> bool:
+        return batch_no in self.done
+
+    def mark(self, batch_no: int):
+        self.done.add(batch_no)
+        # write and rename, an interruption never leaves half a checkpoint
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"signature": self.signature, "done": sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        self.done = set()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def build_index(documents, embeddings, collection, batch_size: int = 100, workers: int = 4,
+                checkpoint: Checkpoint | None = None, retries: int = 6) -> dict:
+    """
+    Embed documents in batches on a worker pool and write each batch as it completes
+
+    Args:
+        documents: iterable of (id, text, metadata), read lazily
+        embeddings: LangChain embeddings, embed_documents is called once per batch
+        collection: ChromaDB collection the batches are upserted into
+        batch_size: documents per embedding call and per write
+        workers: embedding calls in flight at once
+        checkpoint: batches already written are skipped, new ones recorded
+        retries: attempts per batch after a rate-limit error
+
+    Returns:
+        documents written and skipped, seconds and documents per second
+    """
+    start = time.perf_counter()
+    stats = {"written": 0, "skipped": 0}
+
+    def embed(batch):
+        texts = [text for _, text, _ in batch]
+        return with_backoff(lambda: embeddings.embed_documents(texts), retries)
+
+    def write_completed(pending, return_when):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            batch_no, batch = pending.pop(future)
+            ids, texts, metadatas = zip(*batch)
+            collection.upsert(ids=list(ids), embeddings=future.result(), metadatas=list(metadatas), documents=list(texts))
+            if checkpoint is not None:
+                checkpoint.mark(batch_no)
+            stats["written"] += len(batch)
+            elapsed = time.perf_counter() - start
+            logger.info(f"Batch {batch_no}: {stats['written']} documents written, {stats['written'] / elapsed:.1f} docs/s")
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for batch_no, batch in batched(documents, batch_size):
+                if checkpoint is not None and batch_no in checkpoint:
+                    stats["skipped"] += len(batch)
+                    continue
+                pending[pool.submit(embed, batch)] = (batch_no, batch)
+                # bounded read-ahead, the file is never held in memory whole
+                if len(pending) >= 2 * workers:
+                    write_completed(pending, FIRST_COMPLETED)
+            while pending:
+                write_completed(pending, FIRST_COMPLETED)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+    seconds = time.perf_counter() - start
+    stats.update({"seconds": seconds, "docs_per_sec": stats["written"] / seconds if seconds else 0.0})
+    return stats
+
+# rough token count of a text for cost estimates, ~4 characters per token
+# for English with OpenAI's tokenizers
+CHARS_PER_TOKEN = 4
+
+def manifest_path(index_path: str) -> str:
+    """Where the manifest of the index at `index_path` lives, next to it"""
+    return f"{os.path.normpath(index_path)}.manifest.json"
+
+class Manifest:
+    """
+    What the index holds: isbn13 -> hash of its tagged description and the
+    embedding model its vector came from
+
+    The hash is also the document id in the index (document_id()), so a
+    stale vector can be deleted without looking it up.
+    """
+
+    def __init__(self, path: str, entries: dict | None = None):
+        self.path = path
+        self.entries = entries if entries is not None else {}
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        """The saved manifest, or an empty one when there is none"""
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path) as f:
+            return cls(path, json.load(f))
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+class IndexDelta:
+    """
+    Books to embed (new or changed) and vectors to delete, against a manifest
+
+    Only (key, document id) pairs are kept, not the texts; documents() picks
+    the texts out of a second pass over the source when they get embedded.
+    """
+
+    def __init__(self, new: list, changed: list, removed: list, unchanged: int, stale_ids: list, model: str,
+                 chars: int = 0):
+        self.new = new
+        self.changed = changed
+        self.removed = removed
+        self.unchanged = unchanged
+        self.stale_ids = stale_ids
+        self.model = model
+        # characters of the texts to embed, for the cost estimate
+        self.chars = chars
+
+    @property
+    def to_embed(self) -> list:
+        return self.new + self.changed
+
+    def documents(self, documents):
+        """The (id, text, metadata) of the books to embed, streamed out of `documents` in source order"""
+        wanted = {doc_id: key for key, doc_id in self.to_embed}
+        for document in documents:
+            key = wanted.get(document[0])
+            if key is not None and key == book_key(document[0], document[2]):
+                del wanted[document[0]]
+                yield document
+
+    def estimated_tokens(self) -> int:
+        return self.chars // CHARS_PER_TOKEN
+
+    def summary(self, price_per_1k_tokens: float = 0.0) -> dict:
+        tokens = self.estimated_tokens()
+        return {
+            "model": self.model,
+            "new": len(self.new),
+            "changed": len(self.changed),
+            "removed": len(self.removed),
+            "unchanged": self.unchanged,
+            "estimated_tokens": tokens,
+            "estimated_cost": tokens / 1000 * price_per_1k_tokens,
+        }
+
+def book_key(doc_id: str, metadata: dict) -> str:
+    return metadata.get("isbn") or doc_id
+
+def plan_reindex(documents, manifest: Manifest, model: str) -> IndexDelta:
+    """
+    Compare the documents with the manifest
+
+    A book is changed when its description hash or the model differs from
+    the manifest, removed when the manifest has it but the documents don't.
+    The first document of an ISBN wins. The texts are only measured, not kept.
+    """
+    new, changed, stale_ids = [], [], []
+    seen = set()
+    chars = 0
+    for doc_id, text, metadata in documents:
+        key = book_key(doc_id, metadata)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        entry = manifest.entries.get(key)
+        if entry is None:
+            new.append((key, doc_id))
+        elif entry["hash"] != doc_id or entry["model"] != model:
+            changed.append((key, doc_id))
+            # same text under a new model keeps its id, the upsert replaces
+            # the vector; deleting it would also hit vectors a resumed run
+            # already re-embedded
+            if entry["hash"] != doc_id:
+                stale_ids.append(entry["hash"])
+        else:
+            continue
+        chars += len(text)
+
+    removed = [key for key in manifest.entries if key not in seen]
+    stale_ids += [manifest.entries[key]["hash"] for key in removed]
+    unchanged = len(seen) - len(new) - len(changed)
+    return IndexDelta(new, changed, removed, unchanged, stale_ids, model, chars)
+
+def apply_delta(delta: IndexDelta, documents, manifest: Manifest, embeddings, collection, batch_size: int = 100,
+                workers: int = 4, checkpoint: Checkpoint | None = None, delete_batch: int = 5000) -> dict:
+    """
+    Bring the index and the manifest in line with the documents of `delta`
+
+    Stale vectors (old descriptions and removed books) are deleted by id, new and
+    changed books streamed out of `documents` (the source the delta was planned
+    on, read again) and embedded with build_index(), and the manifest saved once
+    everything is written. Unchanged books are not touched.
+
+    Returns:
+        build_index() stats plus the number of vectors deleted
+    """
+    for start in range(0, len(delta.stale_ids), delete_batch):
+        collection.delete(ids=delta.stale_ids[start:start + delete_batch])
+
+    stats = build_index(delta.documents(documents), embeddings, collection, batch_size, workers, checkpoint)
+
+    for key in delta.removed:
+        manifest.entries.pop(key, None)
+    for key, doc_id in delta.to_embed:
+        manifest.entries[key] = {"hash": doc_id, "model": delta.model}
+    manifest.save()
+
+    stats["deleted"] = len(delta.stale_ids)
+    return stats
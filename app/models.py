@@ -47,6 +47,7 @@ class BookRecommendation(BaseModel):
     sadness: float = Field(default=0.0)
     surprise: float = Field(default=0.0)
     neutral: float = Field(default=0.0)
+    distance: Optional[float] = Field(default=None) # to the query, lower is closer (None when not ranked)
 
     class Config:
         extra = 'allow'  # Allow extra fields if necessary
@@ -73,4 +74,15 @@ class BookRecommendationResponse(BaseModel):
     recommendations: List[BookRecommendation]
     validation: FilterValidationLog
     filters: FilterSchema
-    content: str
\ No newline at end of file
+    content: str
+    catalog_version: Optional[str] = None # changes whenever the books or the index are swapped
+
+# admin call to swap in a new catalog snapshot
+class ReloadCatalogRequest(BaseModel):
+    books_path: Optional[str] = None
+    chroma_db_path: Optional[str] = None
+    embeddings_path: Optional[str] = None
+
+class CatalogVersionResponse(BaseModel):
+    catalog_version: str
+    num_books: int
\ No newline at end of file
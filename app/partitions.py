@@ -0,0 +1,60 @@
+import logging
+import re
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Besides the global collection, the index can hold one collection per
+# simple_categories value (see data_processing/partition_by_genre.py). A
+# genre-filtered query searches the collection of its genre, where every
+# neighbour already meets the genre constraint.
+
+# the collection Chroma.from_documents() writes when no name is given
+DEFAULT_COLLECTION = "langchain"
+GENRE_COLLECTION_PREFIX = "genre_"
+
+def genre_collection_name(genre: str) -> str:
+    """ChromaDB collection of a genre, "Children's Fiction" -> "genre_children_s_fiction\""""
+    return GENRE_COLLECTION_PREFIX + re.sub(r"[^a-z0-9]+", "_", genre.lower()).strip("_")
+
+def collection_names(db_books) -> set:
+    """Names of the collections stored next to the global one"""
+    # older chromadb clients list names, newer ones Collection objects
+    return {getattr(collection, "name", collection) for collection in db_books._client.list_collections()}
+
+def load_genre_indexes(db_books, genre_counts: dict, open_collection: Callable) -> dict:
+    """
+    Open the genre sub-indexes that match the catalog
+
+    Args:
+        db_books: the global ChromaDB collection, to list what's stored
+        genre_counts: books per simple_categories value in the catalog
+        open_collection: collection name -> opened vector store
+
+    Returns:
+        genre -> (vector store, number of vectors), for the genres whose
+        sub-index holds exactly as many vectors as the catalog has books
+    """
+    try:
+        stored = collection_names(db_books)
+    except Exception as e:
+        logger.warning(f"Could not list the genre sub-indexes: {e}")
+        return {}
+
+    indexes = {}
+    for genre, count in genre_counts.items():
+        name = genre_collection_name(genre)
+        if name not in stored:
+            continue
+
+        index = open_collection(name)
+        size = index._collection.count()
+        if size != count:
+            # built for another version of the books
+            logger.warning(f"Skipping stale genre index {name}: {size} vectors for {count} books")
+            continue
+        indexes[genre] = (index, size)
+
+    if indexes:
+        logger.info(f"Opened genre indexes: {', '.join(f'{genre} ({size})' for genre, (_, size) in indexes.items())}")
+    return indexes
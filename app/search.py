@@ -1,42 +1,371 @@
+import time
+import numpy as np
 import pandas as pd
 import logging
 
+from app.catalog import Catalog
+from app.semantic_cache import SemanticCache
+from app.vector_store import as_vector_store
+from app.vectors import EmbeddingMatrix, ranked_array
+
 logger = logging.getLogger(__name__)
 
-def similarity_search_filtered(query: str, filtered_books: pd.DataFrame, db_books, k: int = 20):
+# without a calibrated cost model, candidate sets up to this size are scored
+# exactly against the embedding matrix, larger ones go through the HNSW index
+BRUTE_FORCE_MAX_ROWS = 2000
+
+# most neighbours an iterative-deepening search fetches before giving up
+SEARCH_BUDGET = 800
+
+def median_ms(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+class SearchCosts:
+    """
+    Estimated latency (ms) of the two search paths for a request
+
+    brute force:  fixed + candidates * dim * per_value   (gather and score the rows)
+    HNSW:         fixed + k * per_k + filter ids * per_id (graph walk + the $in filter)
+    deepening:    one unfiltered HNSW query per page of k, 2k, 4k...
+
+    The coefficients come from calibrate(), a micro-benchmark of both paths
+    on the loaded index, so the break-even point follows the machine, the
+    embedding dimension and the size of the index.
+    """
+
+    def __init__(self, dim: int, brute_fixed: float, brute_per_value: float,
+                 hnsw_fixed: float, hnsw_per_k: float, hnsw_per_id: float):
+        self.dim = dim
+        self.brute_fixed = brute_fixed
+        self.brute_per_value = brute_per_value
+        self.hnsw_fixed = hnsw_fixed
+        self.hnsw_per_k = hnsw_per_k
+        self.hnsw_per_id = hnsw_per_id
+
+    def brute_force(self, candidates: int) -> float:
+        return self.brute_fixed + candidates * self.dim * self.brute_per_value
+
+    def hnsw(self, candidates: int, k: int, filtered: bool = True) -> float:
+        return self.hnsw_fixed + k * self.hnsw_per_k + (candidates * self.hnsw_per_id if filtered else 0.0)
+
+    def deepening(self, k: int, selectivity: float) -> float:
+        """Unfiltered pages of k, 2k, 4k... until about k / selectivity neighbours are in"""
+        needed = k / selectivity
+        page = k
+        cost = self.hnsw(0, page, filtered=False)
+        while page < needed:
+            page *= 2
+            cost += self.hnsw(0, page, filtered=False)
+        return cost
+
+    def use_brute_force(self, candidates: int, k: int, filtered: bool = True) -> bool:
+        return self.brute_force(candidates) <= self.hnsw(candidates, k, filtered)
+
+    @classmethod
+    def calibrate(cls, db_books, vectors: EmbeddingMatrix, repeats: int = 5) -> "SearchCosts":
+        """Time both paths on a few sizes and fit the coefficients"""
+        present = np.flatnonzero(vectors.present)
+        # a vector from the index stands in for a query, no embedding call needed
+        query_vector = np.asarray(vectors.matrix[present[0]], dtype=np.float32)
+
+        small, large = min(256, len(present)), min(4096, len(present))
+        brute_small = median_ms(lambda: vectors.search(query_vector, present[:small], 10), repeats)
+        brute_large = median_ms(lambda: vectors.search(query_vector, present[:large], 10), repeats)
+        brute_per_value = max(0.0, (brute_large - brute_small) / max(1, (large - small) * vectors.dim))
+        brute_fixed = max(0.0, brute_small - small * vectors.dim * brute_per_value)
+
+        store = as_vector_store(db_books)
+        query_list = query_vector.tolist()
+        k_small, k_large = 10, 100
+        hnsw_small = median_ms(lambda: store.search(query_list, k_small), repeats)
+        hnsw_large = median_ms(lambda: store.search(query_list, k_large), repeats)
+        hnsw_per_k = max(0.0, (hnsw_large - hnsw_small) / (k_large - k_small))
+        hnsw_fixed = max(0.0, hnsw_small - k_small * hnsw_per_k)
+
+        hnsw_per_id = 0.0
+        if vectors.isbns is not None:
+            isbns = sorted(str(isbn) for isbn in vectors.isbns[present[:large]])
+            hnsw_filtered = median_ms(
+                lambda: store.filtered_search(query_list, k_small, isbns),
+                repeats,
+            )
+            hnsw_per_id = max(0.0, (hnsw_filtered - hnsw_small) / len(isbns))
+
+        costs = cls(vectors.dim, brute_fixed, brute_per_value, hnsw_fixed, hnsw_per_k, hnsw_per_id)
+        logger.info(
+            f"Calibrated search costs: brute force {brute_fixed:.2f} ms + {brute_per_value * vectors.dim * 1000:.2f} us/row, "
+            f"HNSW {hnsw_fixed:.2f} ms + {hnsw_per_k * 1000:.1f} us/k + {hnsw_per_id * 1000:.2f} us/filtered id"
+        )
+        return costs
+
+def choose_search_path(candidates: int, k: int, num_books: int | None, budget: int,
+                       vectors: EmbeddingMatrix | None, costs: SearchCosts | None) -> str:
+    """
+    "brute force", "filtered" (HNSW with the ISBN allow-list) or "deepening"
+    (unfiltered HNSW pages, checked against the candidates as they arrive)
+    """
+    selectivity = candidates / num_books if num_books else 0.0
+
+    if costs is None:
+        if vectors is not None and candidates <= BRUTE_FORCE_MAX_ROWS:
+            return "brute force"
+        # a long $in list costs more than dropping the few outsiders
+        return "deepening" if selectivity >= 0.5 else "filtered"
+
+    estimates = {"filtered": costs.hnsw(candidates, k)}
+    # past the budget deepening would stop short of k books, not an option
+    if selectivity and k / selectivity <= budget:
+        estimates["deepening"] = costs.deepening(k, selectivity)
+    if vectors is not None:
+        estimates["brute force"] = costs.brute_force(candidates)
+
+    path = min(estimates, key=estimates.get)
+    logger.info(
+        f"Search plan for {candidates} books: {path} ("
+        + ", ".join(f"{name} ~{estimate:.2f} ms" for name, estimate in estimates.items()) + ")"
+    )
+    return path
+
+class CandidateRows:
+    """
+    ISBN -> row id of the books a search may return
+
+    With a catalog it looks ISBNs up in the catalog's precomputed dict and
+    checks a bitmap of the candidate rows, so no per-request dict of ISBN
+    strings gets built. Iterating yields the candidate ISBNs.
+    """
+
+    def __init__(self, filtered_books: pd.DataFrame, catalog: Catalog | None = None):
+        rows = np.asarray(filtered_books.index, dtype=np.intp)
+        if catalog is not None:
+            self._rows_by_isbn = catalog.rows_by_isbn
+            self._candidates = np.zeros(len(catalog), dtype=bool)
+            self._candidates[rows] = True
+            self._isbns = catalog.isbns[rows]
+        else:
+            self._isbns = filtered_books["isbn13"].astype(str).to_numpy(dtype=str)
+            self._rows_by_isbn = dict(zip(self._isbns.tolist(), rows.tolist()))
+            self._candidates = None
+
+    def get(self, isbn: str | None) -> int | None:
+        row = self._rows_by_isbn.get(isbn)
+        if row is None or (self._candidates is not None and not self._candidates[row]):
+            return None
+        return row
+
+    def __iter__(self):
+        return iter(self._isbns.tolist())
+
+    def __len__(self) -> int:
+        return len(self._isbns)
+
+def deepening_search(query_vector, db_books, allowed, k: int, budget: int) -> tuple:
+    """
+    Fetch unfiltered neighbours in pages of k, 2k, 4k... until k of them are allowed
+
+    Args:
+        query_vector: embedded query
+        db_books: VectorStore (or LangChain Chroma collection) to search
+        allowed: ISBN -> row id of the books that may be returned (a dict or CandidateRows)
+        k: number of allowed books wanted
+        budget: most neighbours to fetch
+
+    Returns:
+        (RANKED_DTYPE array of the allowed neighbours, neighbours examined)
+    """
+    store = as_vector_store(db_books)
+    found, seen = [], set()
+    page = min(k, budget)
+    while True:
+        recs = store.search(query_vector, page)
+        # every page repeats the one before it, only look at the new neighbours
+        for isbn, distance in recs:
+            if isbn in seen:
+                continue
+            seen.add(isbn)
+            row = allowed.get(isbn)
+            if row is not None:
+                found.append((row, distance))
+
+        if len(found) >= k or len(recs) < page or page >= budget:
+            found = found[:k]
+            return ranked_array([row for row, _ in found], [distance for _, distance in found]), len(seen)
+        page = min(page * 2, budget)
+
+def similarity_search_ranked(query: str, filtered_books: pd.DataFrame, db_books, k: int = 20, num_books: int | None = None,
+                             vectors: EmbeddingMatrix | None = None, costs: SearchCosts | None = None,
+                             budget: int = SEARCH_BUDGET, catalog: Catalog | None = None, query_vector=None) -> tuple:
+    """
+    Rank the filtered books against the query, closest first
+
+    The query is embedded once (unless `query_vector` already is) and answered by the cheapest of three paths:
+    exact scoring of the candidate rows on the embedding matrix, ChromaDB with
+    the candidate ISBNs pushed in as a metadata filter, or unfiltered ChromaDB
+    pages of k, 2k, 4k... whose neighbours are checked against the candidates
+    as they arrive, stopping at k survivors or the budget. Deepening that
+    runs out of budget short of k books is followed by the filtered query.
+
+    Returns:
+        (RANKED_DTYPE array of up to k (row, distance) pairs, where row is the
+        index label of filtered_books, neighbours examined)
+    """
+    store = as_vector_store(db_books)
+    candidates = len(filtered_books)
+    path = choose_search_path(candidates, k, num_books, budget, vectors, costs)
+    if query_vector is None:
+        query_vector = store.embed_query(query)
+
+    start = time.perf_counter()
+    if path == "brute force":
+        # one matrix-vector product over just the candidate rows
+        ranked = vectors.search(query_vector, filtered_books.index, k)
+        examined = candidates
+    else:
+        # row id (the index label) of every candidate ISBN
+        allowed = CandidateRows(filtered_books, catalog)
+
+        ranked, examined = None, 0
+        if path == "deepening":
+            ranked, examined = deepening_search(query_vector, store, allowed, k, budget)
+            if len(ranked) < min(k, candidates):
+                # the budget ran out before k candidates came up
+                logger.info(f"Deepening found {len(ranked)} of {k} books, falling back to a filtered search")
+                path, ranked = "filtered", None
+
+        if ranked is None:
+            # only rank the allowed books, unless that's every book in the index
+            if num_books is None or candidates < num_books:
+                recs = store.filtered_search(query_vector, k, allowed)
+            else:
+                recs = store.search(query_vector, k)
+
+            rows, distances = [], []
+            for isbn, distance in recs:
+                # the filter already did this, it guards against a stale index
+                row = allowed.get(isbn)
+                if row is not None:
+                    rows.append(row)
+                    distances.append(distance)
+            ranked = ranked_array(rows[:k], distances[:k])
+            examined += len(recs)
+
+    logger.info(
+        f"{path} search over {candidates} books returned {len(ranked)} of {k}, "
+        f"examined {examined} neighbours in {(time.perf_counter() - start) * 1000:.2f} ms"
+    )
+    return ranked, examined
+
+def rank_candidates(query_vector, filtered_books: pd.DataFrame, db_books, vectors: EmbeddingMatrix | None = None,
+                    catalog: Catalog | None = None) -> np.ndarray:
+    """
+    Every book of filtered_books closest first, as a RANKED_DTYPE array
+
+    Scored on the embedding matrix when there is one, otherwise by one
+    filtered query over just these ISBNs. Books without a vector come last
+    with a NaN distance, none is dropped.
+    """
+    rows = np.asarray(filtered_books.index, dtype=np.intp)
+    if vectors is not None:
+        ranked = vectors.search(query_vector, rows, len(rows))
+    else:
+        allowed = CandidateRows(filtered_books, catalog)
+        found = {}
+        for isbn, distance in as_vector_store(db_books).filtered_search(query_vector, len(rows), allowed):
+            row = allowed.get(isbn)
+            if row is not None and row not in found:
+                found[row] = distance
+        ranked = ranked_array(list(found), list(found.values()))
+
+    missing = rows[~np.isin(rows, ranked["row"])]
+    return np.concatenate([ranked, ranked_array(missing, np.full(len(missing), np.nan))])
+
+def similarity_search_filtered(query: str, filtered_books: pd.DataFrame, db_books, k: int = 20, num_books: int | None = None,
+                               vectors: EmbeddingMatrix | None = None, costs: SearchCosts | None = None,
+                               eligible: np.ndarray | None = None, budget: int = SEARCH_BUDGET,
+                               catalog: Catalog | None = None, result_cache: SemanticCache | None = None,
+                               cache_key: tuple | None = None):
     """
     Perform similarity search but only return results from the filtered DataFrame
-    
+
+    See similarity_search_ranked() for how the search runs. The books come
+    back closest first with their `distance` to the query (squared L2, lower
+    is closer), and the number of neighbours examined is left in the result's
+    attrs. The post-filters keep that order, so without a tone the closest
+    books are the answer. When k or fewer books are left they are all
+    returned, still ordered and with distances (see rank_candidates()).
+
+    With a result_cache, a query close enough to a cached one with the same
+    cache_key reuses its ranking instead of searching. The distances of the
+    reused rows are recomputed against this query on the embedding matrix,
+    and left missing without one.
+
     Args:
         query: The search query string
         filtered_books: DataFrame of books already filtered by pre-filters
-        db_books: ChromaDB collection for similarity search
+        db_books: VectorStore to search, a LangChain Chroma collection gets
+            wrapped in a ChromaStore
         k: Maximum number of results to return
-        
+        num_books: Number of books db_books holds (the whole catalog, or a genre
+            for a genre sub-index), for the share of books that passed
+        vectors: Embedding matrix aligned with the catalog row ids (the index
+            of filtered_books), None to always search ChromaDB
+        costs: Calibrated SearchCosts that pick the cheapest path, without
+            them a fixed rule does
+        eligible: Bitmap over catalog rows of the books the cheap post-filters
+            keep, applied to the candidates before ranking
+        budget: Most neighbours the deepening path may fetch
+        catalog: Catalog the books come from, its precomputed ISBN -> row id
+            dict maps the search results back to rows
+        result_cache: SemanticCache of recent rankings
+        cache_key: semantic_cache.result_key() of the request, what besides
+            the query the ranking depends on
+
     Returns:
         DataFrame of books matching both filters and similarity search, limited to k results
     """
-    if len(filtered_books) <= k:
+    # the cheap post-filters are plain row predicates, so they narrow the candidates
+    if eligible is not None:
+        filtered_books = filtered_books[eligible[np.asarray(filtered_books.index)]]
+
+    if len(filtered_books) == 0:
         return filtered_books
 
-    # Get all ISBNs from filtered books
-    filtered_isbns = set(filtered_books['isbn13'].astype(str))
-    
-    # Do a larger ChromaDB search to ensure we have enough candidates
-    search_k = min(k * 5, 400)  # Search more to account for filtering
-    recs = db_books.similarity_search(query, k=search_k)
-    
-    # Extract ISBNs from ChromaDB results
-    valid_results = []
-    for rec in recs:
-        # Parse ISBN from format: "<isbn> <description>"
-        parts = rec.page_content.strip().split()
-        if parts:
-            isbn = parts[0]
-            if isbn in filtered_isbns:
-                valid_results.append(isbn)
-            if len(valid_results) >= k:
-                break
-    
-    # Return filtered books that match the similarity search
-    return filtered_books[filtered_books['isbn13'].isin(valid_results)].head(k)
+    use_cache = result_cache is not None and cache_key is not None and len(filtered_books) > k
+    query_vector, cached = None, None
+    if use_cache or len(filtered_books) <= k:
+        query_vector = as_vector_store(db_books).embed_query(query)
+    if use_cache:
+        cached = result_cache.get(cache_key, query_vector)
+
+    if len(filtered_books) <= k:
+        # everything fits, no search for neighbours, only put the books in order
+        ranked, examined = rank_candidates(query_vector, filtered_books, db_books, vectors, catalog), len(filtered_books)
+    elif cached is not None and not result_cache.should_verify():
+        logger.info(f"Reusing the ranking of a similar query, {len(cached)} of {k} books")
+        # the cached distances are to the other query, score the rows against
+        # this one (missing, so None in the response, without the matrix)
+        if vectors is not None:
+            distances = vectors.distances(query_vector, cached["row"])
+        else:
+            distances = np.full(len(cached), np.nan)
+        ranked, examined = ranked_array(cached["row"], distances), 0
+    else:
+        ranked, examined = similarity_search_ranked(
+            query, filtered_books, db_books, k, num_books, vectors, costs, budget, catalog, query_vector
+        )
+        if cached is not None:
+            # a sampled hit, searched anyway to see how far the cached ranking is off
+            result_cache.record_overlap(cached, ranked)
+        elif use_cache:
+            result_cache.put(cache_key, query_vector, ranked)
+
+    # Return the matching books in rank order, with their distances
+    books = filtered_books.loc[ranked["row"]].assign(distance=ranked["distance"])
+    books.attrs["neighbours_examined"] = examined
+    books.attrs["semantic_cache_hit"] = cached is not None
+    return books
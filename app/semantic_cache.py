@@ -0,0 +1,111 @@
+import random
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from app.filter_cache import canonical_filters
+
+def result_key(version: str, filters: dict, k: int) -> tuple:
+    """
+    What a ranked result depends on besides the query: the catalog version,
+    the canonical pre-filters, the names post-filter (it narrows the
+    candidates before ranking) and k
+    """
+    names = filters.get("names")
+    return (version, canonical_filters(filters), tuple(names) if names else None, k)
+
+def unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SemanticCache:
+    """
+    Bounded LRU cache of ranked search results, matched on query similarity
+
+    Entries are (result key, unit query embedding, ranked rows). A lookup
+    hits when a cached query with the same result key is within `threshold`
+    cosine similarity of the new one, so rephrasings of the same request
+    reuse its ranked candidates instead of searching again.
+
+    A `verify_rate` share of the hits is searched anyway and compared with
+    the cached ranking, which measures how much a hit changes the answer.
+    """
+
+    def __init__(self, maxsize: int = 1024, threshold: float = 0.97, verify_rate: float = 0.0, seed: int | None = None):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.verify_rate = verify_rate
+        # entry id -> (key, unit vector, ranked), least recently used first
+        self._entries = OrderedDict()
+        # key -> ids of its entries (a dict as an ordered set)
+        self._by_key = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.hits = 0
+        self.misses = 0
+        self.verified = 0
+        self._overlap_sum = 0.0
+
+    def get(self, key: tuple, query_vector) -> Optional[np.ndarray]:
+        """Ranked rows of the closest cached query under `key`, None on a miss"""
+        query = unit(query_vector)
+        with self._lock:
+            ids = list(self._by_key.get(key, ()))
+            if ids:
+                similarities = np.stack([self._entries[entry_id][1] for entry_id in ids]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(ids[best])
+                    self.hits += 1
+                    return self._entries[ids[best]][2]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, query_vector, ranked: np.ndarray):
+        ranked = ranked.copy()
+        ranked.flags.writeable = False
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, unit(query_vector), ranked)
+            self._by_key.setdefault(key, {})[entry_id] = None
+
+            while len(self._entries) > self.maxsize:
+                old_id, (old_key, _, _) = self._entries.popitem(last=False)
+                ids = self._by_key[old_key]
+                del ids[old_id]
+                if not ids:
+                    del self._by_key[old_key]
+
+    def should_verify(self) -> bool:
+        """Whether to search anyway on this hit, to measure the overlap"""
+        with self._lock:
+            return self.verify_rate > 0 and self._rng.random() < self.verify_rate
+
+    def record_overlap(self, cached: np.ndarray, fresh: np.ndarray):
+        """Share of the fresh ranking's rows the cached ranking had"""
+        overlap = len(set(cached["row"].tolist()) & set(fresh["row"].tolist())) / len(fresh) if len(fresh) else 1.0
+        with self._lock:
+            self.verified += 1
+            self._overlap_sum += overlap
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "keys": len(self._by_key),
+                "threshold": self.threshold,
+                "memory_bytes": sum(vector.nbytes + ranked.nbytes for _, vector, ranked in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "verified": self.verified,
+                "mean_overlap": self._overlap_sum / self.verified if self.verified else None,
+            }
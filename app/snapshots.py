@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from app.catalog import Catalog, load_catalog
+from app.ingest import manifest_path
+from app.partitions import load_genre_indexes
+from app.search import SearchCosts
+from app.vectors import EmbeddingMatrix, load_embedding_matrix
+
+logger = logging.getLogger(__name__)
+
+class CatalogMismatchError(ValueError):
+    """The books and the vector index of a snapshot do not cover the same ISBNs"""
+
+class CatalogSnapshot:
+    """One consistent version of the catalog and its vector index"""
+
+    def __init__(self, catalog: Catalog, db_books, version: str, books_path: str, chroma_db_path: str,
+                 vectors: EmbeddingMatrix | None = None, embeddings_path: str | None = None,
+                 search_costs: SearchCosts | None = None, genre_indexes: dict | None = None):
+        self.catalog = catalog
+        self.db_books = db_books
+        self.version = version
+        self.books_path = books_path
+        self.chroma_db_path = chroma_db_path
+        # exported embedding matrix for brute-force search, None when not exported
+        self.vectors = vectors
+        self.embeddings_path = embeddings_path
+        # calibrated costs of brute force vs HNSW on this index
+        self.search_costs = search_costs
+        # genre -> (sub-index, number of vectors), only the genres that have one
+        self.genre_indexes = genre_indexes or {}
+
+    def vector_index(self, genre: str | None = None) -> tuple:
+        """(vector store, number of vectors) to search, the genre's sub-index when there is one"""
+        if genre in self.genre_indexes:
+            return self.genre_indexes[genre]
+        return self.db_books, len(self.catalog)
+
+def fingerprint(*paths: str) -> str:
+    """
+    Short version string for a set of data paths
+
+    Built from the resolved paths and the size/mtime of the files among them,
+    so replacing a file or flipping a symlink yields a new version while every
+    worker reading the same files agrees on it. A directory only counts by its
+    resolved path, the files inside are not looked at.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        if path is None:
+            continue
+        real = os.path.realpath(path)
+        digest.update(real.encode())
+
+        if os.path.isfile(real):
+            stat = os.stat(real)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+    return digest.hexdigest()[:12]
+
+def data_version(books_path: str, chroma_db_path: str, embeddings_path: str | None = None,
+                 reduced_path: str | None = None) -> str:
+    """
+    Catalog version of a set of data paths, from files the app never writes
+
+    ChromaDB rewrites its own files when it is queried, so the index counts
+    by its directory and the manifest the index build writes next to it.
+    """
+    return fingerprint(books_path, chroma_db_path, manifest_path(chroma_db_path), embeddings_path, reduced_path)
+
+def vector_isbns(db_books) -> set:
+    """ISBNs stored in the metadata of the vector index"""
+    metadatas = db_books.get(include=["metadatas"])["metadatas"]
+    return {str(metadata["isbn"]) for metadata in metadatas if metadata and metadata.get("isbn")}
+
+def check_isbns_match(catalog: Catalog, db_books):
+    """Raise CatalogMismatchError if books and vectors cover different ISBNs"""
+    book_isbns = set(catalog.books["isbn13"].astype(str))
+    index_isbns = vector_isbns(db_books)
+
+    if book_isbns != index_isbns:
+        raise CatalogMismatchError(
+            f"{len(book_isbns - index_isbns)} books have no vector, "
+            f"{len(index_isbns - book_isbns)} vectors have no book"
+        )
+
+def calibrate_search(db_books, vectors: EmbeddingMatrix | None) -> SearchCosts | None:
+    """Micro-benchmark the search paths of a new snapshot, None if there is no choice to make"""
+    if vectors is None or not vectors.present.any():
+        return None
+    try:
+        return SearchCosts.calibrate(db_books, vectors)
+    except Exception as e:
+        # search falls back to the fixed BRUTE_FORCE_MAX_ROWS cutoff
+        logger.warning(f"Search calibration failed: {e}")
+        return None
+
+class CatalogManager:
+    """
+    Holds the current CatalogSnapshot and swaps in new ones
+
+    A request calls current() once and keeps that snapshot until it is done, so
+    a swap never changes the data under a request that is already running.
+    """
+
+    def __init__(self, books_path: str, chroma_db_path: str, load_db_books: Callable, embeddings_path: str | None = None,
+                 matrix_options: dict | None = None):
+        self.books_path = books_path
+        self.chroma_db_path = chroma_db_path
+        self.embeddings_path = embeddings_path
+        # load_embedding_matrix() keywords: quantize, reduced_path, rerank
+        self.matrix_options = matrix_options or {}
+        self._load_db_books = load_db_books
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._rejected_version: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def current(self) -> CatalogSnapshot:
+        return self._snapshot
+
+    def reload(self, books_path: str | None = None, chroma_db_path: str | None = None, strict: bool = True,
+               embeddings_path: str | None = None) -> CatalogSnapshot:
+        """
+        Load books + vector index, check them, and swap them in together
+
+        Args:
+            books_path: new books.parquet, defaults to the current one
+            chroma_db_path: new ChromaDB directory, defaults to the current one
+            embeddings_path: new exported embedding matrix, defaults to the current one
+            strict: raise CatalogMismatchError on an ISBN mismatch and keep the
+                old snapshot, otherwise only log it
+
+        Returns:
+            The snapshot that is current after the call
+        """
+        books_path = books_path or self.books_path
+        chroma_db_path = chroma_db_path or self.chroma_db_path
+        embeddings_path = embeddings_path or self.embeddings_path
+
+        # one load at a time, requests keep reading the old snapshot meanwhile
+        with self._reload_lock:
+            version = data_version(books_path, chroma_db_path, embeddings_path, self.matrix_options.get("reduced_path"))
+            if self._snapshot is not None and self._snapshot.version == version:
+                return self._snapshot
+
+            db_books = self._load_db_books(chroma_db_path)
+            logger.info(f"Loading catalog version {version}")
+            catalog = load_catalog(books_path, version)
+
+            try:
+                check_isbns_match(catalog, db_books)
+            except CatalogMismatchError as e:
+                if strict:
+                    logger.error(f"Rejected catalog version {version}: {e}")
+                    self._rejected_version = version
+                    raise
+                logger.warning(f"Catalog version {version} is inconsistent: {e}")
+
+            # a matrix exported for other books is skipped, search falls back to ChromaDB
+            vectors = load_embedding_matrix(embeddings_path, catalog.column("isbn13"), **self.matrix_options)
+            search_costs = calibrate_search(db_books, vectors)
+            genre_indexes = load_genre_indexes(
+                db_books, catalog.stats.genre_counts, lambda name: self._load_db_books(chroma_db_path, name)
+            )
+
+            self._snapshot = CatalogSnapshot(
+                catalog, db_books, version, books_path, chroma_db_path, vectors, embeddings_path, search_costs,
+                genre_indexes
+            )
+            self.books_path = books_path
+            self.chroma_db_path = chroma_db_path
+            self.embeddings_path = embeddings_path
+
+            logger.info(f"Serving catalog version {version}")
+            return self._snapshot
+
+    def poll(self):
+        """Reload if the files behind the current paths changed"""
+        version = data_version(self.books_path, self.chroma_db_path, self.embeddings_path, self.matrix_options.get("reduced_path"))
+        # unchanged, or a version we already rejected
+        if version in (self._snapshot.version, self._rejected_version):
+            return
+        try:
+            self.reload()
+        except Exception as e:
+            # keep serving the old snapshot, the next poll tries again
+            logger.error(f"Catalog reload failed: {e}")
+
+    def start_watching(self, interval: float):
+        """Poll the data paths every `interval` seconds in a daemon thread"""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.poll()
+
+        self._watcher = threading.Thread(target=watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
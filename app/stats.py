@@ -0,0 +1,66 @@
+import numpy as np
+
+# Column statistics gathered once per catalog at load time. They are cheap
+# summaries of the indexes, good enough to tell a filter that keeps a handful
+# of books from one that keeps half the catalog.
+
+class Quantiles:
+    """Evenly spaced quantiles of a numeric column, for range cardinality estimates"""
+
+    def __init__(self, sorted_values: np.ndarray, points: int = 101):
+        self.count = len(sorted_values)
+        if self.count:
+            positions = np.linspace(0, self.count - 1, points).round().astype(np.intp)
+            self.values = sorted_values[positions]
+        else:
+            self.values = np.empty(0)
+        self._fractions = np.linspace(0, 1, len(self.values))
+
+    def estimate(self, low=None, high=None) -> int:
+        """Approximate number of values with low <= value <= high (either bound may be None)"""
+        if not self.count or (low is not None and high is not None and low > high):
+            return 0
+        below_low = 0.0 if low is None else np.interp(low, self.values, self._fractions)
+        below_high = 1.0 if high is None else np.interp(high, self.values, self._fractions)
+        return int(round(max(0.0, below_high - below_low) * self.count))
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        last = len(self.values) - 1
+        points = {"min": 0, "p25": 0.25, "p50": 0.5, "p75": 0.75, "max": 1}
+        return {"count": self.count, **{name: float(self.values[round(p * last)]) for name, p in points.items()}}
+
+class CatalogStats:
+    """Histograms and quantiles of the filterable columns of a catalog"""
+
+    def __init__(self, catalog):
+        self.num_books = len(catalog)
+
+        # books per simple_categories value
+        self.genre_counts = catalog.genres.counts()
+
+        # books per distinct normalized author name
+        self.author_counts = catalog.authors.counts()
+        self.distinct_authors = len(self.author_counts)
+
+        # the range indexes are already sorted, so quantiles are a strided read
+        self.num_pages = Quantiles(catalog.num_pages.values)
+        self.published_year = Quantiles(catalog.published_year.values)
+
+    def estimate_authors(self, catalog, authors: list) -> int:
+        """Books by any of `authors` (an upper bound, co-authored books count twice)"""
+        names = set().union(*(catalog.authors.names(author) for author in authors))
+        return min(self.num_books, sum(self.author_counts[name] for name in names))
+
+    def estimate_genre(self, genre: str) -> int:
+        return self.genre_counts.get(genre, 0)
+
+    def summary(self) -> dict:
+        return {
+            "num_books": self.num_books,
+            "genres": self.genre_counts,
+            "distinct_authors": self.distinct_authors,
+            "num_pages": self.num_pages.summary(),
+            "published_year": self.published_year.summary(),
+        }
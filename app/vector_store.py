@@ -0,0 +1,219 @@
+import logging
+from abc import ABC, abstractmethod
+import numpy as np
+
+from app.vectors import EmbeddingMatrix
+
+logger = logging.getLogger(__name__)
+
+# The few operations search needs from a vector index, so ChromaDB can be
+# swapped for an in-process index. Every backend speaks ISBNs and squared L2
+# distances (lower is closer), what the ChromaDB collection reports.
+
+class VectorStore(ABC):
+    """
+    Interface of a vector index over the books
+
+    Results are lists of (isbn, distance) pairs, closest first.
+    """
+
+    # LangChain Embeddings that turn a query into a vector, None if the
+    # store only takes vectors
+    embeddings = None
+
+    def embed_query(self, query: str) -> list:
+        if self.embeddings is None:
+            raise ValueError(f"{type(self).__name__} has no embedding function")
+        return self.embeddings.embed_query(query)
+
+    @abstractmethod
+    def search(self, query_vector, k: int) -> list:
+        """The k nearest books"""
+
+    @abstractmethod
+    def filtered_search(self, query_vector, k: int, isbns) -> list:
+        """The k nearest books among `isbns`"""
+
+    def batch_search(self, query_vectors, k: int, isbns=None) -> list:
+        """One search (or filtered search) per query vector"""
+        if isbns is None:
+            return [self.search(query_vector, k) for query_vector in query_vectors]
+        return [self.filtered_search(query_vector, k, isbns) for query_vector in query_vectors]
+
+    @abstractmethod
+    def get(self, isbns) -> dict:
+        """ISBN -> stored vector, for the ISBNs the store has"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of books with a vector"""
+
+def metadata_isbn(metadata) -> str | None:
+    """ISBN stored in the metadata of a ChromaDB document"""
+    isbn = (metadata or {}).get("isbn")
+    return str(isbn) if isbn else None
+
+class ChromaStore(VectorStore):
+    """
+    A LangChain Chroma collection (HNSW inside ChromaDB)
+
+    Queries go to the underlying collection and only ask for the metadata
+    and distances, the descriptions are never read or copied.
+    """
+
+    def __init__(self, db_books):
+        self.db_books = db_books
+
+    @property
+    def embeddings(self):
+        return self.db_books.embeddings
+
+    def _query(self, query_vectors: list, k: int, isbns=None) -> list:
+        # the index stores the ISBN in the metadata
+        where = None if isbns is None else {"isbn": {"$in": sorted(str(isbn) for isbn in isbns)}}
+        result = self.db_books._collection.query(
+            query_embeddings=query_vectors, n_results=k, where=where, include=["metadatas", "distances"],
+        )
+        return [
+            [(metadata_isbn(metadata), distance) for metadata, distance in zip(metadatas, distances)]
+            for metadatas, distances in zip(result["metadatas"], result["distances"])
+        ]
+
+    def search(self, query_vector, k: int) -> list:
+        return self._query([query_vector], k)[0]
+
+    def filtered_search(self, query_vector, k: int, isbns) -> list:
+        return self._query([query_vector], k, isbns)[0]
+
+    def batch_search(self, query_vectors, k: int, isbns=None) -> list:
+        # one query() call for the whole batch
+        return self._query([np.asarray(query_vector, dtype=np.float32) for query_vector in query_vectors], k, isbns)
+
+    def get(self, isbns) -> dict:
+        stored = self.db_books.get(
+            where={"isbn": {"$in": [str(isbn) for isbn in isbns]}},
+            include=["embeddings", "metadatas"],
+        )
+        vectors = {}
+        for embedding, metadata in zip(stored["embeddings"], stored["metadatas"]):
+            vectors.setdefault(str(metadata["isbn"]), np.asarray(embedding, dtype=np.float32))
+        return vectors
+
+    def __len__(self) -> int:
+        return self.db_books._collection.count()
+
+class NumpyStore(VectorStore):
+    """Exact search over an in-memory (or memory-mapped) EmbeddingMatrix"""
+
+    def __init__(self, vectors: EmbeddingMatrix, embeddings=None):
+        self.vectors = vectors
+        self.embeddings = embeddings
+        self.isbns = np.asarray(vectors.isbns, dtype=str)
+        self._rows = {isbn: row for row, isbn in enumerate(self.isbns)}
+        self._present = np.flatnonzero(vectors.present)
+
+    def _pairs(self, ranked: np.ndarray) -> list:
+        return list(zip(self.isbns[ranked["row"]].tolist(), ranked["distance"].tolist()))
+
+    def search(self, query_vector, k: int) -> list:
+        return self._pairs(self.vectors.search(query_vector, self._present, k))
+
+    def filtered_search(self, query_vector, k: int, isbns) -> list:
+        rows = [self._rows[isbn] for isbn in map(str, isbns) if isbn in self._rows]
+        return self._pairs(self.vectors.search(query_vector, rows, k))
+
+    def batch_search(self, query_vectors, k: int, isbns=None) -> list:
+        if self.vectors.quantize:
+            # the two-pass search runs per query
+            return super().batch_search(query_vectors, k, isbns)
+        if isbns is None:
+            rows = self._present
+        else:
+            rows = np.array([self._rows[isbn] for isbn in map(str, isbns) if isbn in self._rows], dtype=np.intp)
+            rows = rows[self.vectors.present[rows]]
+
+        # one matrix product for the batch, same scores as EmbeddingMatrix.search
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        scores = 2 * (queries @ self.vectors.matrix[rows].T) - self.vectors._sq_norms[rows]
+        sq_queries = np.einsum("ij,ij->i", queries, queries)
+
+        results = []
+        for i in range(len(queries)):
+            top = np.argpartition(-scores[i], k)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-scores[i, top], kind="stable")]
+            distances = np.maximum(0.0, sq_queries[i] - scores[i, top])
+            results.append(list(zip(self.isbns[rows[top]].tolist(), distances.tolist())))
+        return results
+
+    def get(self, isbns) -> dict:
+        rows = {isbn: self._rows[isbn] for isbn in map(str, isbns) if isbn in self._rows}
+        return {isbn: np.asarray(self.vectors.matrix[row]) for isbn, row in rows.items() if self.vectors.present[row]}
+
+    def __len__(self) -> int:
+        return len(self._present)
+
+class HnswStore(VectorStore):
+    """
+    In-process HNSW graph built with hnswlib (an optional dependency)
+
+    Filtered searches walk the same graph and skip the rows outside the
+    allow-list, like ChromaDB's metadata filter.
+    """
+
+    def __init__(self, vectors: EmbeddingMatrix, embeddings=None, m: int = 16, ef_construction: int = 200, ef: int = 100):
+        # only needed by this backend
+        import hnswlib
+
+        self.embeddings = embeddings
+        self.isbns = np.asarray(vectors.isbns, dtype=str)
+        self._rows = {isbn: row for row, isbn in enumerate(self.isbns)}
+        self.ef = ef
+
+        self._present = vectors.present
+        present = np.flatnonzero(vectors.present)
+        self._matrix = vectors.matrix
+        self._index = hnswlib.Index(space="l2", dim=vectors.dim)
+        self._index.init_index(max_elements=max(1, len(present)), ef_construction=ef_construction, M=m)
+        self._index.add_items(np.asarray(vectors.matrix[present]), present)
+        self._index.set_ef(ef)
+
+    def _query(self, query_vectors, k: int, rows=None) -> list:
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        allowed = None if rows is None else set(rows)
+        k = min(k, self._index.get_current_count() if allowed is None else len(allowed))
+        if k == 0:
+            return [[] for _ in queries]
+        # the walk needs to look at least k candidates wide
+        self._index.set_ef(max(self.ef, k))
+        labels, distances = self._index.knn_query(
+            queries, k=k, filter=None if allowed is None else allowed.__contains__
+        )
+        return [
+            list(zip(self.isbns[row_labels].tolist(), row_distances.tolist()))
+            for row_labels, row_distances in zip(labels, distances)
+        ]
+
+    def _allowed_rows(self, isbns) -> list:
+        # rows without a vector are not in the graph
+        return [self._rows[isbn] for isbn in map(str, isbns) if isbn in self._rows and self._present[self._rows[isbn]]]
+
+    def search(self, query_vector, k: int) -> list:
+        return self._query(query_vector, k)[0]
+
+    def filtered_search(self, query_vector, k: int, isbns) -> list:
+        return self._query(query_vector, k, self._allowed_rows(isbns))[0]
+
+    def batch_search(self, query_vectors, k: int, isbns=None) -> list:
+        return self._query(query_vectors, k, None if isbns is None else self._allowed_rows(isbns))
+
+    def get(self, isbns) -> dict:
+        return {str(self.isbns[row]): np.asarray(self._matrix[row]) for row in self._allowed_rows(isbns)}
+
+    def __len__(self) -> int:
+        return self._index.get_current_count()
+
+def as_vector_store(db_books) -> VectorStore:
+    """Wrap a LangChain Chroma collection, VectorStores pass through"""
+    if isinstance(db_books, VectorStore):
+        return db_books
+    return ChromaStore(db_books)
@@ -0,0 +1,310 @@
+import logging
+import os
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The embedding matrix is an export of the ChromaDB vectors (see
+# data_processing/export_embeddings.py): a float32 .npy file whose row i is
+# the vector of catalog row id i, plus a sidecar .npy with the ISBN of every
+# row so a matrix is never used against a catalog it was not exported for.
+# Books without a vector have a row of NaN.
+
+# (row id, distance) pairs in rank order, what every search path hands back.
+# Distances are squared L2 like ChromaDB reports them, lower is closer.
+RANKED_DTYPE = np.dtype([("row", np.intp), ("distance", np.float32)])
+
+def ranked_array(rows, distances) -> np.ndarray:
+    ranked = np.empty(len(rows), dtype=RANKED_DTYPE)
+    ranked["row"] = rows
+    ranked["distance"] = distances
+    return ranked
+
+# first-pass scoring can run on a compact copy of the matrix, the float32
+# rows of the best k * RERANK_FACTOR candidates are then scored exactly
+QUANTIZE_DTYPES = ("int8", "float16")
+RERANK_FACTOR = 4
+
+def quantize_rows(matrix: np.ndarray, dtype: str, chunk: int = 4096) -> tuple:
+    """
+    Compact copy of `matrix` for approximate scoring
+
+    int8 keeps one float32 scale per row (max |x| / 127), float16 needs none.
+    Rows of NaN become rows of 0, they are never searched anyway.
+
+    Returns:
+        (codes, scales or None)
+    """
+    if dtype not in QUANTIZE_DTYPES:
+        raise ValueError(f"Unknown quantization {dtype!r}, expected one of {QUANTIZE_DTYPES}")
+
+    codes = np.empty(matrix.shape, dtype=np.int8 if dtype == "int8" else np.float16)
+    scales = np.empty(len(matrix), dtype=np.float32) if dtype == "int8" else None
+    # chunks, so a memory-mapped matrix is never read into memory whole
+    for start in range(0, len(matrix), chunk):
+        rows = np.nan_to_num(np.asarray(matrix[start:start + chunk], dtype=np.float32))
+        if scales is None:
+            codes[start:start + chunk] = rows
+            continue
+        row_scales = np.abs(rows).max(axis=1) / 127
+        row_scales[row_scales == 0] = 1.0
+        codes[start:start + chunk] = np.round(rows / row_scales[:, None])
+        scales[start:start + chunk] = row_scales
+    return codes, scales
+
+def isbns_path(path: str) -> str:
+    """Sidecar file with the ISBN of every matrix row"""
+    root, _ = os.path.splitext(path)
+    return root + ".isbn13.npy"
+
+def write_embedding_matrix(path: str, isbns, vectors: dict) -> np.ndarray:
+    """
+    Write the vectors of `isbns` (catalog row order) as a float32 .npy file
+
+    Args:
+        path: where to write the matrix, the ISBN sidecar goes next to it
+        isbns: ISBN of every catalog row, in row id order
+        vectors: ISBN -> embedding, books without an entry get a row of NaN
+
+    Returns:
+        Row ids that have no vector
+    """
+    isbns = [str(isbn) for isbn in isbns]
+    dim = len(next(iter(vectors.values())))
+
+    matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(isbns), dim))
+    missing = []
+    for row, isbn in enumerate(isbns):
+        vector = vectors.get(isbn)
+        if vector is None:
+            matrix[row] = np.nan
+            missing.append(row)
+        else:
+            matrix[row] = vector
+    matrix.flush()
+    del matrix
+
+    np.save(isbns_path(path), np.array(isbns))
+    return np.array(missing, dtype=np.intp)
+
+PROJECTION_METHODS = ("pca", "random")
+
+def projection_path(path: str) -> str:
+    """File with the projection (mean, components) of a reduced matrix"""
+    root, _ = os.path.splitext(path)
+    return root + ".projection.npz"
+
+def fit_projection(matrix: np.ndarray, dim: int, method: str = "pca", seed: int = 0) -> tuple:
+    """
+    Fit a linear map from the embedding dimension down to `dim`
+
+    PCA keeps the directions of most variance of the book vectors, a random
+    Gaussian projection (scaled by 1/sqrt(dim)) keeps distances only in
+    expectation but needs no fit. Rows of NaN are left out.
+
+    Returns:
+        (mean, components) with reduced = (x - mean) @ components
+    """
+    if method not in PROJECTION_METHODS:
+        raise ValueError(f"Unknown projection {method!r}, expected one of {PROJECTION_METHODS}")
+
+    vectors = np.asarray(matrix, dtype=np.float32)
+    vectors = vectors[~np.isnan(vectors[:, 0])]
+    mean = vectors.mean(axis=0)
+
+    if method == "pca":
+        # right singular vectors of the centered data, largest first
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        components = vt[:dim].T
+    else:
+        rng = np.random.default_rng(seed)
+        components = rng.normal(scale=1 / np.sqrt(dim), size=(vectors.shape[1], dim))
+    return mean.astype(np.float32), components.astype(np.float32)
+
+def write_projection(path: str, matrix: np.ndarray, isbns, mean: np.ndarray, components: np.ndarray, method: str,
+                     chunk: int = 4096):
+    """Write the reduced matrix (row order of `matrix`) to `path` and the projection next to it"""
+    reduced = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(matrix), components.shape[1]))
+    for start in range(0, len(matrix), chunk):
+        rows = np.asarray(matrix[start:start + chunk], dtype=np.float32)
+        # books without a vector stay NaN
+        reduced[start:start + chunk] = (rows - mean) @ components
+    reduced.flush()
+    del reduced
+
+    np.savez(projection_path(path), mean=mean, components=components, method=method, isbns=np.asarray(isbns, dtype=str))
+
+class Projection:
+    """A fitted projection and the book vectors it maps down, for scoring in fewer dimensions"""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, reduced: np.ndarray, method: str = "pca"):
+        self.mean = mean
+        self.components = components
+        self.reduced = reduced
+        self.method = method
+        self._sq_norms = np.nan_to_num(np.einsum("ij,ij->i", reduced, reduced, dtype=np.float32))
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[1]
+
+    def project(self, query_vector: np.ndarray) -> np.ndarray:
+        return (query_vector - self.mean) @ self.components
+
+    def scores(self, query_vector: np.ndarray, rows: np.ndarray) -> tuple:
+        """(scores ranking like EmbeddingMatrix's, squared norm of the projected query)"""
+        projected = self.project(query_vector)
+        return 2 * (self.reduced[rows] @ projected) - self._sq_norms[rows], projected @ projected
+
+def load_projection(path: str | None, isbns) -> Projection | None:
+    """Memory-map a reduced matrix written by write_projection(), None if missing or for other books"""
+    if not path or not os.path.exists(path):
+        return None
+
+    stored = np.load(projection_path(path))
+    if not np.array_equal(stored["isbns"], np.asarray(isbns, dtype=str)):
+        logger.warning(f"Reduced matrix {path} was fitted for another catalog, not using it")
+        return None
+
+    projection = Projection(stored["mean"], stored["components"], np.load(path, mmap_mode="r"), str(stored["method"]))
+    logger.info(f"Memory-mapped {len(projection.reduced)} x {projection.dim} {projection.method} projection from {path}")
+    return projection
+
+class EmbeddingMatrix:
+    """
+    Catalog embeddings memory-mapped from disk, for exact search over a few rows
+
+    Scores are negated squared L2 distances (up to a constant), the metric the
+    ChromaDB collection ranks by, so the best rows are the ones ChromaDB would
+    return without the approximation of the HNSW graph.
+
+    With `quantize` ("int8" or "float16") a compact copy of the matrix is kept
+    in memory for a first pass over the candidates, and only the float32 rows
+    of the best k * rerank_factor are read for the exact scores.
+
+    A `projection` does the first pass in its reduced space instead. With
+    `rerank` off its ranking is the answer, and distances are the ones
+    between the projected vectors.
+    """
+
+    def __init__(self, matrix: np.ndarray, isbns: np.ndarray | None = None, quantize: str | None = None,
+                 rerank_factor: int = RERANK_FACTOR, projection: Projection | None = None, rerank: bool = True):
+        self.matrix = matrix
+        # ISBN of every row, when known
+        self.isbns = isbns
+        self.present = ~np.isnan(matrix[:, 0])
+        # squared norms, score(x) = 2 x.q - |x|^2 ranks like -|x - q|^2
+        self._sq_norms = np.einsum("ij,ij->i", matrix, matrix, dtype=np.float32)
+
+        self.quantize = quantize
+        self.rerank_factor = rerank_factor
+        self._codes, self._scales = quantize_rows(matrix, quantize) if quantize else (None, None)
+
+        self.projection = projection
+        self.rerank = rerank
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def scoring_bytes(self) -> int:
+        """Bytes a search over every row scans, the compact copy when there is one"""
+        if self.projection is not None:
+            return self.projection.reduced.nbytes
+        if self._codes is None:
+            return self.matrix.nbytes
+        return self._codes.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+
+    def _approximate_scores(self, query_vector: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        if self.projection is not None:
+            return self.projection.scores(query_vector, rows)[0]
+        dots = self._codes[rows].astype(np.float32) @ query_vector
+        if self._scales is not None:
+            dots *= self._scales[rows]
+        return 2 * dots - self._sq_norms[rows]
+
+    def distances(self, query_vector, rows) -> np.ndarray:
+        """Exact squared L2 distance of each row to the query, NaN for rows without a vector"""
+        rows = np.asarray(rows, dtype=np.intp)
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        distances = np.full(len(rows), np.nan, dtype=np.float32)
+        present = self.present[rows]
+        scores = 2 * (self.matrix[rows[present]] @ query_vector) - self._sq_norms[rows[present]]
+        distances[present] = np.maximum(0.0, query_vector @ query_vector - scores)
+        return distances
+
+    def search(self, query_vector, rows, k: int) -> np.ndarray:
+        """The k rows (out of `rows`) closest to the query, best first, as a RANKED_DTYPE array"""
+        rows = np.asarray(rows, dtype=np.intp)
+        rows = rows[self.present[rows]]
+        if len(rows) == 0:
+            return ranked_array(rows, [])
+
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if self.projection is not None and not self.rerank:
+            # rank in the reduced space only
+            scores, sq_query = self.projection.scores(query_vector, rows)
+            return self._top(rows, scores, sq_query, k)
+
+        shortlist = k * self.rerank_factor
+        if (self._codes is not None or self.projection is not None) and shortlist < len(rows):
+            # first pass on the compact copy, the exact scores below re-rank the shortlist
+            approximate = self._approximate_scores(query_vector, rows)
+            rows = rows[np.argpartition(-approximate, shortlist)[:shortlist]]
+
+        scores = 2 * (self.matrix[rows] @ query_vector) - self._sq_norms[rows]
+        return self._top(rows, scores, query_vector @ query_vector, k)
+
+    @staticmethod
+    def _top(rows: np.ndarray, scores: np.ndarray, sq_query: float, k: int) -> np.ndarray:
+        """The k best scored rows with their distances, sq_query being |q|^2 in the scored space"""
+        if k < len(rows):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        # |x - q|^2 = |q|^2 - score
+        distances = np.maximum(0.0, sq_query - scores[top])
+        return ranked_array(rows[top], distances)
+
+def load_embedding_matrix(path: str | None, isbns, quantize: str | None = None, reduced_path: str | None = None,
+                          rerank: bool = True) -> EmbeddingMatrix | None:
+    """
+    Memory-map the exported embeddings if they exist and match the catalog
+
+    Args:
+        path: the .npy matrix, None or a missing file turns brute-force search off
+        isbns: ISBN of every catalog row, in row id order
+        quantize: "int8" or "float16" to score on a compact in-memory copy
+            first, None to score the float32 rows directly
+        reduced_path: reduced matrix from data_processing/project_embeddings.py
+            to score in fewer dimensions first (takes the place of `quantize`)
+        rerank: re-score the shortlist of the projection on the full vectors
+
+    Returns:
+        The EmbeddingMatrix, or None when there is nothing usable
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    exported = np.load(isbns_path(path))
+    if len(exported) != len(isbns) or not np.array_equal(exported, np.asarray(isbns, dtype=str)):
+        logger.warning(f"Embedding matrix {path} was exported for another catalog, not using it")
+        return None
+
+    projection = load_projection(reduced_path, exported)
+    if projection is not None:
+        quantize = None
+    vectors = EmbeddingMatrix(np.load(path, mmap_mode="r"), exported, quantize, projection=projection, rerank=rerank)
+    logger.info(f"Memory-mapped {len(vectors)} x {vectors.dim} embeddings from {path}")
+    if quantize:
+        logger.info(
+            f"Scoring on a {quantize} copy: {vectors.scoring_bytes / 2**20:.1f} MiB "
+            f"instead of {vectors.matrix.nbytes / 2**20:.1f} MiB"
+        )
+    return vectors
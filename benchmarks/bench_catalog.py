@@ -0,0 +1,136 @@
+# benchmarks/bench_catalog.py
+#
+# Per-request latency of the data path in /recommend_books, before and after
+# the shared catalog. The OpenAI and ChromaDB calls are left out, they are the
+# same on both sides.
+#
+#   python benchmarks/bench_catalog.py [--runs 50]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.filter_df as filter_df
+from app.catalog import Catalog, load_catalog
+from app.filter_cache import FilterCache
+from app.filter_validation import (
+    validate_author_filter, validate_genre_filter,
+    validate_min_pages_filter, validate_max_pages_filter,
+    validate_keywords_filter, validate_tone_filter,
+    validate_published_year_filter
+)
+
+BOOKS_PATH = os.getenv("BOOKS_PATH", "./data/books.parquet")
+
+# a few filter sets shaped like what /reason_query produces
+FILTER_SETS = {
+    "no filters": {},
+    "author": {"author": ["Stephen King"]},
+    "genre + pages": {"genre": "Fiction", "pages_max": 300},
+    "children + year": {"genre": "Fiction", "children": True, "published_year": {"min": 1990, "max": None, "exact": None}},
+    "names + tone": {"names": ["New York"], "tone": "joy"},
+}
+
+def run_request(catalog: Catalog, filters: dict, cache: FilterCache | None = None) -> pd.DataFrame:
+    """The data path of /recommend_books, as main.py runs it"""
+    filterValidation = {}
+    books = filter_df.apply_pre_filters(catalog, filters, filterValidation, cache)
+    return filter_df.apply_post_filters(books, filters, filterValidation, 10, catalog)
+
+# The data path before the shared catalog: a fresh read_parquet per request and
+# pandas masks over the whole frame. A pinned copy of the old filter code, so
+# "before" keeps measuring it whatever app.filter_df turns into (only the
+# validators are the current ones).
+def baseline_pre_filters(books: pd.DataFrame, filters: dict, filterValidation: dict) -> pd.DataFrame:
+    if "author" in filters and filters["author"] is not None:
+        authors = filters["author"]
+        books = books[books["authors"].str.contains('|'.join(authors), case=False, na=False, regex=True)]
+        validate_author_filter(books, authors, filterValidation)
+
+    if "genre" in filters and filters["genre"] in ["Fiction", "Nonfiction"]:
+        genre = filters["genre"]
+        if "children" in filters and filters["children"]:
+            genre = "Children's " + genre
+        books = books[books["simple_categories"] == genre]
+        validate_genre_filter(books, genre, filterValidation)
+
+    if "pages_min" in filters and filters["pages_min"] is not None:
+        books = books[books["num_pages"] >= filters["pages_min"]]
+        validate_min_pages_filter(books, filters["pages_min"], filterValidation)
+
+    if "pages_max" in filters and filters["pages_max"] is not None:
+        books = books[books["num_pages"] <= filters["pages_max"]]
+        validate_max_pages_filter(books, filters["pages_max"], filterValidation)
+
+    if "published_year" in filters and filters["published_year"] is not None:
+        published_year = filters["published_year"]
+        if published_year.get("exact") is not None:
+            books = books[books["published_year"] == published_year["exact"]]
+        if published_year.get("min") is not None:
+            books = books[books["published_year"] >= published_year["min"]]
+        if published_year.get("max") is not None:
+            books = books[books["published_year"] <= published_year["max"]]
+        validate_published_year_filter(books, published_year, filterValidation)
+
+    return books
+
+def baseline_post_filters(books: pd.DataFrame, filters: dict, filterValidation: dict, k: int = 10) -> pd.DataFrame:
+    if "names" in filters and filters["names"] is not None:
+        names = filters["names"]
+        books = books[books["description"].str.contains('|'.join(names), case=False, na=False, regex=True)]
+        validate_keywords_filter(books, names, filterValidation)
+
+    if "tone" in filters and filters["tone"] is not None and filters["tone"] in filter_df.tone_options:
+        books = books.sort_values(by=filters["tone"], ascending=False)
+        validate_tone_filter(books, filters["tone"], filterValidation)
+
+    return books.head(k)
+
+def baseline_request(filters: dict) -> pd.DataFrame:
+    filterValidation = {}
+    books = baseline_pre_filters(pd.read_parquet(BOOKS_PATH), filters, filterValidation)
+    return baseline_post_filters(books, filters, filterValidation, 10)
+
+def time_runs(fn, runs: int) -> np.ndarray:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+def report(name: str, timings: np.ndarray):
+    print(
+        f"{name.ljust(32)}"
+        f"{np.mean(timings):10.2f}"
+        f"{np.percentile(timings, 50):10.2f}"
+        f"{np.percentile(timings, 99):10.2f}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request latency with and without the shared catalog")
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    # the pre-filter cache only keeps results of a versioned catalog
+    catalog = load_catalog(BOOKS_PATH, version="bench")
+    cache = FilterCache()
+
+    print(f"{'request (ms)'.ljust(32)}{'mean'.rjust(10)}{'p50'.rjust(10)}{'p99'.rjust(10)}")
+    print("-" * 62)
+    for name, filters in FILTER_SETS.items():
+        before = time_runs(lambda: baseline_request(filters), args.runs)
+        after  = time_runs(lambda: run_request(catalog, filters), args.runs)
+        cached = time_runs(lambda: run_request(catalog, filters, cache), args.runs)
+        report(f"{name} / read_parquet", before)
+        report(f"{name} / catalog", after)
+        report(f"{name} / catalog + cache", cached)
+        print("-" * 62)
+
+if __name__ == "__main__":
+    main()
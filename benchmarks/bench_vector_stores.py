@@ -0,0 +1,129 @@
+# benchmarks/bench_vector_stores.py
+#
+# Recall@k against exact search and per-query latency of every VectorStore
+# backend, on the vectors stored in the ChromaDB index, plus the memory the
+# int8 / float16 copies of the matrix save. Queries are stored vectors plus a
+# little noise, so no embedding calls are made. hnswlib is skipped when it
+# isn't installed.
+#
+#   python benchmarks/bench_vector_stores.py [--chroma data/chroma_db]
+#       [--queries 200] [--k 10] [--filter-share 0.1]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.vector_store import ChromaStore, HnswStore, NumpyStore
+from app.vectors import QUANTIZE_DTYPES, EmbeddingMatrix
+
+CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./data/chroma_db")
+
+def load_index(chroma_db_path: str) -> tuple:
+    """The ChromaStore and an EmbeddingMatrix of the same vectors, one row per ISBN"""
+    from langchain_chroma import Chroma
+
+    # no embedding function needed, the queries are vectors
+    db_books = Chroma(persist_directory=chroma_db_path)
+    stored = db_books.get(include=["embeddings", "metadatas", "documents"])
+
+    vectors = {}
+    for embedding, metadata, document in zip(stored["embeddings"], stored["metadatas"], stored["documents"]):
+        isbn = (metadata or {}).get("isbn") or document.strip().split()[0]
+        # the first document of an ISBN wins, like the de-duplication at ingest
+        vectors.setdefault(str(isbn), embedding)
+
+    isbns = np.array(list(vectors))
+    matrix = np.asarray(list(vectors.values()), dtype=np.float32)
+    return ChromaStore(db_books), EmbeddingMatrix(matrix, isbns)
+
+def make_queries(vectors: EmbeddingMatrix, count: int, rng: np.random.Generator) -> np.ndarray:
+    rows = rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)
+    queries = np.asarray(vectors.matrix[rows], dtype=np.float32)
+    return queries + rng.normal(scale=0.1 * queries.std(), size=queries.shape).astype(np.float32)
+
+def recall(results: list, truth: list) -> float:
+    """Share of the exact top k every backend result recovered, averaged over the queries"""
+    hits = [
+        len({isbn for isbn, _ in result} & {isbn for isbn, _ in expected}) / max(1, len(expected))
+        for result, expected in zip(results, truth)
+    ]
+    return float(np.mean(hits))
+
+def time_queries(search, queries: np.ndarray) -> tuple:
+    results, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        timings.append((time.perf_counter() - start) * 1000)
+    return results, np.array(timings)
+
+def report(name: str, mode: str, recall_at_k: float, timings: np.ndarray):
+    print(
+        f"{name.ljust(14)}{mode.ljust(10)}"
+        f"{recall_at_k:10.3f}"
+        f"{np.percentile(timings, 50):10.2f}"
+        f"{np.percentile(timings, 99):10.2f}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the vector store backends")
+    parser.add_argument("--chroma", default=CHROMA_DB_PATH)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--filter-share", type=float, default=0.1,
+                        help="share of the books in the allow-list of the filtered searches")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    chroma, vectors = load_index(args.chroma)
+    print(f"{len(vectors)} x {vectors.dim} vectors from {args.chroma}")
+
+    queries = make_queries(vectors, args.queries, rng)
+    allowed = rng.choice(vectors.isbns, size=max(args.k, int(len(vectors) * args.filter_share)), replace=False)
+
+    # exact answers to measure recall against
+    exact = NumpyStore(vectors)
+    truth = {
+        "search": exact.batch_search(queries, args.k),
+        "filtered": exact.batch_search(queries, args.k, allowed),
+    }
+
+    stores = {"chroma": chroma, "numpy": exact}
+    for dtype in QUANTIZE_DTYPES:
+        stores[f"numpy {dtype}"] = NumpyStore(EmbeddingMatrix(vectors.matrix, vectors.isbns, dtype))
+    try:
+        start = time.perf_counter()
+        stores["hnswlib"] = HnswStore(vectors)
+        print(f"Built the hnswlib graph in {time.perf_counter() - start:.1f} s")
+    except ImportError:
+        print("hnswlib is not installed, skipping it")
+
+    print(f"{'backend'.ljust(14)}{'mode'.ljust(10)}{f'recall@{args.k}'.rjust(10)}{'p50 ms'.rjust(10)}{'p99 ms'.rjust(10)}")
+    print("-" * 54)
+    for name, store in stores.items():
+        results, timings = time_queries(lambda query: store.search(query, args.k), queries)
+        report(name, "search", recall(results, truth["search"]), timings)
+
+        results, timings = time_queries(lambda query: store.filtered_search(query, args.k, allowed), queries)
+        report(name, "filtered", recall(results, truth["filtered"]), timings)
+
+        # one call for every query, latency per query
+        start = time.perf_counter()
+        results = store.batch_search(queries, args.k)
+        per_query = np.full(len(queries), (time.perf_counter() - start) * 1000 / len(queries))
+        report(name, "batch", recall(results, truth["search"]), per_query)
+        print("-" * 54)
+
+    # what a brute-force pass over every book reads
+    print(f"{'matrix'.ljust(14)}{'scanned MiB'.rjust(12)}")
+    for name, store in stores.items():
+        if isinstance(store, NumpyStore):
+            print(f"{name.ljust(14)}{store.vectors.scoring_bytes / 2**20:12.2f}")
+
+if __name__ == "__main__":
+    main()
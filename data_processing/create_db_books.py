@@ -1,7 +1,6 @@
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-import re
 import os
 
 # Load the CSV file into a pandas DataFrame
@@ -20,51 +19,97 @@ books["large_thumbnail"] = np.where(
 # Save the DataFrame to a new CSV file
 # books.to_csv('data/books_with_emotions_test.csv', index=False)
 
-from langchain_community.document_loaders import TextLoader
-from langchain_core.documents import Document
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-
-raw_documents = TextLoader(file_path = "tagged_descriptions.txt").load()
-seen_line = set()
-documents = []
-
-for doc in raw_documents:
-  lines = doc.page_content.split("\n")
-  for line in lines:
-    stripped = line.strip()
-    if not stripped:
-      continue
-
-    # Extract ISBN from the beginning of the line
-    # Assuming ISBN is a sequence of digits at the start
-    # Use regex to find the first sequence of digits
-    match = re.match(r'^(\d+)', stripped)
-    isbn = None
-    if match:
-      isbn = match.group(1)
-
-    # Check if the full line (which should be unique per book) has been seen
-    # Or alternatively, if the extracted ISBN has been seen
-    # Let's deduplicate by the full stripped line content to keep unique descriptions
-    if stripped not in seen_line:
-      # Store the extracted ISBN in metadata if found
-      metadata = {"source": "tagged_descriptions.txt"}
-      if isbn:
-          metadata["isbn"] = isbn # Store as "isbn" in metadata
-
-      documents.append(Document(page_content=stripped, metadata=metadata))
-      seen_line.add(stripped) # Deduplicate based on the full stripped line
-
-print(f"Created {len(documents)} documents after de-duplication.")
+# Embed tagged_descriptions.txt into the ChromaDB index, streaming the file
+# in batches on a worker pool. Every batch is written as soon as it is
+# embedded and recorded in a checkpoint, so an interrupted run picks up
+# where it stopped instead of paying for the embeddings again.
+#
+# A manifest next to the index records the description hash and model of
+# every ISBN in it. Later runs only embed new or changed books and delete
+# the vectors of removed ones; --dry-run reports that delta and its
+# estimated cost without touching anything.
+#
+#   python create_db_books.py [--batch-size 100] [--workers 4] [--restart]
+#       [--dry-run] [--price-per-1k-tokens 0.0001] [--books books.parquet]
+import argparse
+import hashlib
+import logging
+import sys
+import chromadb
 
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.embedding_providers import make_embeddings
+from app.ingest import Checkpoint, Manifest, apply_delta, iter_documents, manifest_path, plan_reindex
+from app.partitions import DEFAULT_COLLECTION
+from partition_by_genre import partition_by_genre
+
+parser = argparse.ArgumentParser(description="Build or update the ChromaDB index of the tagged descriptions")
+parser.add_argument("--source", default="tagged_descriptions.txt")
+parser.add_argument("--chroma", default="./chroma_db")
+parser.add_argument("--books", default="books.parquet", help="books.parquet the genre collections are split by")
+parser.add_argument("--batch-size", type=int, default=100)
+parser.add_argument("--workers", type=int, default=4)
+parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and manifest, rebuild from scratch")
+parser.add_argument("--dry-run", action="store_true", help="report what would be embedded and deleted, change nothing")
+# text-embedding-ada-002 is $0.10 per million tokens
+parser.add_argument("--price-per-1k-tokens", type=float, default=0.0001)
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-db_books = Chroma.from_documents(
-    documents,
-    embedding=OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY),
-    persist_directory="./chroma_db"  # Choose a folder name
+# same provider settings as the API, the index has to match what queries it
+embeddings = make_embeddings(
+    os.getenv("EMBEDDING_PROVIDER", "openai"),
+    openai_api_key=os.getenv("OPENAI_API_KEY"),
+    model_path=os.getenv("EMBEDDING_MODEL_PATH"),
+    dim=int(os.getenv("EMBEDDING_DIM", "1536")),
+    batch_size=args.batch_size,
+)
+
+index_path = os.path.normpath(args.chroma)
+manifest = Manifest.load(manifest_path(index_path))
+rebuild = args.restart or not manifest.exists()
+if rebuild:
+    # everything counts as new, the collection starts empty
+    manifest.entries = {}
+
+delta = plan_reindex(iter_documents(args.source), manifest, embeddings.model)
+summary = delta.summary(args.price_per_1k_tokens)
+print(f"{summary['new']} new, {summary['changed']} changed, {summary['removed']} removed, "
+      f"{summary['unchanged']} unchanged books ({summary['model']})")
+print(f"Estimated {summary['estimated_tokens']} tokens to embed, ${summary['estimated_cost']:.4f}")
+if args.dry_run:
+    sys.exit(0)
+
+# batch numbers refer to this delta, any other delta starts over
+delta_digest = hashlib.sha1("\n".join(doc_id for _, doc_id in delta.to_embed).encode()).hexdigest()
+checkpoint = Checkpoint(
+    f"{index_path}.checkpoint.json",
+    {"delta": delta_digest, "batch_size": args.batch_size, "model": embeddings.model},
 )
-print("Database created with Chroma.")
\ No newline at end of file
+if args.restart:
+    checkpoint.clear()
+
+client = chromadb.PersistentClient(path=args.chroma)
+if checkpoint.done:
+    print(f"Resuming, {len(checkpoint.done)} batches already written")
+elif rebuild and DEFAULT_COLLECTION in {getattr(c, "name", c) for c in client.list_collections()}:
+    client.delete_collection(DEFAULT_COLLECTION)
+collection = client.get_or_create_collection(DEFAULT_COLLECTION)
+
+# the texts are read again from the source, the delta only holds their ids
+stats = apply_delta(delta, iter_documents(args.source), manifest, embeddings, collection, args.batch_size, args.workers,
+                    checkpoint)
+# the manifest has it all now
+checkpoint.clear()
+print(f"Wrote {stats['written']} documents ({stats['skipped']} already in the checkpoint), deleted {stats['deleted']}, "
+      f"in {stats['seconds']:.1f}s, {stats['docs_per_sec']:.1f} docs/s")
+print(f"Embedding calls: {embeddings.stats()}")
+print(f"Database updated with Chroma: {collection.count()} documents.")
+
+# one collection per genre next to the global one, for genre-filtered queries
+for genre, size in partition_by_genre(args.chroma, args.books).items():
+    print(f"Genre index {genre}: {size} vectors")
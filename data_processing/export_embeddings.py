@@ -0,0 +1,53 @@
+# data_processing/export_embeddings.py
+#
+# Export the vectors stored in the ChromaDB index into a float32 matrix
+# aligned with the catalog row ids (row i = i-th book of books.parquet), for
+# exact brute-force search over small candidate sets. Run it again whenever
+# books.parquet or the index is rebuilt; the API skips a matrix whose ISBNs
+# don't match its catalog.
+#
+#   python data_processing/export_embeddings.py [--books data/books.parquet]
+#       [--chroma data/chroma_db] [--out data/embeddings.npy]
+import argparse
+import os
+import sys
+import pandas as pd
+from langchain_chroma import Chroma
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.vectors import isbns_path, write_embedding_matrix
+
+def read_vectors(chroma_db_path: str) -> dict:
+    """ISBN -> embedding for every document of the index"""
+    # no embedding function needed, nothing gets embedded here
+    db_books = Chroma(persist_directory=chroma_db_path)
+    stored = db_books.get(include=["embeddings", "metadatas", "documents"])
+
+    vectors = {}
+    for embedding, metadata, document in zip(stored["embeddings"], stored["metadatas"], stored["documents"]):
+        isbn = (metadata or {}).get("isbn") or document.strip().split()[0]
+        # the first document of an ISBN wins, like the de-duplication at ingest
+        vectors.setdefault(str(isbn), embedding)
+    return vectors
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ChromaDB vectors as a float32 matrix in catalog row order")
+    parser.add_argument("--books", default="data/books.parquet")
+    parser.add_argument("--chroma", default="data/chroma_db")
+    parser.add_argument("--out", default="data/embeddings.npy")
+    args = parser.parse_args()
+
+    # same row order as the Catalog the API builds from this file
+    isbns = pd.read_parquet(args.books, columns=["isbn13"])["isbn13"].astype(str)
+    vectors = read_vectors(args.chroma)
+    print(f"Read {len(vectors)} vectors from {args.chroma}")
+
+    missing = write_embedding_matrix(args.out, isbns, vectors)
+    print(f"Wrote {len(isbns)} x {len(next(iter(vectors.values())))} float32 matrix to {args.out} (+ {isbns_path(args.out)})")
+    if len(missing):
+        print(f"{len(missing)} books have no vector, brute-force search skips them")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# data_processing/partition_by_genre.py
+#
+# Split the ChromaDB index into one collection per simple_categories value,
+# next to the global one, so a genre-filtered query searches only the books
+# of its genre. The stored vectors are copied, nothing gets re-embedded. Run
+# it after every rebuild of the index or of books.parquet; the API skips a
+# sub-index whose size doesn't match the genre's book count.
+#
+#   python data_processing/partition_by_genre.py [--books data/books.parquet]
+#       [--chroma data/chroma_db]
+import argparse
+import os
+import sys
+from collections import defaultdict
+import chromadb
+import pandas as pd
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ingest import Manifest, manifest_path
+from app.partitions import DEFAULT_COLLECTION, genre_collection_name
+
+def partition_by_genre(chroma_db_path: str, books_path: str, batch_size: int = 1000) -> dict:
+    """
+    (Re)create one collection per genre out of the global collection
+
+    Args:
+        chroma_db_path: the ChromaDB directory, partitions are written into it
+        books_path: books.parquet with the simple_categories of every ISBN
+        batch_size: documents per add() call
+
+    Returns:
+        genre -> number of vectors in its collection
+    """
+    books = pd.read_parquet(books_path, columns=["isbn13", "simple_categories"])
+    genre_of = dict(zip(books["isbn13"].astype(str), books["simple_categories"]))
+
+    client = chromadb.PersistentClient(path=chroma_db_path)
+    source = client.get_collection(DEFAULT_COLLECTION)
+    stored = source.get(include=["embeddings", "metadatas", "documents"])
+
+    # positions of the documents of every genre, one per ISBN
+    positions = defaultdict(list)
+    seen = set()
+    for i, (metadata, document) in enumerate(zip(stored["metadatas"], stored["documents"])):
+        isbn = str((metadata or {}).get("isbn") or document.strip().split()[0])
+        # the first document of an ISBN wins, like the de-duplication at ingest
+        if isbn in seen or isbn not in genre_of:
+            continue
+        seen.add(isbn)
+        positions[genre_of[isbn]].append(i)
+
+    existing = {getattr(collection, "name", collection) for collection in client.list_collections()}
+    sizes = {}
+    for genre, rows in positions.items():
+        name = genre_collection_name(genre)
+        if name in existing:
+            client.delete_collection(name)
+        # same distance metric as the global collection
+        partition = client.create_collection(name, metadata=source.metadata)
+
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            partition.add(
+                ids=[stored["ids"][i] for i in batch],
+                embeddings=[stored["embeddings"][i] for i in batch],
+                metadatas=[stored["metadatas"][i] for i in batch],
+                documents=[stored["documents"][i] for i in batch],
+            )
+        sizes[genre] = partition.count()
+
+    # the API versions the index by its manifest, rewriting it makes a
+    # running server pick up the new partitions
+    manifest = Manifest.load(manifest_path(chroma_db_path))
+    if manifest.exists():
+        manifest.save()
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description="Build one ChromaDB collection per genre from the global index")
+    parser.add_argument("--books", default="data/books.parquet")
+    parser.add_argument("--chroma", default="data/chroma_db")
+    args = parser.parse_args()
+
+    sizes = partition_by_genre(args.chroma, args.books)
+    for genre, size in sizes.items():
+        print(f"{genre_collection_name(genre)}: {size} vectors")
+
+if __name__ == "__main__":
+    main()
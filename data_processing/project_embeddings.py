@@ -0,0 +1,52 @@
+# data_processing/project_embeddings.py
+#
+# Fit a PCA (or random) projection on the exported book vectors and write the
+# reduced matrix plus the projection, for brute-force scoring in fewer
+# dimensions. The API projects each query once and scores against the reduced
+# matrix, then (unless EMBEDDINGS_RERANK=0) re-ranks the shortlist on the full
+# vectors. Run it again after every export_embeddings.py.
+#
+#   python data_processing/project_embeddings.py [--embeddings data/embeddings.npy]
+#       [--out data/embeddings.pca128.npy] [--method pca] [--dim 128]
+import argparse
+import os
+import sys
+import numpy as np
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.vectors import PROJECTION_METHODS, fit_projection, isbns_path, projection_path, write_projection
+
+def explained_variance(matrix: np.ndarray, mean: np.ndarray, components: np.ndarray) -> float:
+    """Share of the variance of the book vectors the projection keeps"""
+    vectors = np.asarray(matrix, dtype=np.float32)
+    centered = vectors[~np.isnan(vectors[:, 0])] - mean
+    total = np.einsum("ij,ij->", centered, centered)
+    reduced = centered @ components
+    return float(np.einsum("ij,ij->", reduced, reduced) / total) if total else 1.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a projection of the embedding matrix to fewer dimensions")
+    parser.add_argument("--embeddings", default="data/embeddings.npy")
+    parser.add_argument("--out", default=None, help="defaults to data/embeddings.<method><dim>.npy")
+    parser.add_argument("--method", choices=PROJECTION_METHODS, default="pca")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    root, _ = os.path.splitext(args.embeddings)
+    out = args.out or f"{root}.{args.method}{args.dim}.npy"
+
+    matrix = np.load(args.embeddings, mmap_mode="r")
+    isbns = np.load(isbns_path(args.embeddings))
+    mean, components = fit_projection(matrix, args.dim, args.method, args.seed)
+    write_projection(out, matrix, isbns, mean, components, args.method)
+
+    print(f"Projected {matrix.shape[0]} x {matrix.shape[1]} to {args.dim} dimensions with {args.method}")
+    if args.method == "pca":
+        print(f"Kept {explained_variance(matrix, mean, components):.1%} of the variance")
+    print(f"Wrote {out} (+ {projection_path(out)}), set EMBEDDINGS_REDUCED_PATH={out} to use it")
+
+if __name__ == "__main__":
+    main()
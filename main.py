@@ -1,16 +1,25 @@
 import logging
-from fastapi import FastAPI
-from typing import List
-import pandas as pd
+from fastapi import FastAPI, Header, HTTPException
+from typing import List, Optional
 
 # Import models and configuration
-from app.models import QueryRequest, BookRecommendation, ReasoningResponse, RecommendBooksRequest, BookRecommendationResponse
-from app.config import add_cors_middleware, db_books, BOOKS_PATH
+from app.models import (
+    QueryRequest, BookRecommendation, ReasoningResponse, RecommendBooksRequest, BookRecommendationResponse,
+    ReloadCatalogRequest, CatalogVersionResponse
+)
+from app.config import (
+    add_cors_middleware, load_db_books, BOOKS_PATH, CHROMA_DB_PATH, EMBEDDINGS_PATH, EMBEDDINGS_OPTIONS,
+    CATALOG_WATCH_INTERVAL, ADMIN_TOKEN, FILTER_CACHE_SIZE, embeddings, provider_embeddings,
+    SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_VERIFY_RATE
+)
 
 # Import filter_query module from app folder
 import app.filter_query as filter_query
 import app.filter_df as filter_df
 from app.search import similarity_search_filtered
+from app.snapshots import CatalogManager, CatalogMismatchError
+from app.filter_cache import FilterCache
+from app.semantic_cache import SemanticCache, result_key
 
 # Configure middleware
 app = FastAPI()
@@ -31,6 +40,22 @@ SIMILAR_K = 50
 FINAL_K   = 10
 DEBUG_K   = 5
 
+# load the books and the vector index once, every request gets a read-only view
+# of the current snapshot. Startup serves the data even if the ISBNs don't line up,
+# later reloads refuse to swap in an inconsistent snapshot.
+catalog_manager = CatalogManager(BOOKS_PATH, CHROMA_DB_PATH, load_db_books, EMBEDDINGS_PATH, EMBEDDINGS_OPTIONS)
+catalog_manager.reload(strict=False)
+catalog_manager.start_watching(CATALOG_WATCH_INTERVAL)
+
+# pre-filter results, keyed on the catalog version so a swap invalidates them
+filter_cache = FilterCache(FILTER_CACHE_SIZE)
+
+# rankings of recent queries, reused for rephrasings of them (same version and filters)
+semantic_cache = (
+    SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_VERIFY_RATE)
+    if SEMANTIC_CACHE_SIZE > 0 else None
+)
+
 def logger_separator():
     logger.info("\n" + "="*50 + "\n")
 
@@ -61,25 +86,32 @@ def recommend_books(request: RecommendBooksRequest):
     # logger.info(f"CONTENT:\n {content}")
     # logger_separator()
 
-    # load in a fresh patch of books
-    books = pd.read_parquet(BOOKS_PATH)
-    # logger.info(f"BOOK LEN: {len(books)}")
-    # logger_separator()
+    # pin the current snapshot, a reload mid-request doesn't affect us
+    snapshot = catalog_manager.current()
 
     # make a filtervalidation
     filterValidation = {}
-    # apply pre-filters to the books
-    books = filter_df.apply_pre_filters(books, filters, filterValidation)
+    # apply pre-filters to the shared catalog, only the matching rows get copied
+    books = filter_df.apply_pre_filters(snapshot.catalog, filters, filterValidation, filter_cache)
     # logger.info(f"\nPRE-FILTER BOOK LEN: {len(books)}")
     # logger_separator()
 
-    # Perform semantic search on the filtered books
-    books = similarity_search_filtered(content, books, db_books, SIMILAR_K)
+    # Perform semantic search on the filtered books, the tone ranks a wider
+    # similar set, otherwise the FINAL_K closest books are the answer
+    search_k = SIMILAR_K if filters.get("tone") in filter_df.tone_options else FINAL_K
+    eligible = filter_df.post_filter_eligible(snapshot.catalog, filters)
+    # a genre with its own sub-index searches only that genre's vectors
+    db_books, num_vectors = snapshot.vector_index(filter_df.resolve_genre(filters))
+    books = similarity_search_filtered(
+        content, books, db_books, search_k, num_vectors,
+        snapshot.vectors, snapshot.search_costs, eligible, catalog=snapshot.catalog,
+        result_cache=semantic_cache, cache_key=result_key(snapshot.version, filters, search_k)
+    )
     # logger.info(f"\nPOST-SEARCH BOOK LEN: {len(books)}")
     # logger_separator()
 
     # apply the post-filters
-    books = filter_df.apply_post_filters(books, filters, filterValidation, FINAL_K)
+    books = filter_df.apply_post_filters(books, filters, filterValidation, FINAL_K, snapshot.catalog)
     # logger.info(f"\nPOST-FILTER BOOK LEN: {len(books)}")
     # logger_separator()
 
@@ -90,6 +122,9 @@ def recommend_books(request: RecommendBooksRequest):
     
     # logger_separator()
 
+    # only the final rows get their text turned into Python strings
+    books = snapshot.catalog.materialize(books)
+
     # compose the response for recommend_books
     return BookRecommendationResponse(
         recommendations = [
@@ -98,9 +133,39 @@ def recommend_books(request: RecommendBooksRequest):
         ],
         validation = filterValidation,
         filters = filters,
-        content = content
+        content = content,
+        catalog_version = snapshot.version
     )
 
+def check_admin_token(x_admin_token: Optional[str]):
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled or the token is wrong")
+
+# swap in a new catalog snapshot (same paths re-read, or new ones)
+@app.post("/admin/reload_catalog", response_model=CatalogVersionResponse)
+def reload_catalog(request: ReloadCatalogRequest, x_admin_token: Optional[str] = Header(default=None)):
+    check_admin_token(x_admin_token)
+
+    try:
+        snapshot = catalog_manager.reload(request.books_path, request.chroma_db_path, embeddings_path=request.embeddings_path)
+    except (CatalogMismatchError, OSError) as e:
+        raise HTTPException(status_code=409, detail=f"Catalog not swapped: {e}")
+
+    return CatalogVersionResponse(catalog_version=snapshot.version, num_books=len(snapshot.catalog))
+
+# cache sizes and hit rates
+@app.get("/admin/stats")
+def admin_stats(x_admin_token: Optional[str] = Header(default=None)):
+    check_admin_token(x_admin_token)
+
+    return {
+        "catalog_version": catalog_manager.current().version,
+        "filter_cache": filter_cache.stats(),
+        "embedding_provider": provider_embeddings.stats(),
+        "embedding_cache": embeddings.stats(),
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+    }
+
 
 # place holder for API root endpoint
 @app.get("/")
@@ -0,0 +1,100 @@
+# tests/unit/test_catalog.py
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.catalog import Catalog, load_catalog, memory_report
+
+def test_catalog_row_ids_are_positions(sample_books):
+    """Row ids should be positions even if the source frame has another index"""
+    catalog = Catalog(sample_books.set_index(sample_books.index + 100))
+
+    assert len(catalog) == len(sample_books)
+    assert catalog.books.index.tolist() == list(range(len(sample_books)))
+
+def test_catalog_view_does_not_leak_writes(sample_books):
+    """Writing to a handed out view should never change the shared catalog"""
+    catalog = Catalog(sample_books)
+
+    view = catalog.books
+    view.loc[0, "title"] = "Changed"
+
+    assert catalog.books.loc[0, "title"] == "1984"
+
+def test_catalog_take_keeps_order_and_row_ids(sample_books):
+    """take() should return the requested rows in the requested order"""
+    catalog = Catalog(sample_books)
+
+    result = catalog.take([2, 0])
+
+    assert result["title"].tolist() == ["The Shining", "1984"]
+    assert result.index.tolist() == [2, 0]
+
+def test_load_catalog_reads_parquet(sample_books, tmp_path):
+    """load_catalog should read the parquet file once into a Catalog"""
+    path = tmp_path / "books.parquet"
+    sample_books.to_parquet(path, index=False)
+
+    catalog = load_catalog(str(path))
+
+    assert len(catalog) == len(sample_books)
+    assert catalog.books["isbn13"].tolist() == sample_books["isbn13"].tolist()
+
+def test_catalog_compact_dtypes(sample_books):
+    """The catalog should hold categories as codes, scores as float32 and narrow ints"""
+    books = Catalog(sample_books).books
+
+    assert isinstance(books["simple_categories"].dtype, pd.CategoricalDtype)
+    assert books["joy"].dtype == "float32"
+    assert books["num_pages"].dtype.itemsize < 8
+    assert books["description"].dtype == pd.StringDtype("pyarrow")
+
+def test_catalog_rebuilds_derived_columns(sample_books):
+    """tagged_description is dropped at load and rebuilt by materialize()"""
+    books = sample_books.assign(tagged_description=sample_books["isbn13"] + " " + sample_books["description"])
+    catalog = Catalog(books)
+
+    assert "tagged_description" not in catalog.books.columns
+
+    rows = catalog.materialize(catalog.take([1, 0], ["isbn13"]))
+    assert rows.columns.tolist() == books.columns.tolist()
+    assert rows["tagged_description"].tolist() == books["tagged_description"].iloc[[1, 0]].tolist()
+    assert rows.iloc[0]["joy"] == sample_books.iloc[1]["joy"]
+
+def test_catalog_keeps_derived_column_that_differs(sample_books):
+    """A tagged_description that is not a plain rebuild is kept as it is"""
+    books = sample_books.assign(tagged_description="custom")
+
+    assert "tagged_description" in Catalog(books).books.columns
+
+def test_memory_report(sample_books):
+    """memory_report should list every source column and a total"""
+    catalog = Catalog(sample_books)
+    report = memory_report(sample_books, catalog.books)
+
+    assert report.index.tolist() == sample_books.columns.tolist() + ["total"]
+    assert report.loc["total", "bytes_after"] < report.loc["total", "bytes_before"]
+
+def test_memory_report_counts_indexes(sample_books):
+    """The index structures are reported and part of the total"""
+    catalog = Catalog(sample_books)
+    indexes = catalog.index_bytes()
+    report = memory_report(sample_books, catalog.books, indexes)
+
+    assert report.index.tolist()[-len(indexes) - 1:-1] == [f"index: {name}" for name in indexes]
+    assert all(nbytes > 0 for nbytes in indexes.values())
+    assert report.loc["total", "bytes_after"] == memory_report(sample_books, catalog.books).loc["total", "bytes_after"] + sum(indexes.values())
+
+def test_materialize_keeps_order_and_extra_columns(sample_books):
+    """Search distances and rank order should survive materialize()"""
+    catalog = Catalog(sample_books)
+    ranked = catalog.take([4, 1]).assign(distance=np.array([0.25, 0.5], dtype=np.float32))
+
+    rows = catalog.materialize(ranked)
+
+    assert rows["title"].tolist() == [sample_books.iloc[4]["title"], sample_books.iloc[1]["title"]]
+    assert rows["distance"].tolist() == [0.25, 0.5]
@@ -0,0 +1,74 @@
+# tests/unit/test_embedding_cache.py
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.embedding_cache import CachedEmbeddings, DiskEmbeddingStore, cache_key, normalize_text
+
+def fake_embeddings(model="text-embedding-ada-002"):
+    """Embeddings stand-in that returns the text length as a 2-d vector"""
+    embeddings = MagicMock(model=model)
+    embeddings.embed_query.side_effect = lambda text: [float(len(text)), 1.0]
+    embeddings.embed_documents.side_effect = lambda texts: [[float(len(text)), 1.0] for text in texts]
+    return embeddings
+
+class TestEmbeddingCache:
+    """Unit tests for the two-tier query embedding cache"""
+
+    def test_normalized_text_shares_an_entry(self):
+        assert normalize_text("  A book about\tFORGIVENESS ") == "a book about forgiveness"
+        assert cache_key("m", "A book") == cache_key("m", "a  book")
+        assert cache_key("m", "a book") != cache_key("other", "a book")
+
+    def test_memory_tier(self):
+        inner = fake_embeddings()
+        cache = CachedEmbeddings(inner, maxsize=1)
+
+        assert cache.embed_query("a book") == [6.0, 1.0]
+        assert cache.embed_query("A Book ") == [6.0, 1.0]
+        assert inner.embed_query.call_count == 1
+
+        # the LRU holds one entry, the first query got evicted
+        cache.embed_query("another book")
+        cache.embed_query("a book")
+        assert inner.embed_query.call_count == 3
+
+        stats = cache.stats()
+        assert (stats["memory_hits"], stats["misses"]) == (1, 3)
+        assert stats["hit_rate"] == pytest.approx(0.25)
+        assert stats["memory_bytes"] == 8
+
+    def test_disk_tier_is_shared(self, tmp_path):
+        """A second worker (its own LRU) reads what the first one embedded"""
+        path = str(tmp_path / "cache.sqlite3")
+        first, second = fake_embeddings(), fake_embeddings()
+        CachedEmbeddings(first, disk=DiskEmbeddingStore(path)).embed_query("a book")
+
+        cache = CachedEmbeddings(second, disk=DiskEmbeddingStore(path))
+        assert cache.embed_query("a book") == [6.0, 1.0]
+        second.embed_query.assert_not_called()
+
+        stats = cache.stats()
+        assert stats["disk_hits"] == 1
+        assert stats["disk"]["size"] == 1
+        assert stats["disk"]["vector_bytes"] == 8
+
+    def test_model_change_misses(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        CachedEmbeddings(fake_embeddings("old"), disk=DiskEmbeddingStore(path)).embed_query("a book")
+
+        inner = fake_embeddings("new")
+        CachedEmbeddings(inner, disk=DiskEmbeddingStore(path)).embed_query("a book")
+        inner.embed_query.assert_called_once()
+
+    def test_embed_documents_batches_misses(self):
+        inner = fake_embeddings()
+        cache = CachedEmbeddings(inner)
+        cache.embed_query("b")
+
+        assert cache.embed_documents(["a", "b", "cc"]) == [[1.0, 1.0], [1.0, 1.0], [2.0, 1.0]]
+        inner.embed_documents.assert_called_once_with(["a", "cc"])
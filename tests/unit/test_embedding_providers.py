@@ -0,0 +1,72 @@
+# tests/unit/test_embedding_providers.py
+import pytest
+import numpy as np
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.embedding_providers import HashingEmbeddings, TimedEmbeddings, make_embeddings
+
+class TestHashingEmbeddings:
+    """Unit tests for the offline hashed n-gram embedder"""
+
+    def test_deterministic_and_normalized(self):
+        embeddings = HashingEmbeddings(dim=64)
+
+        vector = embeddings.embed_query("A sad book about forgiveness")
+
+        assert len(vector) == 64
+        assert np.isclose(np.linalg.norm(vector), 1.0)
+        assert vector == HashingEmbeddings(dim=64).embed_query("A sad book about forgiveness")
+        assert embeddings.embed_documents(["A sad book about forgiveness"]) == [vector]
+
+    def test_shared_words_are_closer(self):
+        embeddings = HashingEmbeddings(dim=256)
+        query, near, far = (np.array(v) for v in embeddings.embed_documents(
+            ["dragons and wizards", "a story of wizards and dragons", "quarterly tax accounting"]
+        ))
+
+        assert query @ near > query @ far
+
+    def test_empty_text(self):
+        assert HashingEmbeddings(dim=8).embed_query("") == [0.0] * 8
+
+class TestTimedEmbeddings:
+    """Unit tests for batching and per-call latency"""
+
+    def test_batches_documents(self):
+        inner = MagicMock(model="m")
+        inner.embed_documents.side_effect = lambda texts: [[float(len(text))] for text in texts]
+        timed = TimedEmbeddings(inner, batch_size=2)
+
+        assert timed.embed_documents(["a", "bb", "ccc"]) == [[1.0], [2.0], [3.0]]
+        assert [len(call.args[0]) for call in inner.embed_documents.call_args_list] == [2, 1]
+
+        stats = timed.stats()
+        assert stats["model"] == "m"
+        assert stats["calls"] == 2 and stats["texts"] == 3
+        assert stats["p99_ms"] >= stats["p50_ms"] >= 0
+
+    def test_no_calls_no_latency(self):
+        assert "p50_ms" not in TimedEmbeddings(HashingEmbeddings(dim=8)).stats()
+
+class TestMakeEmbeddings:
+    """Unit tests for picking a provider"""
+
+    def test_hashing_provider(self):
+        embeddings = make_embeddings("hashing", dim=32, batch_size=8)
+
+        assert isinstance(embeddings, TimedEmbeddings)
+        assert embeddings.model == "hashing-32-3"
+        assert len(embeddings.embed_query("test")) == 32
+
+    def test_rejects_unknown_provider(self):
+        with pytest.raises(ValueError):
+            make_embeddings("word2vec")
+
+    def test_local_needs_model_path(self):
+        with pytest.raises(ValueError):
+            make_embeddings("local")
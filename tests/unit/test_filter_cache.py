@@ -0,0 +1,71 @@
+# tests/unit/test_filter_cache.py
+import sys
+import os
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.catalog import Catalog
+from app.filter_cache import FilterCache, canonical_filters
+from app.filter_df import apply_pre_filters
+
+def test_canonical_filters_ignores_spelling_and_order():
+    """Filters selecting the same books should share a key"""
+    a = {"author": ["Stephen King", "J.K. Rowling"], "genre": "Fiction", "children": False}
+    b = {"author": ["j k rowling", "STEPHEN KING", "Stephen King"], "genre": "Fiction", "names": ["Maine"]}
+
+    assert canonical_filters(a) == canonical_filters(b)
+    assert canonical_filters({"genre": "Poetry"}) == canonical_filters({})
+    assert canonical_filters({"genre": "Fiction", "children": True}) != canonical_filters({"genre": "Fiction"})
+
+def test_cache_hit_returns_same_rows_and_validation(sample_books):
+    """A repeated request should be served from the cache with the same result"""
+    catalog = Catalog(sample_books, version="v1")
+    cache = FilterCache()
+    filters = {"author": ["Stephen King"], "pages_max": 500}
+
+    first_validation = {}
+    first = apply_pre_filters(catalog, filters, first_validation, cache)
+    second_validation = {}
+    second = apply_pre_filters(catalog, filters, second_validation, cache)
+
+    assert second.index.tolist() == first.index.tolist()
+    assert second_validation == first_validation
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_cache_hit_echoes_current_filter_values(sample_books):
+    """Validation entries should show the values of the request being served"""
+    catalog = Catalog(sample_books, version="v1")
+    cache = FilterCache()
+
+    apply_pre_filters(catalog, {"author": ["Stephen King"]}, {}, cache)
+    filterValidation = {}
+    apply_pre_filters(catalog, {"author": ["stephen king"]}, filterValidation, cache)
+
+    assert cache.stats()["hits"] == 1
+    assert filterValidation["applied_author"]["filter_value"] == ["stephen king"]
+
+def test_cache_is_keyed_on_catalog_version(sample_books):
+    """A new catalog version should never be served rows of the old one"""
+    cache = FilterCache()
+    filters = {"genre": "Fiction"}
+
+    apply_pre_filters(Catalog(sample_books, version="v1"), filters, {}, cache)
+    apply_pre_filters(Catalog(sample_books, version="v2"), filters, {}, cache)
+    apply_pre_filters(Catalog(sample_books), filters, {}, cache)
+
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["misses"] == 2
+
+def test_cache_evicts_least_recently_used():
+    """The cache should stay within maxsize, dropping the oldest entry"""
+    cache = FilterCache(maxsize=2)
+    cache.put("v1", {"pages_min": 1}, [0], {})
+    cache.put("v1", {"pages_min": 2}, [1], {})
+    cache.get("v1", {"pages_min": 1})
+    cache.put("v1", {"pages_min": 3}, [2], {})
+
+    assert cache.stats()["size"] == 2
+    assert cache.get("v1", {"pages_min": 2}) is None
+    assert cache.get("v1", {"pages_min": 1}) is not None
@@ -2,11 +2,13 @@
 import pandas as pd
 import sys
 import os
+from unittest.mock import patch
 
 # Add project root to Python path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app.filter_df import apply_pre_filters, apply_post_filters, tone_options
+from app.filter_df import apply_pre_filters, apply_post_filters, plan_pre_filters, post_filter_eligible, resolve_genre, tone_options
+from app.catalog import Catalog
 
 def test_apply_pre_filters_authors_one(sample_books):
     """Test filtering by a single author"""
@@ -227,4 +229,166 @@ def test_tone_with_names_filter(sample_books):
     
     # Should be sorted by fear (Harry Potter books have more fear than Charlie)
     assert result.iloc[0]["title"] in ["Harry Potter and the Sorcerer's Stone", "Harry Potter and the Chamber of Secrets"]
-    assert result.iloc[-1]["title"] == "Charlie and the Chocolate Factory"  # lowest fear
\ No newline at end of file
+    assert result.iloc[-1]["title"] == "Charlie and the Chocolate Factory"  # lowest fear
+
+def test_apply_pre_filters_on_catalog(sample_books):
+    """Passing the shared Catalog should give the same rows as passing the DataFrame"""
+    filters = {'genre': 'Fiction', 'pages_min': 300, 'published_year': {'min': 1980, 'max': None, 'exact': None}}
+
+    from_frame = apply_pre_filters(sample_books, filters, {})
+    from_catalog = apply_pre_filters(Catalog(sample_books), filters, {})
+
+    # same rows, the catalog just holds them in its compact dtypes
+    assert from_catalog.index.equals(from_frame.index)
+    assert from_catalog['isbn13'].tolist() == from_frame['isbn13'].tolist()
+    assert set(from_catalog['title']) == {'It', 'The Talisman'}
+
+def test_apply_pre_filters_frame_builds_no_catalog(sample_books):
+    """A plain frame is filtered off its own columns, without a throwaway Catalog"""
+    filters = {'author': ['Stephen King'], 'genre': 'Fiction', 'pages_min': 300,
+               'published_year': {'min': 1970, 'max': None, 'exact': None}}
+    expected = apply_pre_filters(Catalog(sample_books), filters, {})
+
+    with patch("app.filter_df.Catalog.__init__", side_effect=AssertionError("catalog built")):
+        result = apply_pre_filters(sample_books, filters, {})
+
+    assert len(result) > 0
+    assert result['isbn13'].tolist() == expected['isbn13'].tolist()
+
+def test_apply_pre_filters_keeps_frame_index(sample_books):
+    """Rows keep the index labels of the frame that was passed in"""
+    books = sample_books.set_index(sample_books.index + 100)
+    result = apply_pre_filters(books, {'author': ['Stephen King']}, {})
+
+    assert result.index.tolist() == [102, 108, 109]
+
+def test_apply_pre_filters_validation_counts(sample_books):
+    """Each validation entry records the number of books left after that step"""
+    filters = {'author': ['Stephen King'], 'genre': 'Fiction', 'pages_max': 700}
+    filterValidation = {}
+    apply_pre_filters(Catalog(sample_books), filters, filterValidation)
+
+    assert filterValidation['applied_author']['num_books_after'] == 3
+    assert filterValidation['applied_genre']['num_books_after'] == 3
+    assert filterValidation['applied_max_pages']['num_books_after'] == 2
+    assert all(entry['status'] == 'success' for entry in filterValidation.values())
+
+def test_apply_pre_filters_validation_ignores_plan_order(sample_books):
+    """Validators see the rows of the fixed author, genre, pages order, whatever the plan"""
+    catalog = Catalog(sample_books)
+    filters = {'genre': 'Fiction', 'pages_max': 180}
+    assert [step.name for step in plan_pre_filters(catalog, filters)] == ['pages_max', 'genre']
+
+    filterValidation = {}
+    apply_pre_filters(catalog, filters, filterValidation)
+
+    fiction = sample_books[sample_books['simple_categories'] == 'Fiction']
+    assert filterValidation['applied_genre']['num_books_after'] == len(fiction)
+    assert filterValidation['applied_max_pages']['num_books_after'] == (fiction['num_pages'] <= 180).sum()
+
+def test_resolve_genre():
+    """The genre filter maps onto one simple_categories value"""
+    assert resolve_genre({"genre": "Fiction"}) == "Fiction"
+    assert resolve_genre({"genre": "Nonfiction", "children": True}) == "Children's Nonfiction"
+    assert resolve_genre({"genre": None, "children": True}) is None
+    assert resolve_genre({}) is None
+
+def test_plan_pre_filters_most_selective_first(sample_books):
+    """The planner should run the filter keeping the fewest books first"""
+    catalog = Catalog(sample_books)
+    filters = {'genre': 'Fiction', 'pages_min': 100, 'author': ['Stephen King']}
+
+    plan = plan_pre_filters(catalog, filters)
+
+    assert [step.name for step in plan][0] == 'author'
+    assert [step.estimate for step in plan] == sorted(step.estimate for step in plan)
+
+def test_apply_pre_filters_short_circuits_when_empty(sample_books):
+    """Once no book is left the remaining filters still report, with 0 books"""
+    filters = {'author': ['Nobody'], 'genre': 'Fiction', 'pages_max': 300}
+    filterValidation = {}
+    result = apply_pre_filters(Catalog(sample_books), filters, filterValidation)
+
+    assert len(result) == 0
+    assert set(filterValidation) == {'applied_author', 'applied_genre', 'applied_max_pages'}
+    assert all(entry['num_books_after'] == 0 for entry in filterValidation.values())
+
+def test_apply_pre_filters_published_year(sample_books):
+    """min/max/exact published year narrow one range"""
+    def titles(published_year):
+        filters = {'published_year': {'min': None, 'max': None, 'exact': None, **published_year}}
+        return set(apply_pre_filters(sample_books, filters, {})['title'])
+
+    assert titles({'exact': 1997}) == {"Harry Potter and the Sorcerer's Stone"}
+    assert titles({'min': 2003}) == {'Outliers', 'National Geographic Kids Almanac 2023', 'A Short History of Nearly Everything'}
+    assert titles({'min': 1980, 'max': 1986}) == {'It', 'The Talisman'}
+    assert titles({'exact': 1997, 'min': 2000}) == set()
+
+def test_apply_pre_filters_pages_skip_missing(sample_books):
+    """Books without a page count never pass a pages filter"""
+    books = sample_books.astype({'num_pages': 'Int64'})
+    books.loc[0, 'num_pages'] = pd.NA
+
+    result = apply_pre_filters(books, {'pages_min': 0}, {})
+
+    assert len(result) == len(books) - 1
+    assert '1984' not in set(result['title'])
+
+def test_apply_pre_filters_author_spelling_variants(sample_books):
+    """Author names match regardless of case and punctuation"""
+    filterValidation = {}
+    result = apply_pre_filters(sample_books, {'author': ['j. k. rowling']}, filterValidation)
+
+    assert len(result) == 2
+    assert filterValidation['applied_author']['status'] == 'success'
+
+def test_apply_post_filters_names_with_catalog(sample_books):
+    """The catalog's names index should give the same rows as a plain frame"""
+    catalog = Catalog(sample_books)
+    candidates = catalog.take([0, 1, 5, 9, 10])
+    filters = {'names': ['Hogwarts', 'chocolate factory']}
+
+    with_catalog = apply_post_filters(candidates, filters, {}, catalog=catalog)
+    without = apply_post_filters(candidates, filters, {})
+
+    assert with_catalog.equals(without)
+    assert with_catalog.index.tolist() == [1, 5, 10]
+
+def test_apply_post_filters_names_word_boundary(sample_books):
+    """Names match from the start of a word, not inside other words"""
+    filterValidation = {}
+    result = apply_post_filters(sample_books, {'names': ['War']}, filterValidation)
+
+    # 'war' is inside 'Hogwarts' but no word starts with it
+    assert len(result) == 0
+    assert filterValidation['applied_keywords']['status'] == 'success'
+
+def test_apply_post_filters_tone_with_catalog(sample_books):
+    """Catalog ranks pick the same books as sorting the candidates"""
+    catalog = Catalog(sample_books)
+    candidates = catalog.take([8, 0, 2, 5, 9, 3])
+
+    for tone in tone_options:
+        filterValidation = {}
+        result = apply_post_filters(candidates, {'tone': tone}, filterValidation, k=3, catalog=catalog)
+
+        expected = candidates.sort_values(tone, ascending=False, kind='stable').head(3)
+        assert result.index.tolist() == expected.index.tolist()
+        assert filterValidation['applied_tone']['num_books_after'] == len(candidates)
+
+def test_post_filter_eligible(sample_books):
+    """The names filter becomes a bitmap the search can apply while ranking"""
+    catalog = Catalog(sample_books)
+    eligible = post_filter_eligible(catalog, {'names': ['Hogwarts'], 'tone': 'joy'})
+
+    assert set(catalog.take(eligible)['title']) == set(apply_post_filters(sample_books, {'names': ['Hogwarts']}, {}, 100)['title'])
+    assert post_filter_eligible(catalog, {'tone': 'joy'}) is None
+
+def test_apply_post_filters_keeps_rank_order(sample_books):
+    """Without a tone the first k books of the ranked input are returned"""
+    catalog = Catalog(sample_books)
+    ranked = catalog.take([6, 2, 0, 4])
+
+    result = apply_post_filters(ranked, {}, {}, 2, catalog)
+
+    assert result.index.tolist() == [6, 2]
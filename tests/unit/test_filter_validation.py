@@ -477,3 +477,23 @@ class TestValidatePublishedYearFilter:
         year_val = filterValidation['applied_published_year']
         assert year_val['status'] == 'success'
         assert year_val['filter_value']['exact'] == 1997
+
+class TestValidateAuthorNormalization:
+    """validate_author_filter matches names like the author index does"""
+
+    def test_punctuation_and_case_variants(self, sample_books):
+        """'J. K. Rowling' should validate books by 'J.K. Rowling'"""
+        rowling_books = sample_books[sample_books['authors'] == 'J.K. Rowling']
+        filterValidation = {}
+
+        validate_author_filter(rowling_books, ['j. k. rowling'], filterValidation)
+
+        assert filterValidation['applied_author']['status'] == 'success'
+
+    def test_regex_characters_do_not_break_validation(self, sample_books):
+        """Names with regex characters are matched literally"""
+        filterValidation = {}
+
+        validate_author_filter(sample_books, ['George Orwell (Author'], filterValidation)
+
+        assert filterValidation['applied_author']['status'] == 'failed'
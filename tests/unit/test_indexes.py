@@ -0,0 +1,229 @@
+# tests/unit/test_indexes.py
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+import os
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.indexes import AuthorIndex, BitmapIndex, PhraseIndex, RankIndex, SortedIndex, normalize_name, phrase_mask
+
+class TestBitmapIndex:
+    """Unit tests for the per-value bitmaps"""
+
+    def test_bitmap_per_value(self, sample_books):
+        """Every distinct value should map to exactly its rows"""
+        index = BitmapIndex(sample_books["simple_categories"])
+
+        for value in sample_books["simple_categories"].unique():
+            expected = (sample_books["simple_categories"] == value).to_numpy()
+            assert np.array_equal(index.get(value), expected)
+
+    def test_children_variants(self, sample_books):
+        """Children's genres are their own bitmaps, separate from the adult ones"""
+        index = BitmapIndex(sample_books["simple_categories"])
+
+        assert index.get("Children's Fiction").sum() == 3
+        assert index.get("Children's Nonfiction").sum() == 1
+        assert not (index.get("Fiction") & index.get("Children's Fiction")).any()
+
+    def test_unknown_value_is_empty(self, sample_books):
+        """A value no row holds should give an all-False bitmap"""
+        index = BitmapIndex(sample_books["simple_categories"])
+
+        bitmap = index.get("Poetry")
+
+        assert len(bitmap) == len(sample_books)
+        assert not bitmap.any()
+
+    def test_bitmaps_are_read_only(self, sample_books):
+        """Shared bitmaps must not be modified in place by a filter"""
+        index = BitmapIndex(sample_books["simple_categories"])
+
+        with pytest.raises(ValueError):
+            index.get("Fiction")[0] = False
+
+    def test_counts_and_nulls(self):
+        """Missing values get no bitmap and are not counted"""
+        index = BitmapIndex(pd.Series(["Fiction", None, "Fiction"], dtype="string"))
+
+        assert index.counts() == {"Fiction": 2}
+
+class TestSortedIndex:
+    """Unit tests for the sorted range index"""
+
+    def test_range_matches_comparisons(self, sample_books):
+        """range() should return exactly the rows a comparison would keep"""
+        index = SortedIndex(sample_books["num_pages"])
+
+        for low, high in [(200, 350), (None, 300), (400, None), (None, None), (341, 341)]:
+            expected = sample_books["num_pages"].between(low if low is not None else -np.inf, high if high is not None else np.inf)
+            assert set(index.range(low, high)) == set(np.flatnonzero(expected.to_numpy()))
+            assert index.count(low, high) == expected.sum()
+
+    def test_range_is_in_value_order(self, sample_books):
+        """Row ids come back sorted by the column value"""
+        index = SortedIndex(sample_books["num_pages"])
+
+        pages = sample_books["num_pages"].to_numpy()[index.range(100, 400)]
+
+        assert pages.tolist() == sorted(pages.tolist())
+
+    def test_empty_and_inverted_ranges(self, sample_books):
+        """Ranges with no rows, or low > high, give no rows"""
+        index = SortedIndex(sample_books["published_year"])
+
+        assert len(index.range(3000, None)) == 0
+        assert len(index.range(2000, 1990)) == 0
+        assert not index.mask(2000, 1990).any()
+
+    def test_nulls_never_match(self):
+        """Missing values (nullable Int64) are left out of every range"""
+        values = pd.Series([300, None, 150, None, 500], dtype="Int64")
+        index = SortedIndex(values)
+
+        assert index.range().tolist() == [2, 0, 4]
+        assert index.mask(low=0).tolist() == [True, False, True, False, True]
+        assert np.array_equal(index.mask(high=400), (values <= 400).to_numpy(dtype=bool, na_value=False))
+
+class TestAuthorIndex:
+    """Unit tests for the inverted author index"""
+
+    def test_normalize_name(self):
+        """Case and punctuation differences normalize away"""
+        assert normalize_name("J.K. Rowling") == "j k rowling"
+        assert normalize_name("  J. K.  ROWLING ") == "j k rowling"
+        assert normalize_name(None) == ""
+        assert normalize_name(pd.NA) == ""
+
+    def test_full_name_lookup(self, sample_books):
+        """A full name should find all books of that author, case-insensitive"""
+        index = AuthorIndex(sample_books["authors"])
+
+        assert index.lookup("Stephen King").tolist() == [2, 8, 9]
+        assert index.lookup("stephen king").tolist() == [2, 8, 9]
+        assert index.lookup("J.K. Rowling").tolist() == [1, 10]
+
+    def test_co_authors_are_split(self, sample_books):
+        """Every name in a ;-separated authors field gets the book"""
+        index = AuthorIndex(sample_books["authors"])
+
+        assert index.lookup("Peter Straub").tolist() == [9]
+
+    def test_whole_word_lookup(self):
+        """A last name matches as a whole word, not inside another name"""
+        index = AuthorIndex(pd.Series(["Stephen King", "Barbara Kingsolver", "Carole King"]))
+
+        assert index.lookup("King").tolist() == [0, 2]
+
+    def test_partial_name_falls_back_to_substring(self):
+        """Without a whole-word hit, a partial name still matches"""
+        index = AuthorIndex(pd.Series(["J. R. R. Tolkien", "Barbara Kingsolver"]))
+
+        assert index.lookup("Tolk").tolist() == [0]
+        assert index.lookup("Kingsolver").tolist() == [1]
+
+    def test_regex_characters_are_literal(self):
+        """Dots and other regex characters in a name are not wildcards"""
+        index = AuthorIndex(pd.Series(["Jxkx Rowling", "J. K. Rowling"]))
+
+        assert index.lookup("J.K. Rowling").tolist() == [1]
+        assert len(index.lookup("Rowling (Author)")) == 0
+
+    def test_missing_authors_and_unknown_names(self):
+        """Missing author fields are skipped and unknown names match nothing"""
+        index = AuthorIndex(pd.Series(["George Orwell", None], dtype="string"))
+
+        assert len(index.lookup("Nobody")) == 0
+        assert index.mask(["George Orwell", "Nobody"]).tolist() == [True, False]
+
+class TestPhraseIndex:
+    """Unit tests for the names filter index"""
+
+    @pytest.fixture
+    def texts(self):
+        return pd.Series([
+            "A detective story set in New York City.",
+            "An exposé from The New Yorker.",
+            "The Duke of York returns to Japan.",
+            "A Japanese family after World War II.",
+            "Life in the UK, told by a Scottish duke.",
+        ])
+
+    @pytest.fixture
+    def index(self, texts):
+        return PhraseIndex(texts)
+
+    def test_single_word(self, index):
+        """One word is a dictionary hit, case-insensitive"""
+        assert index.lookup("japan").tolist() == [2, 3]
+
+    def test_phrase_words_must_be_adjacent(self, index):
+        """'New York' should not match 'Duke of York' or 'New Yorker' words apart"""
+        assert index.lookup("New York").tolist() == [0, 1]
+        assert index.lookup("York City").tolist() == [0]
+
+    def test_match_starts_at_word_boundary(self, index):
+        """Names don't match inside other words ('UK' in 'Duke')"""
+        assert index.lookup("UK").tolist() == [4]
+        assert len(index.lookup("ork")) == 0
+
+    def test_regex_characters_are_literal(self, index):
+        """Punctuation in a name is not a regex"""
+        assert index.lookup("World War II.").tolist() == [3]
+        assert len(index.lookup("(")) == 0
+
+    def test_mask_any_phrase_and_cache(self, index):
+        """mask() ORs the phrases and returns the cached bitmap on a repeat"""
+        mask = index.mask(["Japan", "New York"])
+
+        assert mask.tolist() == [True, True, True, True, False]
+        assert index.mask(["new york", "JAPAN"]) is mask
+        assert not mask.flags.writeable
+
+    def test_scan_matches_index(self, index, texts):
+        """phrase_mask() scans the texts with the same matching rules"""
+        for phrases in (["japan"], ["New York"], ["York City", "UK"], ["ork"], ["World War II."], ["("], []):
+            assert phrase_mask(texts, phrases).tolist() == index.mask(phrases).tolist()
+
+class TestRankIndex:
+    """Unit tests for the per-emotion rank index"""
+
+    def test_top_k_matches_sorting(self, sample_books):
+        """top_k should pick the same books, in the same order, as a descending sort"""
+        index = RankIndex(sample_books, ["fear", "joy"])
+        rows = np.arange(len(sample_books))
+
+        for tone in ["fear", "joy"]:
+            expected = sample_books.sort_values(tone, ascending=False, kind="stable").index[:4].tolist()
+            assert rows[index.top_k(tone, rows, 4)].tolist() == expected
+
+    def test_top_k_over_candidate_rows(self, sample_books):
+        """Only the candidate rows are ranked, positions index into them"""
+        index = RankIndex(sample_books, ["fear"])
+        rows = np.array([5, 0, 1])
+
+        # Charlie 0.1, 1984 0.8, Harry Potter 0.2
+        assert index.top_k("fear", rows, 2).tolist() == [1, 2]
+
+    def test_ties_keep_candidate_order(self):
+        """Equal scores come back in the order the candidates were given"""
+        index = RankIndex(pd.DataFrame({"joy": [0.5, 0.9, 0.5, 0.5]}), ["joy"])
+
+        assert index.top_k("joy", np.array([3, 1, 0, 2]), 3).tolist() == [1, 0, 2]
+        assert index.top_k("joy", np.array([0, 2, 3]), 2).tolist() == [0, 1]
+
+    def test_missing_scores_rank_last(self):
+        """Books without a score go after every scored book"""
+        index = RankIndex(pd.DataFrame({"fear": [np.nan, 0.1, 0.7]}), ["fear"])
+
+        assert index.top_k("fear", np.arange(3), 5).tolist() == [2, 1, 0]
+
+    def test_missing_columns_are_skipped(self, sample_books):
+        """Only the columns present in the frame get ranks"""
+        index = RankIndex(sample_books, ["fear", "neutral"])
+
+        assert "fear" in index
+        assert "neutral" not in index
@@ -0,0 +1,170 @@
+# tests/unit/test_ingest.py
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import chromadb
+
+from app.embedding_providers import HashingEmbeddings
+from app.ingest import Checkpoint, Manifest, apply_delta, batched, build_index, iter_documents, plan_reindex, with_backoff
+
+class RateLimitError(Exception):
+    status_code = 429
+
+@pytest.fixture
+def descriptions(tmp_path):
+    path = tmp_path / "tagged_descriptions.txt"
+    lines = [f"{9780000000000 + i} A book about topic number {i}" for i in range(25)]
+    path.write_text("\n".join(lines[:3] + ["", lines[0]] + lines[3:]) + "\n")
+    return str(path)
+
+class TestIngest:
+    """Unit tests for the batched index build"""
+
+    def test_streams_unique_documents(self, descriptions):
+        documents = list(iter_documents(descriptions))
+
+        assert len(documents) == 25
+        doc_id, text, metadata = documents[0]
+        assert metadata == {"source": "tagged_descriptions.txt", "isbn": "9780000000000"}
+        assert doc_id == next(iter_documents(descriptions))[0]
+        assert [len(batch) for _, batch in batched(range(25), 10)] == [10, 10, 5]
+
+    def test_builds_and_resumes(self, descriptions, tmp_path):
+        collection = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection("langchain")
+        checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), {"batch_size": 10})
+        embeddings = MagicMock(wraps=HashingEmbeddings(dim=16))
+
+        stats = build_index(iter_documents(descriptions), embeddings, collection, batch_size=10, workers=2, checkpoint=checkpoint)
+
+        assert stats["written"] == 25 and stats["docs_per_sec"] > 0
+        assert collection.count() == 25
+        assert collection.get(where={"isbn": "9780000000003"})["documents"] == ["9780000000003 A book about topic number 3"]
+
+        # a new run with the saved checkpoint embeds nothing
+        resumed = Checkpoint(str(tmp_path / "checkpoint.json"), {"batch_size": 10})
+        assert resumed.done == {0, 1, 2}
+        stats = build_index(iter_documents(descriptions), embeddings, collection, batch_size=10, checkpoint=resumed)
+        assert stats["written"] == 0 and stats["skipped"] == 25
+        assert embeddings.embed_documents.call_count == 3
+
+        # other inputs start over
+        assert not Checkpoint(str(tmp_path / "checkpoint.json"), {"batch_size": 5}).done
+
+    def test_failed_batch_is_not_checkpointed(self, descriptions, tmp_path):
+        collection = MagicMock()
+        checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), {})
+        embeddings = MagicMock()
+
+        def embed(texts):
+            if "topic number 0" not in texts[0]:
+                raise RuntimeError("boom")
+            return [[0.0]] * len(texts)
+        embeddings.embed_documents.side_effect = embed
+
+        with pytest.raises(RuntimeError):
+            build_index(iter_documents(descriptions), embeddings, collection, batch_size=10, workers=1, checkpoint=checkpoint)
+        assert 1 not in checkpoint and 2 not in checkpoint
+
+class TestReindex:
+    """Unit tests for incremental re-indexing against the manifest"""
+
+    def test_only_the_delta_is_embedded(self, descriptions, tmp_path):
+        collection = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection("langchain")
+        manifest = Manifest.load(str(tmp_path / "manifest.json"))
+        embeddings = MagicMock(wraps=HashingEmbeddings(dim=16))
+        apply_delta(plan_reindex(iter_documents(descriptions), manifest, "m"), iter_documents(descriptions), manifest, embeddings, collection, batch_size=10)
+        assert collection.count() == 25
+
+        # one description edited, one book dropped, one added
+        lines = open(descriptions).read().split("\n")
+        lines = [line + " revised" if line.startswith("9780000000001") else line for line in lines if not line.startswith("9780000000002")]
+        with open(descriptions, "w") as f:
+            f.write("\n".join(lines + ["9781111111111 A new book"]))
+
+        manifest = Manifest.load(str(tmp_path / "manifest.json"))
+        delta = plan_reindex(iter_documents(descriptions), manifest, "m")
+        summary = delta.summary(price_per_1k_tokens=1.0)
+        assert (summary["new"], summary["changed"], summary["removed"], summary["unchanged"]) == (1, 1, 1, 23)
+        assert summary["estimated_cost"] == summary["estimated_tokens"] / 1000 > 0
+
+        embeddings.reset_mock()
+        stats = apply_delta(delta, iter_documents(descriptions), manifest, embeddings, collection, batch_size=10)
+
+        assert stats["written"] == 2 and stats["deleted"] == 2
+        assert [len(call.args[0]) for call in embeddings.embed_documents.call_args_list] == [2]
+        assert collection.count() == 25
+        assert collection.get(where={"isbn": "9780000000001"})["documents"] == ["9780000000001 A book about topic number 1 revised"]
+        assert not collection.get(where={"isbn": "9780000000002"})["ids"]
+        assert set(Manifest.load(manifest.path).entries) == {doc[2]["isbn"] for doc in iter_documents(descriptions)}
+
+    def test_delta_keeps_ids_not_texts(self, descriptions, tmp_path):
+        """The plan holds (key, id) pairs, the texts are streamed again when embedded"""
+        manifest = Manifest(str(tmp_path / "manifest.json"))
+        documents = list(iter_documents(descriptions))
+        manifest.entries = {metadata["isbn"]: {"hash": doc_id, "model": "m"} for doc_id, _, metadata in documents[:20]}
+
+        delta = plan_reindex(iter_documents(descriptions), manifest, "m")
+
+        assert delta.to_embed == [(metadata["isbn"], doc_id) for doc_id, _, metadata in documents[20:]]
+        assert delta.estimated_tokens() == sum(len(text) for _, text, _ in documents[20:]) // 4
+        assert list(delta.documents(iter_documents(descriptions))) == documents[20:]
+
+    def test_model_change_reembeds_everything(self, descriptions, tmp_path):
+        manifest = Manifest(str(tmp_path / "manifest.json"))
+        apply_delta(plan_reindex(iter_documents(descriptions), manifest, "old"), iter_documents(descriptions), manifest, HashingEmbeddings(dim=8), MagicMock())
+
+        delta = plan_reindex(iter_documents(descriptions), manifest, "new")
+
+        assert len(delta.changed) == 25 and not delta.new and delta.unchanged == 0
+
+    def test_resume_after_model_change_keeps_vectors(self, descriptions, tmp_path):
+        collection = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection("langchain")
+        manifest = Manifest(str(tmp_path / "manifest.json"))
+        apply_delta(plan_reindex(iter_documents(descriptions), manifest, "old"), iter_documents(descriptions), manifest, HashingEmbeddings(dim=8), collection, batch_size=10)
+
+        # the update to the new model dies after its first batch
+        delta = plan_reindex(iter_documents(descriptions), manifest, "new")
+        assert not delta.stale_ids
+        checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), {"model": "new"})
+        failing = MagicMock(wraps=HashingEmbeddings(dim=8))
+        failing.embed_documents.side_effect = [[[1.0] * 8] * 10, RuntimeError("interrupted")]
+        with pytest.raises(RuntimeError):
+            apply_delta(delta, iter_documents(descriptions), manifest, failing, collection, batch_size=10, workers=1, checkpoint=checkpoint)
+        assert checkpoint.done == {0}
+
+        # the resumed run skips batch 0 and must not lose its vectors
+        manifest = Manifest.load(manifest.path)
+        delta = plan_reindex(iter_documents(descriptions), manifest, "new")
+        checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), {"model": "new"})
+        stats = apply_delta(delta, iter_documents(descriptions), manifest, HashingEmbeddings(dim=8), collection, batch_size=10, checkpoint=checkpoint)
+
+        assert stats["skipped"] == 10 and stats["written"] == 15
+        assert collection.count() == 25
+        assert all(entry["model"] == "new" for entry in Manifest.load(manifest.path).entries.values())
+
+class TestBackoff:
+    """Unit tests for rate-limit retries"""
+
+    def test_retries_rate_limits(self):
+        fn = MagicMock(side_effect=[RateLimitError(), RateLimitError(), "ok"])
+        sleep = MagicMock()
+
+        assert with_backoff(fn, retries=3, base_delay=1.0, sleep=sleep) == "ok"
+        delays = [call.args[0] for call in sleep.call_args_list]
+        assert len(delays) == 2 and 0.5 <= delays[0] <= 1.0 and 1.0 <= delays[1] <= 2.0
+
+    def test_gives_up(self):
+        sleep = MagicMock()
+
+        with pytest.raises(RateLimitError):
+            with_backoff(MagicMock(side_effect=RateLimitError()), retries=2, sleep=sleep)
+        assert sleep.call_count == 2
+
+        with pytest.raises(ValueError):
+            with_backoff(MagicMock(side_effect=ValueError()), sleep=sleep)
+        assert sleep.call_count == 2
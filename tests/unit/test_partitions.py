@@ -0,0 +1,57 @@
+# tests/unit/test_partitions.py
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.partitions import genre_collection_name, load_genre_indexes
+
+def fake_store(names):
+    """Global collection stand-in whose client lists `names`"""
+    db = MagicMock()
+    db._client.list_collections.return_value = [SimpleNamespace(name=name) for name in names]
+    return db
+
+def fake_index(size):
+    index = MagicMock()
+    index._collection.count.return_value = size
+    return index
+
+class TestGenreIndexes:
+    """Unit tests for the genre sub-indexes"""
+
+    def test_collection_names(self):
+        assert genre_collection_name("Fiction") == "genre_fiction"
+        assert genre_collection_name("Children's Nonfiction") == "genre_children_s_nonfiction"
+
+    def test_opens_matching_partitions(self):
+        db = fake_store(["langchain", "genre_fiction", "genre_children_s_fiction"])
+        indexes = {"genre_fiction": fake_index(3), "genre_children_s_fiction": fake_index(1)}
+        opened = []
+
+        def open_collection(name):
+            opened.append(name)
+            return indexes[name]
+
+        result = load_genre_indexes(db, {"Fiction": 3, "Nonfiction": 2, "Children's Fiction": 1}, open_collection)
+
+        # Nonfiction has no partition, so it isn't even opened
+        assert sorted(opened) == ["genre_children_s_fiction", "genre_fiction"]
+        assert result == {
+            "Fiction": (indexes["genre_fiction"], 3),
+            "Children's Fiction": (indexes["genre_children_s_fiction"], 1),
+        }
+
+    def test_skips_stale_partition(self):
+        db = fake_store(["langchain", "genre_fiction"])
+        result = load_genre_indexes(db, {"Fiction": 3}, lambda name: fake_index(2))
+        assert result == {}
+
+    def test_listing_failure_disables_partitions(self):
+        db = MagicMock()
+        db._client.list_collections.side_effect = RuntimeError("no client")
+        assert load_genre_indexes(db, {"Fiction": 3}, lambda name: fake_index(3)) == {}
@@ -1,5 +1,6 @@
 # tests/unit/test_search.py
 import pytest
+import numpy as np
 import pandas as pd
 from unittest.mock import MagicMock
 import sys
@@ -8,7 +9,17 @@ import os
 # Add project root to Python path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app.search import similarity_search_filtered
+from app.search import SearchCosts, choose_search_path, deepening_search, similarity_search_filtered
+from app.vectors import EmbeddingMatrix
+
+def query_result(isbns, distances=None):
+    """What ChromaDB's collection.query() returns for one query vector"""
+    distances = distances if distances is not None else [0.5] * len(isbns)
+    return {
+        "ids": [[f"id-{isbn}" for isbn in isbns]],
+        "metadatas": [[{"source": "tagged_descriptions.txt", "isbn": isbn} for isbn in isbns]],
+        "distances": [list(distances)],
+    }
 
 @pytest.fixture
 def sample_books():
@@ -24,34 +35,47 @@ class TestSimilaritySearchFiltered:
     """Unit tests for similarity_search_filtered function"""
 
     def test_returns_all_books_when_dataset_small(self, sample_books):
-        """When filtered_books <= k, should return all books without calling ChromaDB"""
+        """When filtered_books <= k, should return all books with one query over just their ISBNs"""
         mock_db = MagicMock()
+        # It is closest, 1984 has no vector in the index
+        mock_db._collection.query.return_value = query_result(['9780307743657', '9780385121675'], [0.1, 0.3])
         
         result = similarity_search_filtered("test query", sample_books, mock_db, k=5)
         
-        assert len(result) == len(sample_books)
-        assert result.equals(sample_books)
-        mock_db.similarity_search.assert_not_called()
+        assert result['title'].tolist() == ['It', 'The Shining', '1984']
+        assert result['distance'].tolist()[:2] == pytest.approx([0.1, 0.3])
+        assert np.isnan(result['distance'].iloc[2])
+        where = mock_db._collection.query.call_args.kwargs["where"]
+        assert sorted(where["isbn"]["$in"]) == sorted(sample_books['isbn13'])
+        mock_db._collection.query.assert_called_once()
+
+    def test_small_dataset_ranked_on_matrix(self, sample_books):
+        """With the embedding matrix, k or fewer books are ordered without ChromaDB"""
+        mock_db = MagicMock()
+        mock_db.embeddings.embed_query.return_value = [1.0, 0.0]
+        vectors = EmbeddingMatrix(np.array([[0.0, 1.0], [1.0, 0.1], [0.8, 0.0]], dtype=np.float32))
+
+        result = similarity_search_filtered("horror", sample_books, mock_db, k=10, vectors=vectors)
+
+        mock_db._collection.query.assert_not_called()
+        assert result.index.tolist() == [1, 2, 0]
+        assert result['distance'].tolist() == pytest.approx([0.01, 0.04, 2.0])
 
     def test_calls_chromadb_when_dataset_large(self, sample_books):
         """When filtered_books > k, should call ChromaDB"""
         mock_db = MagicMock()
-        mock_rec = MagicMock()
-        mock_rec.page_content = "9780385121675 <book description>"
-        mock_db.similarity_search.return_value = [mock_rec]
+        mock_db._collection.query.return_value = query_result(["9780385121675"])
         
         result = similarity_search_filtered("test query", sample_books, mock_db, k=1)
         
-        mock_db.similarity_search.assert_called_once()
+        mock_db._collection.query.assert_called_once()
 
     def test_filters_by_chromadb_results(self, sample_books):
         """Should only return books that match ChromaDB similarity search"""
         mock_db = MagicMock()
         
         # Mock ChromaDB to return only "The Shining"
-        mock_rec = MagicMock()
-        mock_rec.page_content = "9780385121675 <book description>"
-        mock_db.similarity_search.return_value = [mock_rec]
+        mock_db._collection.query.return_value = query_result(["9780385121675"])
         
         result = similarity_search_filtered("horror", sample_books, mock_db, k=2)
         
@@ -63,10 +87,7 @@ class TestSimilaritySearchFiltered:
         mock_db = MagicMock()
         
         # Mock ChromaDB to return all books
-        mock_recs = [MagicMock() for _ in range(len(sample_books))]
-        for i, (isbn, title) in enumerate(zip(sample_books['isbn13'], sample_books['title'])):
-            mock_recs[i].page_content = f'"{isbn}" "{title}"'
-        mock_db.similarity_search.return_value = mock_recs
+        mock_db._collection.query.return_value = query_result(sample_books['isbn13'].tolist())
         
         result = similarity_search_filtered("test", sample_books, mock_db, k=2)
         
@@ -77,21 +98,189 @@ class TestSimilaritySearchFiltered:
         mock_db = MagicMock()
         
         # Mock ChromaDB to return ISBN not in filtered books
-        mock_rec = MagicMock()
-        mock_rec.page_content = "9999999999999 Nonexistent Book"
-        mock_db.similarity_search.return_value = [mock_rec]
+        mock_db._collection.query.return_value = query_result(["9999999999999"])
         
         result = similarity_search_filtered("test", sample_books, mock_db, k=2)  # k < len(sample_books)
         
         assert len(result) == 0
         assert isinstance(result, pd.DataFrame)
 
-    def test_search_k_calculation(self, sample_books):
-        """Should use appropriate search_k for ChromaDB"""
+    def test_pushes_isbn_filter_into_query(self, sample_books):
+        """Should ask ChromaDB for k results among the filtered ISBNs only"""
         mock_db = MagicMock()
-        mock_db.similarity_search.return_value = []  # Empty results
+        mock_db._collection.query.return_value = query_result([])  # Empty results
         
         similarity_search_filtered("test", sample_books, mock_db, k=2)  # k < len(sample_books)
         
-        # Should call with search_k = min(2 * 5, 400) = 10
-        mock_db.similarity_search.assert_called_with("test", k=10)
+        isbns = sorted(sample_books['isbn13'])
+        query_vector = mock_db.embeddings.embed_query.return_value
+        mock_db._collection.query.assert_called_with(
+            query_embeddings=[query_vector], n_results=2, where={"isbn": {"$in": isbns}}, include=["metadatas", "distances"]
+        )
+
+    def test_no_filter_when_every_book_passes(self, sample_books):
+        """Should skip the metadata filter when the filters kept the whole catalog"""
+        mock_db = MagicMock()
+        mock_db._collection.query.return_value = query_result([])
+
+        similarity_search_filtered("test", sample_books, mock_db, k=2, num_books=len(sample_books))
+
+        query_vector = mock_db.embeddings.embed_query.return_value
+        mock_db._collection.query.assert_called_with(
+            query_embeddings=[query_vector], n_results=2, where=None, include=["metadatas", "distances"]
+        )
+
+    def test_brute_force_with_embedding_matrix(self, sample_books):
+        """Small candidate sets are scored on the embedding matrix, not ChromaDB"""
+        mock_db = MagicMock()
+        mock_db.embeddings.embed_query.return_value = [1.0, 0.0]
+        vectors = EmbeddingMatrix(np.array([[0.0, 1.0], [1.0, 0.1], [0.9, 0.0]], dtype=np.float32))
+
+        result = similarity_search_filtered("horror", sample_books, mock_db, k=2, vectors=vectors)
+
+        mock_db._collection.query.assert_not_called()
+        assert set(result['title']) == {'It', '1984'}
+
+    def test_cost_model_routes_to_hnsw(self, sample_books):
+        """With costs that make brute force expensive, ChromaDB should be used"""
+        mock_db = MagicMock()
+        mock_db._collection.query.return_value = query_result([])
+        vectors = EmbeddingMatrix(np.zeros((3, 2), dtype=np.float32))
+        costs = SearchCosts(dim=2, brute_fixed=10.0, brute_per_value=1.0, hnsw_fixed=1.0, hnsw_per_k=0.0, hnsw_per_id=0.0)
+
+        similarity_search_filtered("test", sample_books, mock_db, k=2, vectors=vectors, costs=costs)
+
+        mock_db._collection.query.assert_called_once()
+
+    def test_maps_isbns_through_catalog(self, sample_books):
+        """With the catalog, results map to rows through its ISBN dict and outsiders are dropped"""
+        catalog = MagicMock(isbns=sample_books['isbn13'].to_numpy(dtype=str),
+                            rows_by_isbn={isbn: row for row, isbn in enumerate(sample_books['isbn13'])})
+        catalog.__len__.return_value = len(sample_books)
+        mock_db = MagicMock()
+        # 1984 is in the catalog but was filtered out
+        mock_db._collection.query.return_value = query_result(['9780451524935', '9780307743657'], [0.1, 0.2])
+
+        result = similarity_search_filtered("test", sample_books.iloc[:2], mock_db, k=1, catalog=catalog)
+
+        assert result['title'].tolist() == ['It']
+        where = mock_db._collection.query.call_args.kwargs["where"]
+        assert where == {"isbn": {"$in": ['9780307743657', '9780385121675']}}
+
+    def test_returns_books_in_rank_order(self, sample_books):
+        """Books come back closest first with their distances, not in parquet order"""
+        mock_db = MagicMock()
+        mock_db._collection.query.return_value = query_result(['9780451524935', '9780385121675'], [0.1, 0.4])
+
+        result = similarity_search_filtered("test", sample_books, mock_db, k=2)
+
+        assert result['title'].tolist() == ['1984', 'The Shining']
+        assert np.allclose(result['distance'], [0.1, 0.4])
+
+class TestSearchCosts:
+    """Unit tests for the brute force vs HNSW cost model"""
+
+    def test_break_even(self):
+        """Brute force wins on few candidates, HNSW on many"""
+        costs = SearchCosts(dim=100, brute_fixed=0.0, brute_per_value=0.001, hnsw_fixed=5.0, hnsw_per_k=0.01, hnsw_per_id=0.0)
+
+        assert costs.use_brute_force(10, k=10)
+        assert not costs.use_brute_force(1000, k=10)
+        # a bigger k makes the graph walk dearer
+        assert costs.use_brute_force(60, k=100) and not costs.use_brute_force(60, k=1)
+
+    def test_calibrate_fits_non_negative_costs(self):
+        """calibrate() should time both paths without an embedding call"""
+        mock_db = MagicMock()
+        mock_db._collection.query.return_value = query_result([])
+        matrix = np.random.default_rng(0).normal(size=(300, 16)).astype(np.float32)
+        vectors = EmbeddingMatrix(matrix, np.array([str(i) for i in range(300)]))
+
+        costs = SearchCosts.calibrate(mock_db, vectors, repeats=2)
+
+        assert costs.dim == 16
+        assert min(costs.brute_fixed, costs.brute_per_value, costs.hnsw_fixed, costs.hnsw_per_k, costs.hnsw_per_id) >= 0
+        assert mock_db._collection.query.call_count == 6
+        mock_db.embeddings.embed_query.assert_not_called()
+
+    def test_deepening_past_budget_is_not_an_option(self):
+        """Deepening is only estimated when k / selectivity neighbours fit in the budget"""
+        costs = SearchCosts(dim=2, brute_fixed=0.0, brute_per_value=0.0, hnsw_fixed=1.0, hnsw_per_k=0.0, hnsw_per_id=1.0)
+
+        # 100 candidates out of 1000, deepening needs ~100 neighbours
+        assert choose_search_path(100, 10, 1000, 800, None, costs) == "deepening"
+        # 10 out of 1000 needs ~1000, past the budget
+        assert choose_search_path(10, 10, 1000, 800, None, costs) == "filtered"
+
+def ranked_db(isbns):
+    """ChromaDB stand-in whose neighbours are always `isbns`, in that order"""
+    db = MagicMock()
+    db._collection.query.side_effect = lambda n_results, **kwargs: query_result(isbns[:n_results], range(len(isbns[:n_results])))
+    return db
+
+class TestDeepeningSearch:
+    """Unit tests for the iterative-deepening path"""
+
+    def test_pages_grow_until_k_allowed(self):
+        """Pages of k, 2k, 4k... until k allowed books have been seen"""
+        db = ranked_db([str(i) for i in range(100)])
+        allowed = {"5": 5, "9": 9, "30": 30, "31": 31}
+
+        ranked, examined = deepening_search([0.0], db, allowed, k=2, budget=100)
+
+        assert ranked["row"].tolist() == [5, 9]
+        assert ranked["distance"].tolist() == [5.0, 9.0]
+        assert examined == 16
+        assert [call.kwargs["n_results"] for call in db._collection.query.call_args_list] == [2, 4, 8, 16]
+
+    def test_stops_at_budget(self):
+        """The budget caps the neighbours fetched, even when short of k"""
+        db = ranked_db([str(i) for i in range(100)])
+
+        ranked, examined = deepening_search([0.0], db, {"90": 90}, k=2, budget=20)
+
+        assert len(ranked) == 0
+        assert examined == 20
+
+    def test_stops_when_index_runs_out(self):
+        """A page shorter than asked means there is nothing left to fetch"""
+        db = ranked_db(["1", "2", "3"])
+
+        ranked, examined = deepening_search([0.0], db, {"3": 3}, k=2, budget=100)
+
+        assert ranked["row"].tolist() == [3]
+        assert examined == 3
+
+    def test_eligible_narrows_candidates(self, sample_books):
+        """Books the cheap post-filters drop are never ranked"""
+        db = ranked_db(sample_books["isbn13"].tolist())
+        eligible = np.array([False, True, False])
+
+        result = similarity_search_filtered("test", sample_books, db, k=2, eligible=eligible)
+
+        assert result['title'].tolist() == ['It']
+        # only ordered, with one query over the books left
+        assert db._collection.query.call_args.kwargs["where"] == {"isbn": {"$in": ['9780307743657']}}
+
+    def test_falls_back_to_filtered_when_short_of_k(self, sample_books):
+        """Deepening that runs out of budget before k books is followed by a filtered search"""
+        isbns = sample_books["isbn13"].tolist()
+        outsiders = [str(i) for i in range(100)]
+
+        def query(n_results, where=None, **kwargs):
+            # unfiltered pages only hold books that did not pass the filters
+            return query_result(isbns[:n_results] if where else outsiders[:n_results])
+
+        db = MagicMock()
+        db._collection.query.side_effect = query
+
+        result = similarity_search_filtered("test", sample_books, db, k=2, num_books=4, budget=8)
+
+        assert result["isbn13"].tolist() == isbns[:2]
+        assert db._collection.query.call_args.kwargs["where"] == {"isbn": {"$in": sorted(isbns)}}
+        assert result.attrs["neighbours_examined"] == 8 + 2
+
+    def test_loose_filters_use_deepening(self):
+        """Without calibration, loose filters page through the unfiltered index"""
+        assert choose_search_path(4000, 10, 5000, 800, None, None) == "deepening"
+        assert choose_search_path(300, 10, 5000, 800, None, None) == "filtered"
@@ -0,0 +1,107 @@
+# tests/unit/test_semantic_cache.py
+import pytest
+import sys
+import os
+import numpy as np
+from unittest.mock import MagicMock
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.search import similarity_search_filtered
+from app.semantic_cache import SemanticCache, result_key
+from app.vectors import EmbeddingMatrix, ranked_array
+
+class TestSemanticCache:
+    """Unit tests for the near-duplicate query cache"""
+
+    def test_hits_within_threshold(self):
+        cache = SemanticCache(threshold=0.95)
+        key = result_key("v1", {"genre": "Fiction"}, 10)
+        cache.put(key, [1.0, 0.0], ranked_array([3, 1], [0.1, 0.2]))
+
+        assert cache.get(key, [1.0, 0.1])["row"].tolist() == [3, 1]
+        assert cache.get(key, [1.0, 1.0]) is None
+        # same query, other filters
+        assert cache.get(result_key("v1", {"genre": "Nonfiction"}, 10), [1.0, 0.0]) is None
+        assert cache.get(result_key("v2", {"genre": "Fiction"}, 10), [1.0, 0.0]) is None
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 3)
+
+    def test_key_ignores_spelling_of_filters(self):
+        assert result_key("v1", {"author": ["Stephen King"]}, 10) == result_key("v1", {"author": ["stephen  king"]}, 10)
+        assert result_key("v1", {}, 10) != result_key("v1", {"names": ["London"]}, 10)
+
+    def test_evicts_least_recently_used(self):
+        cache = SemanticCache(maxsize=2, threshold=0.99)
+        key = result_key("v1", {}, 10)
+        for i, vector in enumerate(([1.0, 0.0], [0.0, 1.0], [-1.0, 0.0])):
+            if i == 2:
+                # touch the first entry, the second is now the oldest
+                cache.get(key, [1.0, 0.0])
+            cache.put(key, vector, ranked_array([i], [0.0]))
+
+        assert cache.get(key, [0.0, 1.0]) is None
+        assert cache.get(key, [1.0, 0.0])["row"].tolist() == [0]
+        assert cache.stats()["size"] == 2
+
+    def test_overlap_metric(self):
+        cache = SemanticCache()
+        cache.record_overlap(ranked_array([1, 2, 3, 4], [0] * 4), ranked_array([1, 2, 5, 6], [0] * 4))
+        assert cache.stats()["mean_overlap"] == pytest.approx(0.5)
+
+    def test_search_reuses_ranking(self, sample_books):
+        """A rephrased query skips the vector search"""
+        db = MagicMock()
+        db.embeddings.embed_query.side_effect = lambda text: [1.0, 0.0] if "story" in text else [0.99, 0.05]
+        isbns = sample_books["isbn13"].tolist()[:2]
+        db._collection.query.return_value = {
+            "ids": [isbns], "metadatas": [[{"isbn": isbn} for isbn in isbns]], "distances": [[0.1, 0.2]],
+        }
+        cache = SemanticCache(threshold=0.95)
+        key = result_key("v1", {}, 2)
+
+        first = similarity_search_filtered("a heartwarming story", sample_books, db, k=2, result_cache=cache, cache_key=key)
+        second = similarity_search_filtered("heartwarming book", sample_books, db, k=2, result_cache=cache, cache_key=key)
+
+        assert db._collection.query.call_count == 1
+        assert second["isbn13"].tolist() == first["isbn13"].tolist() == isbns
+        assert second.attrs["semantic_cache_hit"] and not first.attrs["semantic_cache_hit"]
+        # no matrix to score the rows against the new query with
+        assert first["distance"].tolist() == pytest.approx([0.1, 0.2])
+        assert second["distance"].isna().all()
+
+    def test_hit_recomputes_distances(self, sample_books):
+        """Reused rows get their distance to the new query, not to the cached one"""
+        db = MagicMock()
+        db.embeddings.embed_query.side_effect = lambda text: [1.0, 0.0] if "story" in text else [0.99, 0.05]
+        rng = np.random.default_rng(0)
+        vectors = EmbeddingMatrix(rng.normal(size=(len(sample_books), 2)).astype(np.float32))
+        cache = SemanticCache(threshold=0.95)
+        key = result_key("v1", {}, 2)
+
+        first = similarity_search_filtered("a heartwarming story", sample_books, db, k=2, vectors=vectors, result_cache=cache, cache_key=key)
+        second = similarity_search_filtered("heartwarming book", sample_books, db, k=2, vectors=vectors, result_cache=cache, cache_key=key)
+
+        assert second.attrs["semantic_cache_hit"]
+        assert second.index.tolist() == first.index.tolist()
+        expected = ((vectors.matrix[second.index] - np.array([0.99, 0.05])) ** 2).sum(axis=1)
+        assert second["distance"].tolist() == pytest.approx(expected.tolist(), rel=1e-5)
+        assert second["distance"].tolist() != pytest.approx(first["distance"].tolist())
+
+    def test_verified_hits_search_again(self, sample_books):
+        db = MagicMock()
+        db.embeddings.embed_query.return_value = [1.0, 0.0]
+        isbns = sample_books["isbn13"].tolist()[:2]
+        db._collection.query.return_value = {
+            "ids": [isbns], "metadatas": [[{"isbn": isbn} for isbn in isbns]], "distances": [[0.1, 0.2]],
+        }
+        cache = SemanticCache(verify_rate=1.0)
+        key = result_key("v1", {}, 2)
+
+        for _ in range(2):
+            similarity_search_filtered("query", sample_books, db, k=2, result_cache=cache, cache_key=key)
+
+        assert db._collection.query.call_count == 2
+        assert cache.stats()["mean_overlap"] == 1.0
@@ -0,0 +1,161 @@
+# tests/unit/test_snapshots.py
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.ingest import manifest_path
+from app.snapshots import CatalogManager, CatalogMismatchError, data_version
+from app.vectors import write_embedding_matrix
+
+def fake_db(isbns):
+    """Vector store stand-in that only knows the ISBNs in its metadata"""
+    db = MagicMock()
+    db.get.return_value = {"metadatas": [{"source": "tagged_descriptions.txt", "isbn": isbn} for isbn in isbns]}
+    return db
+
+@pytest.fixture
+def data_paths(sample_books, tmp_path):
+    """books.parquet + an (empty) chroma directory and its manifest on disk"""
+    books_path = tmp_path / "books.parquet"
+    sample_books.to_parquet(books_path, index=False)
+    chroma_path = tmp_path / "chroma_db"
+    chroma_path.mkdir()
+    (chroma_path / "chroma.sqlite3").write_bytes(b"v1")
+    with open(manifest_path(str(chroma_path)), "w") as f:
+        f.write("{}")
+    return str(books_path), str(chroma_path)
+
+def rebuild_index(chroma_path, content):
+    """What an index build leaves behind, a new manifest next to the index"""
+    with open(manifest_path(chroma_path), "w") as f:
+        f.write(content)
+
+class TestCatalogManager:
+    """Unit tests for CatalogManager"""
+
+    def test_initial_load(self, sample_books, data_paths):
+        """reload() should build a snapshot with books, vectors and a version"""
+        db = fake_db(sample_books["isbn13"])
+        manager = CatalogManager(*data_paths, load_db_books=lambda path: db)
+
+        snapshot = manager.reload()
+
+        assert manager.current() is snapshot
+        assert len(snapshot.catalog) == len(sample_books)
+        assert snapshot.db_books is db
+        assert snapshot.version == data_version(*data_paths)
+        assert snapshot.catalog.version == snapshot.version
+
+    def test_snapshot_loads_embedding_matrix(self, sample_books, data_paths, tmp_path):
+        """The exported matrix belongs to the snapshot and to its version"""
+        embeddings_path = str(tmp_path / "embeddings.npy")
+        vectors = {isbn: [float(i), 1.0] for i, isbn in enumerate(sample_books["isbn13"])}
+        write_embedding_matrix(embeddings_path, sample_books["isbn13"], vectors)
+        manager = CatalogManager(*data_paths, load_db_books=lambda path: fake_db(sample_books["isbn13"]),
+                                 embeddings_path=embeddings_path)
+
+        snapshot = manager.reload()
+
+        assert len(snapshot.vectors) == len(sample_books)
+        assert snapshot.version == data_version(*data_paths, embeddings_path)
+        assert snapshot.version != data_version(*data_paths)
+
+    def test_snapshot_opens_genre_indexes(self, sample_books, data_paths):
+        """A genre whose sub-index matches the catalog is searched on its own"""
+        db = fake_db(sample_books["isbn13"])
+        fiction_count = int((sample_books["simple_categories"] == "Fiction").sum())
+        fiction = MagicMock()
+        fiction._collection.count.return_value = fiction_count
+        db._client.list_collections.return_value = ["langchain", "genre_fiction"]
+        manager = CatalogManager(*data_paths, load_db_books=lambda path, name="langchain": fiction if name == "genre_fiction" else db)
+
+        snapshot = manager.reload()
+
+        assert snapshot.vector_index("Fiction") == (fiction, fiction_count)
+        assert snapshot.vector_index("Nonfiction") == (db, len(sample_books))
+        assert snapshot.vector_index(None) == (db, len(sample_books))
+
+    def test_reload_swaps_when_files_change(self, sample_books, data_paths):
+        """A rebuilt index should produce a new snapshot and version"""
+        manager = CatalogManager(*data_paths, load_db_books=lambda path: fake_db(sample_books["isbn13"]))
+        old = manager.reload()
+
+        books_path, chroma_path = data_paths
+        rebuild_index(chroma_path, "version two")
+        new = manager.reload()
+
+        assert new is not old
+        assert new.version != old.version
+        assert manager.current() is new
+
+        # a request that pinned the old snapshot still sees the old data
+        assert len(old.catalog) == len(sample_books)
+
+    def test_reload_same_files_is_a_no_op(self, sample_books, data_paths):
+        """Reloading unchanged files should keep the current snapshot"""
+        manager = CatalogManager(*data_paths, load_db_books=lambda path: fake_db(sample_books["isbn13"]))
+        first = manager.reload()
+
+        assert manager.reload() is first
+
+    def test_mismatch_keeps_old_snapshot(self, sample_books, data_paths):
+        """A strict reload must not swap in books and vectors with different ISBNs"""
+        dbs = [fake_db(sample_books["isbn13"]), fake_db(sample_books["isbn13"][:5])]
+        manager = CatalogManager(*data_paths, load_db_books=lambda path: dbs.pop(0))
+        old = manager.reload()
+
+        books_path, chroma_path = data_paths
+        rebuild_index(chroma_path, "broken index")
+
+        with pytest.raises(CatalogMismatchError, match="6 books have no vector"):
+            manager.reload()
+        assert manager.current() is old
+
+    def test_mismatch_allowed_when_not_strict(self, sample_books, data_paths):
+        """The startup load serves the data even if the ISBNs don't line up"""
+        manager = CatalogManager(*data_paths, load_db_books=lambda path: fake_db([]))
+
+        snapshot = manager.reload(strict=False)
+
+        assert manager.current() is snapshot
+
+    def test_poll_skips_rejected_version(self, sample_books, data_paths):
+        """poll() should not keep re-loading a version that was already rejected"""
+        loads = []
+        def load_db_books(path):
+            loads.append(path)
+            return fake_db(sample_books["isbn13"] if len(loads) == 1 else [])
+
+        manager = CatalogManager(*data_paths, load_db_books=load_db_books)
+        old = manager.reload()
+
+        books_path, chroma_path = data_paths
+        rebuild_index(chroma_path, "broken index")
+
+        manager.poll()
+        manager.poll()
+
+        assert len(loads) == 2
+        assert manager.current() is old
+
+    def test_poll_after_reload_is_a_no_op(self, sample_books, data_paths):
+        """ChromaDB writing its own files (opening, calibration) is not a new version"""
+        books_path, chroma_path = data_paths
+        loads = []
+        def load_db_books(path, name="langchain"):
+            loads.append(name)
+            with open(os.path.join(path, "chroma.sqlite3"), "ab") as f:
+                f.write(b"wal")
+            return fake_db(sample_books["isbn13"])
+
+        manager = CatalogManager(*data_paths, load_db_books=load_db_books)
+        first = manager.reload()
+        manager.poll()
+
+        assert manager.current() is first
+        assert manager.reload() is first
+        assert loads == ["langchain"]
@@ -0,0 +1,39 @@
+# tests/unit/test_stats.py
+import numpy as np
+import sys
+import os
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.catalog import Catalog
+from app.stats import Quantiles
+
+def test_quantiles_estimate_ranges():
+    """Range estimates should track the true counts on a uniform column"""
+    quantiles = Quantiles(np.arange(1000, dtype=float))
+
+    assert quantiles.estimate() == 1000
+    assert abs(quantiles.estimate(low=500) - 500) <= 2
+    assert abs(quantiles.estimate(100, 199) - 100) <= 2
+    assert quantiles.estimate(low=2000) == 0
+    assert quantiles.estimate(600, 500) == 0
+    assert Quantiles(np.empty(0)).estimate(1, 2) == 0
+
+def test_catalog_stats_histograms(sample_books):
+    """Catalog stats should count genres and books per author"""
+    stats = Catalog(sample_books).stats
+
+    assert stats.num_books == len(sample_books)
+    assert stats.estimate_genre("Children's Fiction") == 3
+    assert stats.estimate_genre("Poetry") == 0
+    assert stats.author_counts["stephen king"] == 3
+    assert stats.distinct_authors == len(set(stats.author_counts))
+
+def test_catalog_stats_estimate_authors(sample_books):
+    """Author estimates should add up the books of every matching name"""
+    catalog = Catalog(sample_books)
+
+    assert catalog.stats.estimate_authors(catalog, ["Stephen King"]) == 3
+    assert catalog.stats.estimate_authors(catalog, ["Stephen King", "J.K. Rowling"]) == 5
+    assert catalog.stats.estimate_authors(catalog, ["Nobody"]) == 0
@@ -0,0 +1,115 @@
+# tests/unit/test_vector_store.py
+import pytest
+import sys
+import os
+import numpy as np
+from unittest.mock import MagicMock
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.search import similarity_search_filtered
+from app.vector_store import ChromaStore, HnswStore, NumpyStore, VectorStore, as_vector_store
+from app.vectors import EmbeddingMatrix
+
+@pytest.fixture
+def vectors(sample_books):
+    """1-d positions of the books, the last book has no vector"""
+    isbns = np.array(sample_books["isbn13"], dtype=str)
+    matrix = np.array([[float(i), 0.0] for i in range(len(isbns))], dtype=np.float32)
+    matrix[-1] = np.nan
+    return EmbeddingMatrix(matrix, isbns)
+
+@pytest.fixture
+def store(vectors):
+    return NumpyStore(vectors)
+
+@pytest.fixture
+def hnsw_store(vectors):
+    """HnswStore over the same vectors, skipped without hnswlib"""
+    pytest.importorskip("hnswlib")
+    return HnswStore(vectors)
+
+def test_interface_is_abstract():
+    """A backend has to implement every lookup"""
+    with pytest.raises(TypeError):
+        VectorStore()
+
+class TestNumpyStore:
+    """Unit tests for the exact in-process backend"""
+
+    def test_search_is_exact(self, store):
+        results = store.search([1.2, 0.0], 2)
+        assert [isbn for isbn, _ in results] == [store.isbns[1], store.isbns[2]]
+        assert results[0][1] == pytest.approx(0.04)
+
+    def test_filtered_search_keeps_allowed_books(self, store):
+        allowed = [store.isbns[0], store.isbns[-1]]
+        # the book without a vector never comes back
+        assert [isbn for isbn, _ in store.filtered_search([5.0, 0.0], 2, allowed)] == [store.isbns[0]]
+
+    def test_batch_search_matches_single_searches(self, store):
+        queries = [[0.1, 0.0], [2.9, 1.0]]
+        assert store.batch_search(queries, 2) == [store.search(query, 2) for query in queries]
+        allowed = list(store.isbns[:2])
+        assert store.batch_search(queries, 1, allowed) == [store.filtered_search(query, 1, allowed) for query in queries]
+
+    def test_get(self, store):
+        vectors = store.get([store.isbns[1], store.isbns[-1], "0"])
+        assert list(vectors) == [store.isbns[1]]
+        assert vectors[store.isbns[1]].tolist() == [1.0, 0.0]
+
+    def test_drives_similarity_search(self, sample_books, store):
+        """Search runs on any VectorStore, not just ChromaDB"""
+        store.embeddings = MagicMock()
+        store.embeddings.embed_query.return_value = [1.9, 0.0]
+
+        results = similarity_search_filtered("query", sample_books, store, k=2)
+
+        assert results["isbn13"].tolist() == [store.isbns[2], store.isbns[1]]
+
+class TestChromaStore:
+    """Unit tests for the ChromaDB adapter"""
+
+    def test_asks_for_metadata_only(self):
+        """The ISBN comes from the metadata, documents are never fetched"""
+        db = MagicMock()
+        db._collection.query.return_value = {
+            "ids": [["a", "b"]], "metadatas": [[{"isbn": "9780385121675"}, {"isbn": 9780307743657}]], "distances": [[0.5, 0.7]],
+        }
+        store = as_vector_store(db)
+
+        assert isinstance(store, ChromaStore)
+        assert store.filtered_search([1.0], 2, ["9780385121675"]) == [("9780385121675", 0.5), ("9780307743657", 0.7)]
+        db._collection.query.assert_called_with(
+            query_embeddings=[[1.0]], n_results=2, where={"isbn": {"$in": ["9780385121675"]}}, include=["metadatas", "distances"]
+        )
+        db.similarity_search_by_vector_with_relevance_scores.assert_not_called()
+
+    def test_vector_stores_pass_through(self, store):
+        assert as_vector_store(store) is store
+
+class TestHnswStore:
+    """Unit tests for the hnswlib backend, on a graph small enough to be exact"""
+
+    def test_matches_exact_search(self, store, hnsw_store):
+        queries = [[1.2, 0.0], [0.1, 0.0], [2.9, 1.0]]
+        for query in queries:
+            assert [isbn for isbn, _ in hnsw_store.search(query, 2)] == [isbn for isbn, _ in store.search(query, 2)]
+        results = hnsw_store.search([1.2, 0.0], 1)
+        assert results[0][1] == pytest.approx(0.04)
+
+    def test_filtered_search_keeps_allowed_books(self, store, hnsw_store):
+        allowed = [store.isbns[0], store.isbns[-1]]
+        # the book without a vector is not in the graph
+        assert [isbn for isbn, _ in hnsw_store.filtered_search([5.0, 0.0], 2, allowed)] == [store.isbns[0]]
+        assert hnsw_store.filtered_search([5.0, 0.0], 2, ["0"]) == []
+
+    def test_batch_search_matches_single_searches(self, hnsw_store):
+        queries = [[0.1, 0.0], [2.9, 1.0]]
+        assert hnsw_store.batch_search(queries, 2) == [hnsw_store.search(query, 2) for query in queries]
+
+    def test_get_and_len(self, store, hnsw_store):
+        assert len(hnsw_store) == len(store)
+        assert hnsw_store.get([store.isbns[1], store.isbns[-1]])[store.isbns[1]].tolist() == [1.0, 0.0]
+        assert list(hnsw_store.get([store.isbns[-1]])) == []
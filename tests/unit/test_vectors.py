@@ -0,0 +1,117 @@
+# tests/unit/test_vectors.py
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+from app.vectors import (
+    EmbeddingMatrix, fit_projection, load_embedding_matrix, quantize_rows, write_embedding_matrix, write_projection
+)
+
+def random_vectors(isbns, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return {isbn: rng.normal(size=dim).astype(np.float32) for isbn in isbns}
+
+def test_write_and_load_matrix(sample_books, tmp_path):
+    """The exported matrix should be memory-mapped back in catalog row order"""
+    path = str(tmp_path / "embeddings.npy")
+    vectors = random_vectors(sample_books["isbn13"])
+    write_embedding_matrix(path, sample_books["isbn13"], vectors)
+
+    matrix = load_embedding_matrix(path, sample_books["isbn13"])
+
+    assert isinstance(matrix.matrix, np.memmap)
+    assert len(matrix) == len(sample_books)
+    assert np.array_equal(matrix.matrix[3], vectors[sample_books["isbn13"][3]])
+
+def test_load_matrix_for_other_catalog(sample_books, tmp_path):
+    """A matrix exported for other books should not be used"""
+    path = str(tmp_path / "embeddings.npy")
+    write_embedding_matrix(path, sample_books["isbn13"], random_vectors(sample_books["isbn13"]))
+
+    assert load_embedding_matrix(path, sample_books["isbn13"][::-1]) is None
+    assert load_embedding_matrix(str(tmp_path / "missing.npy"), sample_books["isbn13"]) is None
+
+def test_search_is_exact_l2(sample_books, tmp_path):
+    """search() should return the k nearest of the given rows, nearest first"""
+    path = str(tmp_path / "embeddings.npy")
+    vectors = random_vectors(sample_books["isbn13"])
+    write_embedding_matrix(path, sample_books["isbn13"], vectors)
+    matrix = load_embedding_matrix(path, sample_books["isbn13"])
+
+    query = np.random.default_rng(1).normal(size=8)
+    rows = np.array([0, 2, 3, 5, 7, 8])
+    distances = ((np.asarray(matrix.matrix)[rows] - query) ** 2).sum(axis=1)
+
+    ranked = matrix.search(query, rows, 3)
+    assert ranked["row"].tolist() == rows[np.argsort(distances)[:3]].tolist()
+    assert np.allclose(ranked["distance"], np.sort(distances)[:3], rtol=1e-4)
+    assert len(matrix.search(query, rows, 20)) == len(rows)
+
+def test_search_skips_books_without_vector(sample_books, tmp_path):
+    """Books missing from the index are never returned"""
+    path = str(tmp_path / "embeddings.npy")
+    vectors = random_vectors(sample_books["isbn13"][1:])
+    missing = write_embedding_matrix(path, sample_books["isbn13"], vectors)
+    matrix = load_embedding_matrix(path, sample_books["isbn13"])
+
+    assert missing.tolist() == [0]
+    assert 0 not in matrix.search(np.zeros(8), [0, 1, 2], 3)["row"].tolist()
+
+def test_quantized_search_reranks_exactly():
+    """The shortlist from the int8 / float16 copy is re-scored in float32"""
+    rng = np.random.default_rng(1)
+    matrix = rng.normal(size=(200, 16)).astype(np.float32)
+    rows = np.arange(len(matrix))
+    exact = EmbeddingMatrix(matrix)
+    query = matrix[7] + 0.01
+
+    for dtype in ("int8", "float16"):
+        vectors = EmbeddingMatrix(matrix, quantize=dtype)
+        ranked = vectors.search(query, rows, 5)
+        expected = exact.search(query, rows, 5)
+        assert ranked["row"].tolist() == expected["row"].tolist()
+        # distances come from the float32 rows
+        assert np.allclose(ranked["distance"], expected["distance"])
+        assert vectors.scoring_bytes < exact.scoring_bytes
+
+def test_quantize_rows():
+    matrix = np.array([[1.0, -0.5], [np.nan, np.nan], [0.0, 0.0]], dtype=np.float32)
+    codes, scales = quantize_rows(matrix, "int8")
+    assert codes.dtype == np.int8
+    assert codes[0].tolist() == [127, -64]
+    assert codes[1].tolist() == [0, 0]
+    with pytest.raises(ValueError):
+        quantize_rows(matrix, "int4")
+
+def test_projected_search(sample_books, tmp_path):
+    """Vectors of rank 2 lose nothing in a 2-d PCA projection"""
+    rng = np.random.default_rng(2)
+    isbns = list(sample_books["isbn13"])
+    basis = rng.normal(size=(2, 8))
+    vectors = {isbn: (rng.normal(size=2) @ basis).astype(np.float32) for isbn in isbns}
+    path, reduced_path = str(tmp_path / "embeddings.npy"), str(tmp_path / "embeddings.pca2.npy")
+    write_embedding_matrix(path, isbns, vectors)
+    matrix = np.load(path)
+    mean, components = fit_projection(matrix, 2, "pca")
+    write_projection(reduced_path, matrix, isbns, mean, components, "pca")
+
+    exact = load_embedding_matrix(path, isbns)
+    query = vectors[isbns[0]] + 0.1 * basis[0]
+    rows = np.arange(len(isbns))
+    expected = exact.search(query, rows, 3)
+    for rerank in (True, False):
+        projected = load_embedding_matrix(path, isbns, reduced_path=reduced_path, rerank=rerank)
+        assert projected.projection.dim == 2
+        ranked = projected.search(query, rows, 3)
+        assert ranked["row"].tolist() == expected["row"].tolist()
+        assert np.allclose(ranked["distance"], expected["distance"], atol=1e-3)
+
+    # fitted for other books
+    assert load_embedding_matrix(path, isbns, reduced_path=reduced_path).projection is not None
+    write_projection(reduced_path, matrix, isbns[::-1], mean, components, "pca")
+    assert load_embedding_matrix(path, isbns, reduced_path=reduced_path).projection is None